@@ -1,11 +1,43 @@
+import time
+STARTUP_TIME = time.perf_counter()  # 程序启动时间，用于测量启动耗时
+
 import os
-import pandas as pd
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from pathlib import Path
 import json
 import re
 import sys
+import pickle
+import importlib
+import threading
+import io
+import queue
+from array import array
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # 静态导入仅供PyInstaller等打包工具识别依赖，运行时通过LazyModule延迟导入
+    import numpy
+    import pandas
+
+class LazyModule:
+    """延迟导入的模块代理，第一次访问模块属性时才真正导入，缩短程序启动时间"""
+    def __init__(self, module_name):
+        self._module_name = module_name
+        self._module = None
+
+    def _import_module(self):
+        """导入并返回真正的模块（导入锁保证多线程下只导入一次）"""
+        if self._module is None:
+            self._module = importlib.import_module(self._module_name)
+        return self._module
+
+    def __getattr__(self, name):
+        return getattr(self._import_module(), name)
+
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
 
 class ExtractColumn:
     """提取列类，表示要从匹配文件中提取的列配置"""
@@ -34,124 +66,2817 @@ class ExtractColumn:
             is_primary=column_dict.get("is_primary", False)
         )
 
-class ComparisonRule:
-    """比对规则类，用于存储和应用自定义比对规则"""
-    def __init__(self, name, conditions, match_all=True, enabled=True):
-        self.name = name  # 规则名称
-        self.conditions = conditions  # 条件列表
-        self.match_all = match_all  # 是否需要满足所有条件
-        self.enabled = enabled  # 是否启用此规则
-    
-    def to_dict(self):
-        """将规则转换为字典，用于JSON序列化"""
-        return {
-            "name": self.name,
-            "conditions": [condition.to_dict() for condition in self.conditions],
-            "match_all": self.match_all,
-            "enabled": self.enabled
-        }
-    
+class ComparisonRule:
+    """比对规则类，用于存储和应用自定义比对规则"""
+    def __init__(self, name, conditions, match_all=True, enabled=True):
+        self.name = name  # 规则名称
+        self.conditions = conditions  # 条件列表
+        self.match_all = match_all  # 是否需要满足所有条件
+        self.enabled = enabled  # 是否启用此规则
+    
+    def to_dict(self):
+        """将规则转换为字典，用于JSON序列化"""
+        return {
+            "name": self.name,
+            "conditions": [condition.to_dict() for condition in self.conditions],
+            "match_all": self.match_all,
+            "enabled": self.enabled
+        }
+    
+    @classmethod
+    def from_dict(cls, rule_dict):
+        """从字典创建规则对象"""
+        conditions = [ColumnCondition.from_dict(cond) for cond in rule_dict.get("conditions", [])]
+        return cls(
+            name=rule_dict.get("name", "未命名规则"),
+            conditions=conditions,
+            match_all=rule_dict.get("match_all", True),
+            enabled=rule_dict.get("enabled", True)
+        )
+    
+    def resolve_columns(self, columns, resolver):
+        """解析每个条件对应的实际列名（找不到时为None），同一文件只需解析一次"""
+        resolved = []
+        for condition in self.conditions:
+            match = resolver.resolve(columns, (condition.column_name,))
+            resolved.append(match[0] if match else None)
+        return resolved
+    
+    def match(self, row, columns_map, condition_columns=None):
+        """检查行是否符合规则条件，condition_columns为预先解析好的条件列名"""
+        if not self.enabled or not self.conditions:
+            return False
+        
+        def condition_matches(i, condition):
+            # 获取实际列名
+            if condition_columns is not None:
+                actual_column = condition_columns[i]
+            else:
+                actual_column = columns_map.get(condition.column_name.lower().strip())
+                if not actual_column:
+                    # 尝试部分匹配
+                    for col_lower, col in columns_map.items():
+                        if condition.column_name.lower().strip() in col_lower or col_lower in condition.column_name.lower().strip():
+                            actual_column = col
+                            break
+            
+            if not actual_column:
+                # 列不存在
+                return False
+            
+            # 获取单元格值
+            cell_value = str(row[actual_column]).strip()
+            if not condition.case_sensitive:
+                cell_value = cell_value.lower()
+            return bool(condition.evaluate([cell_value])[0])
+        
+        # 根据match_all判断最终结果，结果确定后不再检查其余条件
+        checks = (condition_matches(i, condition) for i, condition in enumerate(self.conditions))
+        if self.match_all:
+            return all(checks)
+        else:
+            return any(checks)
+    
+    def match_mask(self, cache, condition_columns, candidates=None, stats=None, deadline=None):
+        """
+        按列对DataFrame求值，返回每行是否符合规则的布尔数组
+        cache为共用的规范化列缓存，candidates为需要检查的行位置（None表示所有行），
+        stats为规则统计，提供时按统计结果安排条件顺序：AND只检查仍满足的行，OR只检查尚未满足的行，
+        deadline为正则条件的截止时间，超出时抛出RegexTimeoutError
+        """
+        row_count = len(cache.df)
+        mask = np.zeros(row_count, dtype=bool)
+        if not self.enabled or not self.conditions:
+            return mask
+        
+        remaining = np.arange(row_count) if candidates is None else np.asarray(candidates)
+        if stats is not None:
+            order = stats.order_conditions(self.conditions, self.match_all)
+        else:
+            order = range(len(self.conditions))
+        
+        for i in order:
+            if not len(remaining):
+                break
+            condition = self.conditions[i]
+            actual_column = condition_columns[i]
+            
+            start = time.perf_counter()
+            if not actual_column:
+                # 列不存在
+                hits = np.zeros(len(remaining), dtype=bool)
+            else:
+                texts = cache.get(actual_column, condition.case_sensitive)
+                if len(remaining) < row_count:
+                    texts = [texts[position] for position in remaining.tolist()]
+                hits = condition.evaluate(texts, deadline)
+            if stats is not None:
+                stats.record(stats.condition_key(condition), len(remaining), int(hits.sum()), time.perf_counter() - start)
+            
+            # 根据match_all判断最终结果
+            if self.match_all:
+                remaining = remaining[hits]
+            else:
+                mask[remaining[hits]] = True
+                remaining = remaining[~hits]
+        
+        if self.match_all:
+            mask[remaining] = True
+        return mask
+
+class AhoCorasickMatcher:
+    """Aho-Corasick多模式子串匹配器，匹配耗时只与文本长度有关，与模式数量无关"""
+    def __init__(self, patterns):
+        self.goto = [{}]  # 每个状态的转移表
+        self.fail = [0]  # 失败指针
+        self.output = [False]  # 该状态（含失败链）是否命中某个模式
+        self.match_empty = False  # 空模式匹配任何文本
+        
+        for pattern in patterns:
+            if not pattern:
+                self.match_empty = True
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(False)
+                state = next_state
+            self.output[state] = True
+        
+        # 按层次构建失败指针
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.output[next_state] = self.output[next_state] or self.output[self.fail[next_state]]
+    
+    def search(self, text):
+        """文本中是否包含任一模式"""
+        if self.match_empty:
+            return True
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                return True
+        return False
+
+class ColumnCondition:
+    """列条件类，表示对单个列的匹配条件"""
+    # 部分匹配的搜索值超过此数量时使用Aho-Corasick多模式匹配。纯Python的匹配器每个字符的开销较大，
+    # 实测搜索值在30~50个以下时逐个用in查找更快，500个时匹配器快10倍以上
+    MULTI_PATTERN_THRESHOLD = 64
+    
+    def __init__(self, column_name, search_values, case_sensitive=False, is_regex=False, exact_match=False):
+        self.column_name = column_name  # 列名
+        self.search_values = search_values  # 搜索值列表
+        self.case_sensitive = case_sensitive  # 是否区分大小写
+        self.is_regex = is_regex  # 是否使用正则表达式
+        self.exact_match = exact_match  # 是否精确匹配
+        self.matcher_cache = None  # (搜索值, 匹配器)，搜索值修改后重新构建
+        self.regex_cache = None  # (搜索值, 编译后的正则表达式列表)，搜索值修改后重新编译
+    
+    def to_dict(self):
+        """将条件转换为字典，用于JSON序列化"""
+        return {
+            "column_name": self.column_name,
+            "search_values": self.search_values,
+            "case_sensitive": self.case_sensitive,
+            "is_regex": self.is_regex,
+            "exact_match": self.exact_match
+        }
+    
+    @classmethod
+    def from_dict(cls, condition_dict):
+        """从字典创建条件对象"""
+        return cls(
+            column_name=condition_dict.get("column_name", ""),
+            search_values=condition_dict.get("search_values", []),
+            case_sensitive=condition_dict.get("case_sensitive", False),
+            is_regex=condition_dict.get("is_regex", False),
+            exact_match=condition_dict.get("exact_match", False)
+        )
+    
+    def evaluate(self, texts, deadline=None):
+        """
+        对一列已规范化的文本求值（已按case_sensitive处理大小写），返回布尔数组
+        deadline为正则表达式允许执行到的时间点（time.perf_counter），超出时抛出RegexTimeoutError
+        """
+        search_values = [value if self.case_sensitive else value.lower() for value in self.search_values]
+        
+        if self.is_regex:
+            patterns = self.get_patterns(search_values)
+            if deadline is None:
+                hits = [any(pattern.search(text) for pattern in patterns) for text in texts]
+            elif not all(RegexGuard.is_linear(pattern) for pattern in patterns):
+                # 标准库re的单次search回溯失控时无法中断，在可以随时结束的沙箱进程中执行
+                try:
+                    return RegexSandbox.search([pattern.pattern for pattern in patterns], texts,
+                                               deadline - time.perf_counter())
+                except RegexTimeoutError:
+                    raise RegexTimeoutError(f"条件 '{self.column_name}' 的正则表达式执行超时")
+            else:
+                # re2的执行时间与文本长度成正比，每检查一个单元格确认一次时间，超时后放弃该规则
+                hits = []
+                for text in texts:
+                    hits.append(any(pattern.search(text) for pattern in patterns))
+                    if time.perf_counter() > deadline:
+                        raise RegexTimeoutError(f"条件 '{self.column_name}' 的正则表达式执行超时")
+        elif self.exact_match:
+            # 精确匹配
+            value_set = set(search_values)
+            hits = [text in value_set for text in texts]
+        elif len(search_values) > self.MULTI_PATTERN_THRESHOLD:
+            # 部分匹配，搜索值较多时一次扫描匹配所有值
+            search = self.get_matcher(search_values).search
+            hits = [search(text) for text in texts]
+        else:
+            # 部分匹配
+            hits = [any(value in text for value in search_values) for text in texts]
+        
+        return np.array(hits, dtype=bool)
+    
+    def get_patterns(self, search_values):
+        """获取编译后的正则表达式，同一组搜索值只编译一次，无效的正则表达式视为不匹配"""
+        key = tuple(search_values)
+        if self.regex_cache is None or self.regex_cache[0] != key:
+            patterns = []
+            for value in search_values:
+                try:
+                    patterns.append(RegexGuard.compile(value))
+                except re.error:
+                    pass
+            self.regex_cache = (key, patterns)
+        return self.regex_cache[1]
+    
+    def get_matcher(self, search_values):
+        """获取多模式匹配器，同一组搜索值只构建一次，处理多个文件时重复使用"""
+        key = tuple(search_values)
+        if self.matcher_cache is None or self.matcher_cache[0] != key:
+            self.matcher_cache = (key, AhoCorasickMatcher(search_values))
+        return self.matcher_cache[1]
+
+class RegexTimeoutError(Exception):
+    """正则表达式条件在单个文件上的执行时间超出预算"""
+
+class RegexGuard:
+    """正则表达式防护：保存规则时检查容易导致灾难性回溯的写法，执行时优先使用线性时间的re2引擎（已安装时）"""
+    re2_module = None
+    re2_checked = False
+    
+    @classmethod
+    def compile(cls, pattern):
+        """编译正则表达式，安装了re2时使用re2，re2不支持的语法（如反向引用）回退到re"""
+        if not cls.re2_checked:
+            cls.re2_checked = True
+            try:
+                import re2
+                cls.re2_module = re2
+            except ImportError:
+                pass
+        if cls.re2_module is not None:
+            try:
+                return cls.re2_module.compile(pattern)
+            except Exception:
+                pass
+        return re.compile(pattern)
+    
+    @staticmethod
+    def is_linear(compiled):
+        """编译结果是否由线性时间的re2引擎执行（否则为可能回溯失控的标准库re）"""
+        return not isinstance(compiled, re.Pattern)
+    
+    @staticmethod
+    def analyze(pattern):
+        """检查正则表达式中可能导致灾难性回溯的结构，返回问题描述列表"""
+        try:
+            import re._parser as sre_parse  # Python 3.11+
+        except ImportError:
+            import sre_parse
+        
+        try:
+            parsed = sre_parse.parse(pattern)
+        except re.error as e:
+            return [f"正则表达式无效: {str(e)}"]
+        
+        repeats = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+        problems = []
+        
+        def has_overlapping_branch(items):
+            # 分组内的分支也算作直接被量词重复；各分支以不同的字面字符开头时不会重叠
+            for op, av in items:
+                if op == sre_parse.BRANCH:
+                    firsts = [branch[0] if len(branch) else None for branch in av[1]]
+                    if not all(first and first[0] == sre_parse.LITERAL for first in firsts):
+                        return True
+                    if len({first[1] for first in firsts}) < len(firsts):
+                        return True
+                if op == sre_parse.SUBPATTERN and has_overlapping_branch(av[-1]):
+                    return True
+            return False
+        
+        def walk(items, outer_unbounded, outer_repeat):
+            for op, av in items:
+                if op in repeats:
+                    low, high, sub = av
+                    unbounded = high == sre_parse.MAXREPEAT
+                    # 固定次数的重复（如\d{3}）只有一种匹配方式，嵌套在其他量词中也不会产生多种拆分
+                    if outer_repeat and low != high and (unbounded or outer_unbounded):
+                        problems.append("嵌套的量词，例如 (a+)+ 或 (a*)*，匹配失败时可能大量回溯")
+                    if unbounded and has_overlapping_branch(sub):
+                        problems.append("重复的分支，例如 (a|ab)*，分支重叠时可能大量回溯")
+                    walk(sub, outer_unbounded or unbounded, outer_repeat or high > 1)
+                elif op == sre_parse.SUBPATTERN:
+                    walk(av[-1], outer_unbounded, outer_repeat)
+                elif op == sre_parse.BRANCH:
+                    for branch in av[1]:
+                        walk(branch, outer_unbounded, outer_repeat)
+                elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                    walk(av[1], outer_unbounded, outer_repeat)
+        
+        walk(parsed, False, False)
+        # 同一问题只报告一次
+        return list(dict.fromkeys(problems))
+
+def regex_sandbox_main(connection):
+    """正则表达式沙箱进程的主循环：接收(正则表达式列表, 文本列表)，返回每个文本是否匹配任一正则表达式（每个文本一个字节）"""
+    compiled = {}
+    while True:
+        try:
+            patterns, texts = connection.recv()
+        except EOFError:
+            return
+        regexes = []
+        for pattern in patterns:
+            if pattern not in compiled:
+                compiled[pattern] = re.compile(pattern)
+            regexes.append(compiled[pattern])
+        connection.send_bytes(bytes(any(regex.search(text) for regex in regexes) for text in texts))
+
+class RegexSandbox:
+    """在单独的进程中执行标准库re的正则条件。re的单次search回溯失控时无法在本进程中中断，
+    超出时间预算后直接结束沙箱进程，下次使用时重新启动"""
+    process = None
+    connection = None
+    lock = threading.Lock()
+
+    @classmethod
+    def search(cls, patterns, texts, timeout):
+        """返回每个文本是否匹配任一正则表达式的布尔数组，timeout秒内没有完成时抛出RegexTimeoutError"""
+        import multiprocessing
+        with cls.lock:
+            if cls.process is None or not cls.process.is_alive():
+                cls.connection, child_connection = multiprocessing.Pipe()
+                cls.process = multiprocessing.Process(target=regex_sandbox_main, args=(child_connection,), daemon=True)
+                cls.process.start()
+                child_connection.close()
+            cls.connection.send((patterns, texts))
+            if not cls.connection.poll(max(timeout, 0)):
+                cls.stop()
+                raise RegexTimeoutError("正则表达式执行超时")
+            return np.frombuffer(cls.connection.recv_bytes(), dtype=np.uint8).astype(bool)
+
+    @classmethod
+    def stop(cls):
+        """结束沙箱进程"""
+        if cls.process is not None:
+            cls.process.kill()
+            cls.process.join()
+            cls.connection.close()
+        cls.process = None
+        cls.connection = None
+
+class NormalizedColumnCache:
+    """单个DataFrame的规范化列缓存，所有规则和条件共用，每列在每种大小写模式下只转换一次"""
+    def __init__(self, df):
+        self.df = df
+        self.views = {}  # (列名, 是否区分大小写) -> 去除首尾空格后的文本列表
+    
+    def get(self, column, case_sensitive=True):
+        """返回列的文本视图，不区分大小写时为小写形式"""
+        key = (column, bool(case_sensitive))
+        texts = self.views.get(key)
+        if texts is None:
+            if case_sensitive:
+                series = self.df[column]
+                if series.ndim > 1:
+                    # 重名列取第一列
+                    series = series.iloc[:, 0]
+                texts = [str(value).strip() for value in series.tolist()]
+            else:
+                texts = [text.lower() for text in self.get(column, True)]
+            self.views[key] = texts
+        return texts
+
+class RuleStatistics:
+    """规则和条件的命中率与耗时统计，用于安排求值顺序（代价低、筛选性强的先求值），在多次运行之间保存"""
+    STATS_VERSION = 1
+    # 单项统计的行数上限，超过后减半，使统计逐渐反映最近的数据
+    MAX_ROWS = 1000000
+    # 没有统计数据时假定的命中率和每行耗时（秒）
+    DEFAULT_PASS_RATE = 0.5
+    DEFAULT_ROW_COST = 1e-6
+    
+    def __init__(self, stats_file):
+        self.stats_file = stats_file  # None表示只在内存中统计（子进程中）
+        self.entries = {}  # 键 -> [检查行数, 命中行数, 耗时秒数]
+        self.recorded = {}  # 本对象新记录的部分，子进程把它交回主程序合并
+        self.dirty = False
+    
+    @staticmethod
+    def condition_key(condition):
+        return json.dumps(["condition", condition.to_dict()], ensure_ascii=False, sort_keys=True)
+    
+    @staticmethod
+    def rule_key(rule):
+        return json.dumps(["rule", rule.to_dict()], ensure_ascii=False, sort_keys=True)
+    
+    def load(self):
+        """读取统计文件，文件损坏或版本不符时从空统计开始"""
+        try:
+            if os.path.exists(self.stats_file):
+                with open(self.stats_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == self.STATS_VERSION:
+                    self.entries = data.get("entries", {})
+        except Exception as e:
+            print(f"读取规则统计失败: {str(e)}")
+            self.entries = {}
+        self.dirty = False
+    
+    def save(self):
+        """有新统计时写回文件"""
+        if not self.dirty or not self.stats_file:
+            return
+        try:
+            with open(self.stats_file, 'w', encoding='utf-8') as f:
+                json.dump({"version": self.STATS_VERSION, "entries": self.entries}, f, ensure_ascii=False)
+            self.dirty = False
+        except Exception as e:
+            print(f"保存规则统计失败: {str(e)}")
+    
+    def record(self, key, rows, hits, seconds):
+        """累计一次求值的检查行数、命中行数和耗时"""
+        if not rows:
+            return
+        recorded = self.recorded.setdefault(key, [0, 0, 0.0])
+        recorded[0] += rows
+        recorded[1] += hits
+        recorded[2] += seconds
+        self.add(key, rows, hits, seconds)
+    
+    def merge(self, recorded):
+        """合并子进程记录的统计"""
+        for key, (rows, hits, seconds) in recorded.items():
+            self.add(key, rows, hits, seconds)
+    
+    def add(self, key, rows, hits, seconds):
+        """把统计累加到总数中"""
+        entry = self.entries.setdefault(key, [0, 0, 0.0])
+        entry[0] += rows
+        entry[1] += hits
+        entry[2] += seconds
+        if entry[0] > self.MAX_ROWS:
+            entry[:] = [entry[0] / 2, entry[1] / 2, entry[2] / 2]
+        self.dirty = True
+    
+    def estimate(self, key):
+        """返回(命中率, 每行耗时)，没有统计时使用默认值"""
+        entry = self.entries.get(key)
+        if not entry or not entry[0]:
+            return self.DEFAULT_PASS_RATE, self.DEFAULT_ROW_COST
+        rows, hits, seconds = entry
+        # 加一平滑，避免少量样本得出0或1的命中率
+        return (hits + 1) / (rows + 2), max(seconds / rows, 1e-9)
+    
+    def order_conditions(self, conditions, match_all):
+        """
+        返回条件的求值顺序（下标列表）
+        AND按 耗时/(1-命中率) 排序，先用便宜且能排除大部分行的条件；OR按 耗时/命中率 排序
+        """
+        def score(i):
+            pass_rate, cost = self.estimate(self.condition_key(conditions[i]))
+            return cost / (1 - pass_rate) if match_all else cost / pass_rate
+        return sorted(range(len(conditions)), key=score)
+    
+    def order_rules(self, rules):
+        """规则之间是"或"的关系，命中率高且便宜的规则先求值，后面的规则只需检查剩余的行"""
+        def score(rule):
+            pass_rate, cost = self.estimate(self.rule_key(rule))
+            return cost / pass_rate
+        return sorted(rules, key=score)
+
+class ColumnResolver:
+    """列名解析器：别名预先规范化为查找表，解析结果按表头签名缓存，
+    表头布局相同的文件只在第一次时逐个比较列名，之后直接命中缓存"""
+    MAX_CACHE_SIZE = 4096  # 缓存的最大条目数，超出后清空重建
+
+    def __init__(self):
+        self.cache = {}  # (表头签名, 规范化别名) -> (实际列名, 匹配方式) 或 None
+        self.compiled_aliases = {}  # 原始别名元组 -> 规范化别名元组
+
+    @staticmethod
+    def normalize(name):
+        """规范化列名：转为小写并去除首尾空格"""
+        return str(name).lower().strip()
+
+    def compile_aliases(self, aliases):
+        """预先规范化别名列表，相同的别名列表只处理一次"""
+        key = tuple(aliases)
+        compiled = self.compiled_aliases.get(key)
+        if compiled is None:
+            compiled = tuple(self.normalize(alias) for alias in key)
+            self.compiled_aliases[key] = compiled
+        return compiled
+
+    def resolve(self, columns, aliases):
+        """按别名顺序查找列：每个别名先精确匹配，再部分匹配（别名包含列名或列名包含别名）。
+        返回(实际列名, "精确匹配"/"部分匹配")，找不到时返回None"""
+        compiled = self.compile_aliases(aliases)
+        signature = tuple(columns)
+        key = (signature, compiled)
+        if key in self.cache:
+            return self.cache[key]
+
+        columns_lower = {self.normalize(col): col for col in signature}
+        result = None
+        for alias in compiled:
+            if alias in columns_lower:
+                result = (columns_lower[alias], "精确匹配")
+                break
+            for col_lower, col in columns_lower.items():
+                if alias in col_lower or col_lower in alias:
+                    result = (col, "部分匹配")
+                    break
+            if result:
+                break
+
+        if len(self.cache) >= self.MAX_CACHE_SIZE:
+            self.cache.clear()
+        self.cache[key] = result
+        return result
+
+def local_cache_folder(output_folder):
+    """输出文件夹对应的本地缓存文件夹。缓存文件用pickle保存，读取时可以执行任意代码，因此不放在
+    可能位于网络共享上的输出文件夹中，而是放在当前用户自己的缓存目录下，按输出文件夹的路径区分"""
+    import hashlib
+    base = (os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME")
+            or os.path.join(os.path.expanduser("~"), ".cache"))
+    key = hashlib.sha1(os.path.normcase(os.path.abspath(output_folder)).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(base, "ExcelComparisonTool", key)
+
+class MatchedFrameRegistry:
+    """匹配数据登记表，缓存本进程写出的_匹配文件对应的DataFrame，并在本地缓存文件夹中写入快速缓存文件，
+    合并匹配文件时无需重新解析Excel/CSV。内存占用超过预算时，较早登记的数据会转存到磁盘"""
+    SIDECAR_FOLDER = ".cache"  # 旧版本在输出文件夹中存放缓存文件的子文件夹名称（已不再使用）
+    SIDECAR_VERSION = 3  # 缓存文件格式版本，格式变化时旧缓存自动失效
+    CHUNK_ROWS = 5000  # 缓存文件和流式读取时每块的行数
+
+    def __init__(self, memory_budget_mb=512):
+        self.frames = {}  # 规范化的输出文件路径 -> (文件签名, DataFrame)，按登记顺序排列
+        self.frame_sizes = {}  # 规范化的输出文件路径 -> 占用字节数
+        self.total_size = 0  # frame_sizes的总和，随登记和释放同步更新
+        self.memory_budget_mb = memory_budget_mb  # 内存预算（MB），0表示不在内存中保留数据
+
+    @staticmethod
+    def normalize_path(file_path):
+        """规范化路径，作为登记表的键"""
+        return os.path.normcase(os.path.abspath(file_path))
+
+    @staticmethod
+    def file_signature(file_path):
+        """文件签名（修改时间和大小），用于判断缓存是否仍然有效。压缩包内的文件使用CRC和大小"""
+        if ArchiveFolder.split_path(file_path):
+            return ArchiveFolder.signature(file_path)
+        stat = os.stat(file_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def content_fingerprint(df):
+        """匹配数据的内容指纹（列名、类型和每行的哈希），无法计算时返回None"""
+        import hashlib
+        try:
+            digest = hashlib.sha1()
+            digest.update(json.dumps([[str(col), str(dtype)] for col, dtype in df.dtypes.items()], ensure_ascii=False).encode("utf-8"))
+            digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+            return digest.hexdigest()
+        except Exception as e:
+            print(f"计算内容指纹时出错: {str(e)}")
+            return None
+
+    @classmethod
+    def sidecar_path(cls, file_path):
+        """获取匹配文件对应的缓存文件路径（位于当前用户的本地缓存文件夹）"""
+        folder, file_name = os.path.split(file_path)
+        return os.path.join(local_cache_folder(folder), file_name + ".pkl")
+
+    def clear(self):
+        """清空内存中的登记数据（缓存文件保留在磁盘上）"""
+        self.frames.clear()
+        self.frame_sizes.clear()
+        self.total_size = 0
+
+    def memory_usage(self):
+        """当前登记表在内存中占用的字节数"""
+        return self.total_size
+
+    def store_frame(self, key, signature, df, size):
+        """在内存中登记数据（放到最后，作为最新登记的数据），同步更新占用总量"""
+        self.release(key)
+        self.frames[key] = (signature, df)
+        self.frame_sizes[key] = size
+        self.total_size += size
+
+    def release(self, key):
+        """从内存中释放一项数据，返回释放的字节数"""
+        self.frames.pop(key, None)
+        size = self.frame_sizes.pop(key, 0)
+        self.total_size -= size
+        return size
+
+    def register(self, file_path, df, fingerprint=None):
+        """登记刚写出的匹配文件及其数据，并写入缓存文件（同时记录内容指纹）"""
+        key = self.normalize_path(file_path)
+        signature = self.file_signature(file_path)
+        try:
+            self.write_sidecar(file_path, df, signature, fingerprint)
+        except Exception as e:
+            print(f"写入缓存文件时出错: {str(e)}")
+            # 缓存文件写入失败时不能转存，只能保留在内存中
+            self.store_frame(key, signature, df, 0)
+            return
+
+        self.store_frame(key, signature, df, int(df.memory_usage(deep=True).sum()))
+        self.enforce_budget()
+
+    def is_unchanged(self, file_path, fingerprint):
+        """匹配文件是否已存在、写出后未被修改且内容指纹与fingerprint相同"""
+        if fingerprint is None or not os.path.exists(file_path):
+            return False
+        meta = self.read_sidecar_meta(file_path, self.file_signature(file_path))
+        return meta is not None and meta.get("fingerprint") == fingerprint
+
+    def adopt(self, file_path, df):
+        """登记由子进程写出的匹配文件或内容未变化的已有匹配文件及其数据（缓存文件已存在）"""
+        key = self.normalize_path(file_path)
+        self.store_frame(key, self.file_signature(file_path), df, int(df.memory_usage(deep=True).sum()))
+        self.enforce_budget()
+
+    def enforce_budget(self):
+        """内存占用超过预算时，从最早登记的数据开始释放（数据已在缓存文件中）"""
+        budget = self.memory_budget_mb * 1024 * 1024
+        while self.frames and self.total_size > budget:
+            key = next(iter(self.frames))
+            released = self.release(key)
+            print(f"内存超出预算，已转存到磁盘: {key} ({released // 1024} KB)")
+
+    def write_sidecar(self, file_path, df, signature, fingerprint=None):
+        """写入缓存文件：先写元数据（签名、内容指纹、列名和分块数），再逐块写入数据"""
+        sidecar = self.sidecar_path(file_path)
+        os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+        chunk_count = max(1, -(-len(df) // self.CHUNK_ROWS))
+        meta = {
+            "version": self.SIDECAR_VERSION,
+            "signature": signature,
+            "fingerprint": fingerprint,
+            "columns": list(df.columns),
+            "rows": len(df),
+            "chunks": chunk_count
+        }
+        with open(sidecar, 'wb') as f:
+            pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+            for i in range(chunk_count):
+                chunk = df.iloc[i * self.CHUNK_ROWS:(i + 1) * self.CHUNK_ROWS]
+                pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def read_sidecar_meta(self, file_path, signature):
+        """读取缓存文件的元数据，签名不一致（匹配文件被修改过）时返回None"""
+        sidecar = self.sidecar_path(file_path)
+        if not os.path.exists(sidecar):
+            return None
+        try:
+            with open(sidecar, 'rb') as f:
+                meta = pickle.load(f)
+        except Exception as e:
+            print(f"读取缓存文件 {sidecar} 时出错: {str(e)}")
+            return None
+        if meta.get("version") != self.SIDECAR_VERSION or tuple(meta.get("signature", ())) != signature:
+            return None
+        return meta
+
+    def iter_sidecar_chunks(self, file_path):
+        """逐块读取缓存文件中的数据"""
+        with open(self.sidecar_path(file_path), 'rb') as f:
+            meta = pickle.load(f)
+            for _ in range(meta["chunks"]):
+                yield pickle.load(f)
+
+    def load_columns(self, file_path):
+        """只获取匹配文件的列名，不加载数据本身"""
+        signature = self.file_signature(file_path)
+        entry = self.frames.get(self.normalize_path(file_path))
+        if entry and entry[0] == signature:
+            return list(entry[1].columns)
+
+        meta = self.read_sidecar_meta(file_path, signature)
+        if meta is not None:
+            return meta["columns"]
+
+        # 没有可用的缓存，只读取原文件的表头
+        if file_path.lower().endswith(('.xlsx', '.xls')):
+            return list(pd.read_excel(file_path, nrows=0).columns)
+        return list(pd.read_csv(file_path, encoding='gb18030', nrows=0).columns)
+
+    def iter_chunks(self, file_path, chunk_rows=None):
+        """按块读取匹配文件数据：优先使用内存登记表，其次使用缓存文件，最后才流式解析原文件"""
+        chunk_rows = chunk_rows or self.CHUNK_ROWS
+        signature = self.file_signature(file_path)
+        entry = self.frames.get(self.normalize_path(file_path))
+        if entry and entry[0] == signature:
+            df = entry[1]
+            for start in range(0, max(len(df), 1), chunk_rows):
+                yield df.iloc[start:start + chunk_rows]
+            return
+
+        if self.read_sidecar_meta(file_path, signature) is not None:
+            yield from self.iter_sidecar_chunks(file_path)
+            return
+
+        # 没有可用的缓存，流式解析原文件
+        if file_path.lower().endswith('.xlsx'):
+            yield from self.iter_xlsx_chunks(file_path, chunk_rows)
+        elif file_path.lower().endswith('.xls'):
+            yield pd.read_excel(file_path)
+        else:  # CSV文件
+            yield from pd.read_csv(file_path, encoding='gb18030', chunksize=chunk_rows)
+
+    @staticmethod
+    def iter_xlsx_chunks(file_path, chunk_rows):
+        """使用openpyxl只读模式逐行解析xlsx的第一个工作表，按块生成DataFrame"""
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [col if col is not None else f"Unnamed: {i}" for i, col in enumerate(header)]
+            buffer = []
+            for row in rows:
+                if all(value is None for value in row):
+                    continue
+                buffer.append(row[:len(columns)])
+                if len(buffer) >= chunk_rows:
+                    yield pd.DataFrame(buffer, columns=columns)
+                    buffer = []
+            yield pd.DataFrame(buffer, columns=columns)
+        finally:
+            workbook.close()
+
+    def load(self, file_path):
+        """加载完整的匹配文件数据"""
+        return pd.concat(list(self.iter_chunks(file_path)), ignore_index=True)
+
+class MergeOutputWriter:
+    """合并结果写出器，按表逐批追加行数据，避免在内存中构建合并后的整体副本"""
+    CHUNK_ROWS = 5000  # 每批转换和写出的行数
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.is_csv = file_path.lower().endswith('.csv')
+        self.workbook = None
+        self.worksheet = None
+        self.csv_file = None
+
+        if not self.is_csv:
+            from openpyxl import Workbook
+            # 只写模式：行数据直接写入临时文件，内存占用与总行数无关
+            self.workbook = Workbook(write_only=True)
+
+    def start_sheet(self, sheet_name, columns):
+        """开始一个新的工作表并写入表头（CSV只支持单个表）"""
+        if self.is_csv:
+            if self.csv_file is not None:
+                raise ValueError("CSV格式只支持单个工作表")
+            self.csv_file = open(self.file_path, 'w', encoding='gb18030', newline='')
+            pd.DataFrame(columns=columns).to_csv(self.csv_file, index=False)
+        else:
+            self.worksheet = self.workbook.create_sheet(title=sheet_name)
+            self.worksheet.append(list(columns))
+
+    def append_frame(self, df):
+        """分批追加DataFrame的行到当前工作表"""
+        for start in range(0, len(df), self.CHUNK_ROWS):
+            chunk = df.iloc[start:start + self.CHUNK_ROWS]
+            if self.is_csv:
+                chunk.to_csv(self.csv_file, header=False, index=False)
+            else:
+                # 空值写为空单元格，与to_excel的行为一致
+                values = chunk.astype(object).where(chunk.notna(), None)
+                for row in values.itertuples(index=False, name=None):
+                    self.worksheet.append(row)
+
+    def close(self):
+        """保存并关闭输出文件"""
+        if self.is_csv:
+            if self.csv_file is not None:
+                self.csv_file.close()
+                self.csv_file = None
+        elif self.workbook is not None:
+            self.workbook.save(self.file_path)
+            self.workbook = None
+
+    def discard(self):
+        """放弃输出，不保存任何内容"""
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+            os.remove(self.file_path)
+        self.workbook = None
+
+class ResultStore:
+    """比对结果列存储：序号保存为整数数组，文本字段按字典编码保存为整数代码，
+    比对结果保存为分类代码，并在追加时同步更新各类结果的计数"""
+    FIELDS = ("序号", "Model", "总文件Part No", "对应文件Part No", "比对结果", "主文件")
+    STATUS_CATEGORIES = ("匹配", "不匹配", "其他结果", "错误")
+    STATUS_FIELD = 4  # 比对结果所在的字段位置
+    LABEL_FIELD = 5  # 批量比对时结果所属主文件的标签所在的字段位置
+    TEXT_FIELDS = (1, 2, 3, 5)  # 按字典编码保存的文本字段
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """清空所有结果和计数"""
+        self.sequence = array('q')  # 序号
+        self.codes = {field: array('i') for field in self.TEXT_FIELDS}  # 文本字段的字典代码
+        self.dictionaries = {field: [] for field in self.TEXT_FIELDS}  # 代码 -> 文本
+        self.lookups = {field: {} for field in self.TEXT_FIELDS}  # 文本 -> 代码
+        self.status_codes = array('b')  # 比对结果的分类代码
+        self.status_counts = [0] * len(self.STATUS_CATEGORIES)
+
+    def get_state(self):
+        """导出存储内容，用于保存比对进度"""
+        return {
+            "sequence": self.sequence,
+            "codes": self.codes,
+            "dictionaries": self.dictionaries,
+            "status_codes": self.status_codes,
+            "status_counts": self.status_counts
+        }
+
+    def set_state(self, state):
+        """恢复get_state导出的内容，文本到代码的查找表由字典重建"""
+        self.sequence = state["sequence"]
+        self.codes = state["codes"]
+        self.dictionaries = state["dictionaries"]
+        self.lookups = {field: {value: code for code, value in enumerate(values)}
+                        for field, values in self.dictionaries.items()}
+        self.status_codes = state["status_codes"]
+        self.status_counts = state["status_counts"]
+
+    def encode(self, field, value):
+        """获取文本的字典代码，新文本追加到字典末尾"""
+        lookup = self.lookups[field]
+        code = lookup.get(value)
+        if code is None:
+            code = len(self.dictionaries[field])
+            self.dictionaries[field].append(value)
+            lookup[value] = code
+        return code
+
+    def append(self, result):
+        """追加一条结果（序号, Model, 总文件Part No, 对应文件Part No, 比对结果[, 主文件标签]），没有标签时记为空"""
+        sequence, model, master_part_no, file_part_no, status = result[:5]
+        label = result[5] if len(result) > 5 else ""
+        status_code = self.STATUS_CATEGORIES.index(status)
+        self.sequence.append(sequence)
+        self.codes[1].append(self.encode(1, model))
+        self.codes[2].append(self.encode(2, master_part_no))
+        self.codes[3].append(self.encode(3, file_part_no))
+        self.codes[5].append(self.encode(5, label))
+        self.status_codes.append(status_code)
+        self.status_counts[status_code] += 1
+
+    def has_labels(self):
+        """结果中是否有主文件标签（批量比对的结果）"""
+        return any(self.dictionaries[self.LABEL_FIELD])
+
+    def label_count(self):
+        """结果中不同主文件标签的数量"""
+        return sum(1 for label in self.dictionaries[self.LABEL_FIELD] if label)
+
+    def count(self, status):
+        """获取某类比对结果的数量"""
+        return self.status_counts[self.STATUS_CATEGORIES.index(status)]
+
+    def value(self, field, index):
+        """获取第index行某个字段的值"""
+        if field == 0:
+            return self.sequence[index]
+        if field == self.STATUS_FIELD:
+            return self.STATUS_CATEGORIES[self.status_codes[index]]
+        return self.dictionaries[field][self.codes[field][index]]
+
+    def row(self, index):
+        """组装第index行的结果元组"""
+        return tuple(self.value(field, index) for field in range(len(self.FIELDS)))
+
+    def matching_codes(self, field, text):
+        """在字典中查找包含text（不区分大小写）的文本代码，过滤时只需比较整数"""
+        return {code for code, value in enumerate(self.dictionaries[field]) if text in str(value).lower()}
+
+    def sort_key(self, field):
+        """生成按某字段排序的键函数：序号按数值，文本字段按字典中的排名，比对结果按分类顺序"""
+        if field == 0:
+            return self.sequence.__getitem__
+        if field == self.STATUS_FIELD:
+            return self.status_codes.__getitem__
+        dictionary = self.dictionaries[field]
+        ranks = [0] * len(dictionary)
+        for rank, code in enumerate(sorted(range(len(dictionary)), key=lambda c: str(dictionary[c]))):
+            ranks[code] = rank
+        codes = self.codes[field]
+        return lambda i: ranks[codes[i]]
+
+    def value_key(self, field):
+        """与sort_key顺序一致、但不依赖字典排名的键函数，字典增长后仍然有效，用于向已排序的行号列表中插入新行"""
+        if field == 0:
+            return self.sequence.__getitem__
+        if field == self.STATUS_FIELD:
+            return self.status_codes.__getitem__
+        dictionary, codes = self.dictionaries[field], self.codes[field]
+        return lambda i: str(dictionary[codes[i]])
+
+    def to_dataframe(self, columns=None):
+        """转换为DataFrame：文本字段转换为分类列（只复制整数代码，不复制文本）。没有主文件标签时不输出主文件列。
+        数组先复制一份：直接引用array的缓冲区会锁定它，DataFrame仍被引用时再追加结果会抛出BufferError"""
+        columns = columns or self.FIELDS
+        data = {columns[0]: np.array(self.sequence, dtype=np.int64)}
+        for field in self.TEXT_FIELDS:
+            if field == self.LABEL_FIELD and not self.has_labels():
+                continue
+            codes = np.array(self.codes[field], dtype=np.int32)
+            categories = pd.Index(self.dictionaries[field], dtype=object)
+            data[columns[field]] = pd.Categorical.from_codes(codes, categories=categories)
+        status_codes = np.array(self.status_codes, dtype=np.int8)
+        data[columns[self.STATUS_FIELD]] = pd.Categorical.from_codes(status_codes, categories=self.STATUS_CATEGORIES)
+        return pd.DataFrame(data, columns=[column for column in columns if column in data], copy=False)
+
+    def __len__(self):
+        return len(self.sequence)
+
+    def __iter__(self):
+        return (self.row(i) for i in range(len(self)))
+
+class VirtualResultView:
+    """虚拟化结果表格：数据保存在列存储中，Treeview只保留当前可见的几十行，
+    滚动、排序和过滤都只操作行号列表，不创建或删除大量表格项目"""
+    STATUS_OPTIONS = ("全部", "匹配", "不匹配", "其他结果", "错误")
+
+    def __init__(self, parent, store, columns, column_widths):
+        self.store = store
+        self.columns = columns
+        self.view_index = []  # 过滤和排序后要显示的行号
+        self.scanned = 0  # 已经检查过过滤条件的行数
+        self.top = 0  # 第一个可见行在view_index中的位置
+        self.visible_rows = 1  # 可见区域能显示的行数
+        self.items = []  # 当前存在的Treeview项目（数量不超过可见行数）
+        self.sort_field = None  # 当前排序的字段位置
+        self.sort_reverse = False
+        self.filter_job = None  # 延迟执行过滤的定时任务
+        self.label_column_shown = None  # 主文件列当前是否显示
+
+        # 过滤工具栏
+        filter_frame = ttk.Frame(parent)
+        filter_frame.grid(row=0, column=0, columnspan=2, sticky='ew', pady=(0, 5))
+
+        self.status_filter = tk.StringVar(value="全部")
+        self.model_filter = tk.StringVar()
+        self.partno_filter = tk.StringVar()
+
+        ttk.Label(filter_frame, text="比对结果:").pack(side=tk.LEFT)
+        ttk.Combobox(filter_frame, textvariable=self.status_filter, values=self.STATUS_OPTIONS,
+                     state="readonly", width=8).pack(side=tk.LEFT, padx=(2, 10))
+        ttk.Label(filter_frame, text="Model:").pack(side=tk.LEFT)
+        ttk.Entry(filter_frame, textvariable=self.model_filter, width=15).pack(side=tk.LEFT, padx=(2, 10))
+        ttk.Label(filter_frame, text="Part No:").pack(side=tk.LEFT)
+        ttk.Entry(filter_frame, textvariable=self.partno_filter, width=20).pack(side=tk.LEFT, padx=(2, 10))
+
+        self.count_var = tk.StringVar(value="")
+        ttk.Label(filter_frame, textvariable=self.count_var).pack(side=tk.RIGHT)
+
+        for var in (self.status_filter, self.model_filter, self.partno_filter):
+            var.trace_add("write", lambda *args: self.schedule_filter())
+
+        # 表格和滚动条
+        self.tree = ttk.Treeview(parent, columns=columns, show="headings")
+        for field_index, col in enumerate(columns):
+            self.tree.heading(col, text=col, command=lambda i=field_index: self.sort_by(i))
+            self.tree.column(col, width=column_widths[col], minwidth=50)
+
+        # 垂直滚动条直接控制行号窗口，而不是Treeview本身
+        self.v_scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.on_scrollbar)
+        h_scrollbar = ttk.Scrollbar(parent, orient=tk.HORIZONTAL, command=self.tree.xview)
+        self.tree.configure(xscrollcommand=h_scrollbar.set)
+
+        self.tree.grid(row=1, column=0, sticky='nsew')
+        self.v_scrollbar.grid(row=1, column=1, sticky='ns')
+        h_scrollbar.grid(row=2, column=0, sticky='ew')
+
+        parent.columnconfigure(0, weight=1)
+        parent.rowconfigure(1, weight=1)
+
+        self.update_label_column()
+
+        self.tree.bind('<Configure>', self.on_resize)
+        self.tree.bind('<MouseWheel>', self.on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(3))
+
+    def reset(self):
+        """清空结果和显示"""
+        self.store.clear()
+        self.view_index = []
+        self.scanned = 0
+        self.top = 0
+        self.render()
+
+    def row_matches(self, index):
+        """检查第index行是否满足当前的过滤条件（用于新追加的少量行）"""
+        store = self.store
+        status = self.status_filter.get()
+        if status != "全部" and store.value(store.STATUS_FIELD, index) != status:
+            return False
+        model_text = self.model_filter.get().strip().lower()
+        if model_text and model_text not in str(store.value(1, index)).lower():
+            return False
+        partno_text = self.partno_filter.get().strip().lower()
+        if partno_text:
+            master_pn = str(store.value(2, index)).lower()
+            file_pn = str(store.value(3, index)).lower()
+            if partno_text not in master_pn and partno_text not in file_pn:
+                return False
+        return True
+
+    def build_filter(self):
+        """根据当前过滤条件生成按代码比较的判断函数（用于全量过滤），没有过滤条件时返回None。
+        文本条件先在字典中求出匹配的代码集合，逐行只需做整数查找"""
+        store = self.store
+        checks = []
+        status = self.status_filter.get()
+        if status != "全部":
+            status_code = store.STATUS_CATEGORIES.index(status)
+            status_codes = store.status_codes
+            checks.append(lambda i: status_codes[i] == status_code)
+        model_text = self.model_filter.get().strip().lower()
+        if model_text:
+            model_codes = store.codes[1]
+            matched_models = store.matching_codes(1, model_text)
+            checks.append(lambda i: model_codes[i] in matched_models)
+        partno_text = self.partno_filter.get().strip().lower()
+        if partno_text:
+            master_codes, file_codes = store.codes[2], store.codes[3]
+            matched_master = store.matching_codes(2, partno_text)
+            matched_file = store.matching_codes(3, partno_text)
+            checks.append(lambda i: master_codes[i] in matched_master or file_codes[i] in matched_file)
+        if not checks:
+            return None
+        return lambda i: all(check(i) for check in checks)
+
+    def has_filter(self):
+        """是否设置了任何过滤条件"""
+        return (self.status_filter.get() != "全部" or self.model_filter.get().strip()
+                or self.partno_filter.get().strip())
+
+    def schedule_filter(self):
+        """输入过滤条件时延迟执行，避免每输入一个字符都扫描全部结果"""
+        if self.filter_job is not None:
+            self.tree.after_cancel(self.filter_job)
+        self.filter_job = self.tree.after(200, self.refresh)
+
+    def refresh(self):
+        """重新计算过滤和排序后的行号列表并刷新显示"""
+        self.filter_job = None
+        total = len(self.store)
+        predicate = self.build_filter()
+        if predicate is not None:
+            self.view_index = [i for i in range(total) if predicate(i)]
+        else:
+            self.view_index = list(range(total))
+        self.scanned = total
+        self.apply_sort()
+        self.top = 0
+        self.render()
+
+    def notify_appended(self):
+        """结果存储中追加了新行时调用，只检查新增的行"""
+        total = len(self.store)
+        if total < self.scanned:
+            # 存储被清空过，整体重新计算
+            self.refresh()
+            return
+        if total == self.scanned:
+            return
+        filtering = self.has_filter()
+        new_rows = [i for i in range(self.scanned, total) if not filtering or self.row_matches(i)]
+        self.scanned = total
+        if self.sort_field is None:
+            self.view_index.extend(new_rows)
+        elif len(new_rows) > len(self.view_index) // 8:
+            # 新行较多时整体重新排序
+            self.view_index.extend(new_rows)
+            self.apply_sort()
+        else:
+            for i in new_rows:
+                self.insert_sorted(i)
+        self.render()
+
+    def insert_sorted(self, index):
+        """按当前排序把新行插入到行号列表中，与已有的相同值排在其后（与稳定排序的结果一致）"""
+        key = self.store.value_key(self.sort_field)
+        value = key(index)
+        view = self.view_index
+        low, high = 0, len(view)
+        while low < high:
+            middle = (low + high) // 2
+            current = key(view[middle])
+            if (current < value) if self.sort_reverse else (current > value):
+                high = middle
+            else:
+                low = middle + 1
+        view.insert(low, index)
+
+    def apply_sort(self):
+        """按当前排序字段对行号列表排序"""
+        if self.sort_field is not None:
+            self.view_index.sort(key=self.store.sort_key(self.sort_field), reverse=self.sort_reverse)
+
+    def sort_by(self, field_index):
+        """点击列标题排序，再次点击同一列切换升序/降序"""
+        if self.sort_field == field_index:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_field = field_index
+            self.sort_reverse = False
+        for i, col in enumerate(self.columns):
+            arrow = ""
+            if i == self.sort_field:
+                arrow = " ▼" if self.sort_reverse else " ▲"
+            self.tree.heading(col, text=col + arrow)
+        self.apply_sort()
+        self.top = 0
+        self.render()
+
+    def on_resize(self, event):
+        """窗口大小变化时重新计算可见行数"""
+        row_height = 25
+        try:
+            row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 25)
+        except (tk.TclError, ValueError):
+            pass
+        # 减去表头占用的高度
+        self.visible_rows = max(1, (event.height - row_height) // row_height)
+        self.render()
+
+    def on_mousewheel(self, event):
+        """鼠标滚轮滚动"""
+        self.scroll(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def on_scrollbar(self, *args):
+        """滚动条回调：拖动（moveto）或点击箭头/空白区域（scroll）"""
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.view_index))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= self.visible_rows
+            self.top += amount
+        self.render()
+
+    def scroll(self, amount):
+        """按行数滚动"""
+        self.top += amount
+        self.render()
+
+    def update_label_column(self):
+        """只有比对了多个主文件时才显示主文件列"""
+        shown = self.store.label_count() > 1
+        if shown != self.label_column_shown:
+            self.label_column_shown = shown
+            label_field = self.store.LABEL_FIELD
+            self.tree.configure(displaycolumns=[col for i, col in enumerate(self.columns) if shown or i != label_field])
+
+    def render(self):
+        """只为可见窗口中的行更新Treeview项目"""
+        self.update_label_column()
+        total = len(self.view_index)
+        self.top = max(0, min(self.top, total - self.visible_rows))
+        count = max(0, min(self.visible_rows, total - self.top))
+
+        # 保持项目数量与可见行数一致，多余的删除，不足的补充
+        while len(self.items) > count:
+            self.tree.delete(self.items.pop())
+        for k in range(count):
+            values = self.store.row(self.view_index[self.top + k])
+            if k < len(self.items):
+                self.tree.item(self.items[k], values=values)
+            else:
+                self.items.append(self.tree.insert("", tk.END, values=values))
+
+        if total:
+            self.v_scrollbar.set(self.top / total, (self.top + count) / total)
+        else:
+            self.v_scrollbar.set(0, 1)
+        self.count_var.set(f"显示 {total} / {len(self.store)} 条结果")
+
+class PartNoIndex:
+    """Part No倒排索引：记录比对文件夹中每个文件主键列的值所在的位置（文件、工作表、行号），
+    用于反查某个Part No出现在哪些文件中。索引保存在本地缓存文件夹中，更新时只重新读取有变化的文件"""
+    INDEX_VERSION = 1  # 索引文件格式版本
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.config_key = None  # 建立索引时使用的主键列配置，配置变化后索引整体失效
+        self.files = {}  # 文件名 -> {"signature": 文件签名, "sheet": 工作表, "entries": [(规范化Part No, 行号)]}
+        self.postings = {}  # 规范化Part No -> {文件名: [(工作表, 行号)]}
+
+    @staticmethod
+    def normalize(part_no):
+        """规范化Part No：去除首尾空格并忽略大小写"""
+        return str(part_no).strip().casefold()
+
+    def load(self):
+        """从磁盘加载索引，文件不存在或格式不符时保持为空"""
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = pickle.load(f)
+            if data.get("version") == self.INDEX_VERSION:
+                self.config_key = data["config_key"]
+                self.files = data["files"]
+                self.postings = data["postings"]
+        except Exception as e:
+            print(f"加载Part No索引时出错: {str(e)}")
+
+    def save(self):
+        """保存索引到磁盘"""
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        data = {
+            "version": self.INDEX_VERSION,
+            "config_key": self.config_key,
+            "files": self.files,
+            "postings": self.postings
+        }
+        with open(self.index_path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def remove_file(self, file_name):
+        """从索引中移除一个文件的所有记录"""
+        entry = self.files.pop(file_name, None)
+        if not entry:
+            return
+        for part_no, _ in entry["entries"]:
+            locations = self.postings.get(part_no)
+            if locations is not None:
+                locations.pop(file_name, None)
+                if not locations:
+                    del self.postings[part_no]
+
+    def add_file(self, file_name, signature, sheet_name, values):
+        """添加一个文件的记录，values为[(行号, Part No)]"""
+        entries = []
+        for row_number, part_no in values:
+            key = self.normalize(part_no)
+            if not key:
+                continue
+            entries.append((key, row_number))
+            self.postings.setdefault(key, {}).setdefault(file_name, []).append((sheet_name, row_number))
+        self.files[file_name] = {"signature": signature, "sheet": sheet_name, "entries": entries}
+
+    def update(self, folder_path, file_names, read_values, config_key, progress=None):
+        """增量更新索引：删除已不存在的文件，只重新读取新增或修改过的文件。
+        read_values(file_path)返回(工作表, [(行号, Part No)])，返回(更新文件数, 删除文件数, 出错文件列表)"""
+        if config_key != self.config_key:
+            # 主键列配置变化，重新建立全部索引
+            self.files.clear()
+            self.postings.clear()
+            self.config_key = config_key
+
+        current_names = set(file_names)
+        removed = [name for name in self.files if name not in current_names]
+        for name in removed:
+            self.remove_file(name)
+
+        updated = 0
+        failed = []
+        for i, file_name in enumerate(file_names):
+            file_path = os.path.join(folder_path, file_name)
+            try:
+                signature = MatchedFrameRegistry.file_signature(file_path)
+            except OSError:
+                continue
+            entry = self.files.get(file_name)
+            if entry and entry["signature"] == signature:
+                continue
+            if progress:
+                progress(i + 1, len(file_names), file_name)
+            self.remove_file(file_name)
+            try:
+                sheet_name, values = read_values(file_path)
+            except Exception as e:
+                print(f"建立索引时读取文件 {file_name} 出错: {str(e)}")
+                failed.append(file_name)
+                continue
+            self.add_file(file_name, signature, sheet_name, values)
+            updated += 1
+
+        if updated or removed:
+            self.save()
+        return updated, len(removed), failed
+
+    def query(self, part_no):
+        """查询Part No所在的位置，返回[(文件名, 工作表, 行号)]"""
+        locations = self.postings.get(self.normalize(part_no), {})
+        return [(file_name, sheet_name, row_number)
+                for file_name, rows in sorted(locations.items())
+                for sheet_name, row_number in rows]
+
+class CsvEncodingError(ValueError):
+    """CSV文件无法使用常见编码读取"""
+
+class FileExtractor:
+    """比对文件的提取过程：读取文件、按规则筛选行并写出匹配文件。
+    不依赖界面，既在主程序中使用，也在并行处理的子进程中运行"""
+    SHEET_COLUMN = "工作表"  # 读取所有工作表时标注每行来源工作表的列名
+    def __init__(self, comparison_rules, extract_columns, extract_all_when_no_rules=False,
+                 regex_time_budget_seconds=30, column_resolver=None, rule_stats=None,
+                 matched_registry=None, timed_out_rules=None, written_files=None,
+                 write_matched_files=True, deferred_matches=None, all_sheets=False, output_names=None):
+        self.comparison_rules = comparison_rules
+        self.extract_columns = extract_columns
+        self.extract_all_when_no_rules = extract_all_when_no_rules  # 无规则时是否提取所有行
+        self.regex_time_budget_seconds = regex_time_budget_seconds
+        self.column_resolver = column_resolver if column_resolver is not None else ColumnResolver()
+        self.rule_stats = rule_stats if rule_stats is not None else RuleStatistics(None)
+        # 子进程中不在内存中保留匹配数据，只写出缓存文件供主程序合并时使用
+        self.matched_registry = matched_registry if matched_registry is not None else MatchedFrameRegistry(0)
+        self.timed_out_rules = timed_out_rules if timed_out_rules is not None else {}  # 规则在规则列表中的位置 -> (规则名, 超时的文件名)
+        self.written_files = written_files if written_files is not None else []  # 写出的匹配文件
+        # 为False时只比对：不写出匹配文件，只记录匹配行的位置，需要时再生成
+        self.write_matched_files = write_matched_files
+        self.deferred_matches = deferred_matches if deferred_matches is not None else {}  # 匹配文件 -> (比对文件, 文件签名, 匹配行位置, 是否读取所有工作表)
+        self.all_sheets = all_sheets  # 是否读取Excel比对文件的所有工作表
+        self.output_names = output_names if output_names is not None else {}  # 匹配文件名冲突的比对文件：相对路径(小写) -> 匹配文件名
+    
+    def get_settings(self):
+        """导出传给子进程的设置：规则、提取列、当前的规则统计和已超时的规则"""
+        return {
+            "rules": [rule.to_dict() for rule in self.comparison_rules],
+            "extract_columns": [column.to_dict() for column in self.extract_columns],
+            "extract_all_when_no_rules": self.extract_all_when_no_rules,
+            "regex_time_budget_seconds": self.regex_time_budget_seconds,
+            "rule_stats": self.rule_stats.entries,
+            "timed_out_rules": dict(self.timed_out_rules),
+            "write_matched_files": self.write_matched_files,
+            "all_sheets": self.all_sheets,
+            "output_names": self.output_names
+        }
+    
+    @classmethod
+    def from_settings(cls, settings):
+        """由get_settings导出的设置创建提取器"""
+        rule_stats = RuleStatistics(None)
+        rule_stats.entries = settings["rule_stats"]
+        return cls(
+            comparison_rules=[ComparisonRule.from_dict(rule) for rule in settings["rules"]],
+            extract_columns=[ExtractColumn.from_dict(column) for column in settings["extract_columns"]],
+            extract_all_when_no_rules=settings["extract_all_when_no_rules"],
+            regex_time_budget_seconds=settings["regex_time_budget_seconds"],
+            rule_stats=rule_stats,
+            timed_out_rules=settings["timed_out_rules"],
+            write_matched_files=settings.get("write_matched_files", True),
+            all_sheets=settings.get("all_sheets", False),
+            output_names=settings.get("output_names")
+        )
+    
+    def merge_worker_result(self, result):
+        """合并子进程返回的超时规则、写出的文件、暂不生成的匹配文件和规则统计"""
+        self.timed_out_rules.update(result["timed_out_rules"])
+        for output_file in result["written_files"]:
+            if output_file not in self.written_files:
+                self.written_files.append(output_file)
+        self.deferred_matches.update(result["deferred_matches"])
+        self.rule_stats.merge(result["rule_stats"])
+    
+    @staticmethod
+    def read_file(file_path, data=None, all_sheets=False):
+        """
+        根据文件类型读取比对文件：Excel使用第一个有数据的工作表，CSV依次尝试常见编码
+        data为预先读入内存的文件内容，提供时不再访问磁盘
+        all_sheets为True时读取Excel文件所有有数据的工作表，合并为一个表并在"工作表"列中标注每行的来源
+        """
+        if data is None and ArchiveFolder.split_path(file_path):
+            # 压缩包内的文件直接读入内存，不解压到磁盘
+            data = ArchiveFolder.read(file_path)
+        
+        def open_source():
+            return io.BytesIO(data) if data is not None else file_path
+        
+        if file_path.lower().endswith(('.xlsx', '.xls')):
+            # 读取Excel文件，尝试获取所有工作表名称（各工作表共用同一个打开的文件）
+            xls = pd.ExcelFile(open_source())
+            sheet_names = xls.sheet_names
+            
+            if not sheet_names:
+                raise ValueError(f"Excel文件不包含任何工作表: {file_path}")
+            
+            if all_sheets:
+                # 各工作表从同一个打开的文件中依次解析，共用文件目录和共享字符串表，每个工作表只读取一次
+                frames = []
+                for sheet in sheet_names:
+                    temp_df = pd.read_excel(xls, sheet_name=sheet)
+                    if not temp_df.empty:
+                        temp_df.insert(0, FileExtractor.SHEET_COLUMN, sheet, allow_duplicates=True)
+                        frames.append(temp_df)
+                if frames:
+                    print(f"在 {len(frames)} 个工作表中找到数据")
+                    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+            
+            # 尝试读取所有工作表，直到找到有数据的工作表
+            for sheet in sheet_names:
+                temp_df = pd.read_excel(xls, sheet_name=sheet)
+                if not temp_df.empty:
+                    print(f"在工作表 '{sheet}' 中找到数据")
+                    # 记录数据所在的工作表，供索引等功能定位行
+                    temp_df.attrs["sheet_name"] = sheet
+                    return temp_df
+            
+            # 如果所有工作表都为空，尝试不同的header选项
+            for sheet in sheet_names:
+                for header_row in range(5):  # 尝试前5行作为表头
+                    try:
+                        temp_df = pd.read_excel(xls, sheet_name=sheet, header=header_row)
+                        if not temp_df.empty and len(temp_df.columns) > 1:  # 确保有多列数据
+                            temp_df.attrs["sheet_name"] = sheet
+                            temp_df.attrs["header_row"] = header_row
+                            return temp_df
+                    except Exception:
+                        pass
+            
+            raise ValueError(f"无法从Excel文件中读取有效数据: {file_path}")
+        
+        elif file_path.lower().endswith('.csv'):
+            # 读取CSV文件，优先尝试中文编码
+            # 根据日志分析，调整编码尝试顺序，将中文编码放在前面
+            encodings = ['gb18030', 'gbk', 'gb2312', 'utf-8', 'latin1']
+            
+            for encoding in encodings:
+                try:
+                    print(f"尝试使用编码 {encoding} 读取CSV文件...")
+                    df = pd.read_csv(open_source(), encoding=encoding)
+                    if not df.empty:
+                        print(f"成功使用编码 {encoding} 读取CSV文件")
+                        return df
+                except Exception as e:
+                    print(f"尝试使用编码 {encoding} 读取失败: {str(e)}")
+            
+            raise CsvEncodingError(f"无法自动识别CSV文件编码: {file_path}")
+        else:
+            raise ValueError(f"不支持的文件类型: {file_path}")
+    
+    @staticmethod
+    def primary_extract_column(extract_columns):
+        """从提取列配置中获取主键列，没有设置主键列时使用第一个启用的列"""
+        for column in extract_columns:
+            if column.is_primary and column.enabled:
+                return column
+        
+        for column in extract_columns:
+            if column.enabled:
+                return column
+        return None
+    
+    @classmethod
+    def resolve_primary_column(cls, extract_columns, column_resolver, columns):
+        """用提取列配置和列名解析器在给定的列名中查找主键列，返回(主键列配置, 实际列名)"""
+        primary_column = cls.primary_extract_column(extract_columns)
+        if not primary_column:
+            print("没有找到可用的主键列配置")
+            return None, None
+        
+        # 查找主键列的实际列名，相同表头布局直接使用缓存的解析结果
+        match = column_resolver.resolve(columns, primary_column.search_names)
+        if match:
+            print(f"找到主键列 '{primary_column.name}'({match[1]}): {match[0]}")
+            return primary_column, match[0]
+        
+        print(f"找不到主键列 '{primary_column.name}'")
+        return primary_column, None
+    
+    def get_primary_extract_column(self):
+        """获取主键列配置，没有设置主键列时使用第一个启用的列"""
+        return self.primary_extract_column(self.extract_columns)
+    
+    def find_primary_column(self, columns):
+        """在给定的列名中查找主键列，返回(主键列配置, 实际列名)"""
+        return self.resolve_primary_column(self.extract_columns, self.column_resolver, columns)
+    
+    @staticmethod
+    def get_output_file(file_path, output_folder, output_names=None):
+        """比对文件对应的匹配文件路径。子文件夹或压缩包中的文件以相对于比对文件夹的路径（各级以"_"连接）命名，
+        不同文件夹中的同名文件不会写到同一个匹配文件。output_names为output_file_names的结果，
+        连接后与其他文件重名的文件（如sub_Y200.csv与sub/Y200.csv）使用其中加了序号的名称"""
+        try:
+            relative = os.path.relpath(file_path, os.path.dirname(output_folder)).replace("\\", "/")
+        except ValueError:
+            # 不在同一个驱动器上
+            relative = os.path.basename(file_path)
+        if relative.startswith("../"):
+            relative = os.path.basename(file_path)
+        file_base, file_ext = os.path.splitext(relative)
+        file_base = (output_names or {}).get(relative.lower(), file_base.replace('/', '_'))
+        return os.path.join(output_folder, f"{file_base}_匹配{file_ext}")
+    
+    @staticmethod
+    def output_file_names(model_files):
+        """找出匹配文件名冲突的比对文件：各级以"_"连接后同名的文件中，层级最浅的保留原名，其余依次加上序号(_2、_3…)。
+        返回{相对路径(小写): 匹配文件名(不含"_匹配"和扩展名)}，只包含需要加序号的文件"""
+        groups = {}
+        for file in model_files:
+            relative = file.replace("\\", "/")
+            file_base, file_ext = os.path.splitext(relative)
+            groups.setdefault((file_base.replace("/", "_") + file_ext).lower(), []).append(relative)
+        
+        taken = set(groups)
+        output_names = {}
+        for files in groups.values():
+            files.sort(key=lambda relative: (relative.count("/"), relative.lower()))
+            number = 1
+            for relative in files[1:]:
+                file_base, file_ext = os.path.splitext(relative)
+                # 加序号后的名称也不能与其他文件的名称相同
+                while True:
+                    number += 1
+                    name = f"{file_base.replace('/', '_')}_{number}"
+                    if (name + file_ext).lower() not in taken:
+                        break
+                taken.add((name + file_ext).lower())
+                output_names[relative.lower()] = name
+        return output_names
+    
+    @staticmethod
+    def write_matched_file(matched_df, output_file, registry):
+        """写出匹配文件（格式与比对文件相同）并登记，合并时无需重新读取刚写出的文件。
+        已有的匹配文件未被修改且内容指纹相同时不重新写出，文件的修改时间保持不变。返回是否写出了文件"""
+        fingerprint = MatchedFrameRegistry.content_fingerprint(matched_df)
+        if registry.is_unchanged(output_file, fingerprint):
+            registry.adopt(output_file, matched_df)
+            return False
+        
+        if output_file.lower().endswith(('.xlsx', '.xls')):
+            matched_df.to_excel(output_file, index=False)
+        else:  # CSV文件
+            matched_df.to_csv(output_file, encoding='gb18030', index=False)
+        registry.register(output_file, matched_df, fingerprint)
+        return True
+    
+    def extract_special_part_nos(self, df, file_path, output_folder):
+        """
+        根据自定义规则和提取列配置从DataFrame中提取数据
+        """
+        try:
+            # 查找主键列（通常是Part No）及其实际列名
+            primary_column, primary_actual_col = self.find_primary_column(df.columns)
+            
+            if not primary_column or not primary_actual_col:
+                return []
+            
+            # 规范化列缓存，所有规则共用，每列只转换一次
+            cache = NormalizedColumnCache(df)
+            part_nos = cache.get(primary_actual_col)
+            
+            # 检查是否有启用的规则
+            has_enabled_rules = any(rule.enabled for rule in self.comparison_rules)
+            has_rule_conditions = any(rule.enabled and rule.conditions for rule in self.comparison_rules)
+            
+            # 如果没有规则或没有条件，且设置为提取所有行
+            if (not has_enabled_rules or not has_rule_conditions) and self.extract_all_when_no_rules:
+                print("没有启用的规则或规则没有条件，且设置了提取所有行")
+                matched = np.ones(len(df), dtype=bool)  # 提取所有行
+            else:
+                # 应用所有启用的规则，每条规则的条件列一次性解析，按列整体求值
+                # 规则按统计的命中率和耗时排序，每条规则只检查尚未被前面规则匹配的行
+                matched = np.zeros(len(df), dtype=bool)
+                enabled_rules = self.rule_stats.order_rules([rule for rule in self.comparison_rules if rule.enabled])
+                # 规则名可能重复，超时的规则按其在规则列表中的位置记录
+                rule_positions = {id(rule): position for position, rule in enumerate(self.comparison_rules)}
+                
+                for rule in enabled_rules:
+                    rule_position = rule_positions[id(rule)]
+                    if rule_position in self.timed_out_rules:
+                        continue
+                    candidates = np.flatnonzero(~matched)
+                    if not len(candidates):
+                        break
+                    condition_columns = rule.resolve_columns(df.columns, self.column_resolver)
+                    start = time.perf_counter()
+                    # 每条规则的正则条件在本文件上有各自的时间预算
+                    deadline = start + self.regex_time_budget_seconds if self.regex_time_budget_seconds else None
+                    try:
+                        new_hits = rule.match_mask(cache, condition_columns, candidates, self.rule_stats, deadline)
+                    except RegexTimeoutError as e:
+                        # 放弃该规则并标记，继续处理其他规则和文件
+                        print(f"规则 '{rule.name}' 在文件 {os.path.basename(file_path)} 上执行超时，已跳过: {str(e)}")
+                        self.timed_out_rules[rule_position] = (rule.name, os.path.basename(file_path))
+                        continue
+                    self.rule_stats.record(self.rule_stats.rule_key(rule), len(candidates), int(new_hits.sum()), time.perf_counter() - start)
+                    for position in np.flatnonzero(new_hits):
+                        print(f"找到匹配行: {primary_column.name}={part_nos[position]}, 规则={rule.name}")
+                    matched |= new_hits
+            
+            # 如果有匹配行，创建新的DataFrame并保存到输出文件夹
+            if matched.any():
+                # 生成输出文件名
+                output_file = self.get_output_file(file_path, output_folder, self.output_names)
+                
+                if not self.write_matched_files:
+                    # 只比对模式：记录匹配行的位置，需要匹配文件时再由DeferredMatchStore生成
+                    self.deferred_matches[output_file] = (file_path, MatchedFrameRegistry.file_signature(file_path),
+                                                          np.flatnonzero(matched), self.all_sheets)
+                    return [part_nos[position] for position in np.flatnonzero(matched)]
+                
+                matched_df = df[matched]
+                
+                # 保存文件并登记匹配数据，内容与上次写出的相同时保留原文件
+                if self.write_matched_file(matched_df, output_file, self.matched_registry):
+                    print(f"已保存匹配文件: {output_file}")
+                else:
+                    print(f"匹配文件内容未变化，保留原文件: {output_file}")
+                if output_file not in self.written_files:
+                    self.written_files.append(output_file)
+                
+                # 返回匹配行的主键列值
+                return [part_nos[position] for position in np.flatnonzero(matched)]
+            else:
+                print("未找到满足规则的行")
+                return []
+                
+        except Exception as e:
+            print(f"提取特殊Part No时出错: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return []
+
+def find_model_file(model, model_files, exact_model_match=True):
+    """在比对文件列表中查找Model对应的文件，找不到时返回None。只按文件名匹配，不包括所在的压缩包或子文件夹"""
+    for file in model_files:
+        file_name = file.replace("\\", "/").rsplit("/", 1)[-1].lower()
+        # 根据匹配模式选择不同的比对逻辑
+        if exact_model_match:
+            # 完全匹配模式 - 使用正则表达式匹配完整模型名称
+            pattern = r'(^|[^\w])' + re.escape(model.lower()) + r'([^\w]|$)'
+            if re.search(pattern, file_name):
+                return file
+        else:
+            # 部分匹配模式 - 保持原有逻辑
+            if model.lower() in file_name:
+                return file
+    return None
+
+def build_row_results(index, model, master_part_no, file_result):
+    """根据对应文件的提取结果生成主表一行的比对结果列表，file_result为None表示没有对应文件"""
+    results = []
+    if file_result is None:
+        result = (index + 1, model, master_part_no, "未找到对应文件", "错误")
+        results.append(result)
+        return results
+    
+    status, compare_part_nos = file_result
+    if status == "error":
+        result = (index + 1, model, master_part_no, f"文件读取错误: {compare_part_nos}", "错误")
+        results.append(result)
+    elif compare_part_nos:
+        # 有匹配的Part No
+        
+        # 修改为显示所有匹配结果
+        # 首先检查是否有完全匹配的结果
+        exact_matches = [pn for pn in compare_part_nos if pn == master_part_no]
+        
+        if exact_matches:
+            # 有完全匹配的结果
+            for match_pn in exact_matches:
+                result = (index + 1, model, master_part_no, match_pn, "匹配")
+                results.append(result)
+            
+            # 同时显示其他不匹配的结果，但标记为"其他结果"
+            other_part_nos = [pn for pn in compare_part_nos if pn != master_part_no]
+            for other_pn in other_part_nos:
+                result = (index + 1, model, master_part_no, other_pn, "其他结果")
+                results.append(result)
+        else:
+            # 没有完全匹配的结果，显示所有结果为"不匹配"
+            for pn in compare_part_nos:
+                result = (index + 1, model, master_part_no, pn, "不匹配")
+                results.append(result)
+    else:
+        result = (index + 1, model, master_part_no, "未找到符合条件的Part No", "不匹配")
+        results.append(result)
+    return results
+
+class ArchiveFolder:
+    """把比对文件夹中的zip压缩包当作子文件夹：包内文件用虚拟路径"压缩包路径/包内路径"表示，
+    读取时直接从压缩包读入内存交给解析器，不解压到磁盘。打开的压缩包按路径缓存，目录只读取一次"""
+    EXTENSION = ".zip"
+    archives = {}  # 压缩包路径 -> (压缩包文件签名, ZipFile, {包内路径: ZipInfo})
+    lock = threading.Lock()
+
+    @classmethod
+    def split_path(cls, file_path):
+        """拆分虚拟路径，返回(压缩包路径, 包内路径)，不是压缩包内的文件时返回None"""
+        normalized = file_path.replace("\\", "/")
+        lower = normalized.lower()
+        marker = cls.EXTENSION + "/"
+        position = lower.find(marker)
+        while position >= 0:
+            archive_path = normalized[:position + len(cls.EXTENSION)]
+            if os.path.isfile(archive_path):
+                return archive_path, normalized[position + len(marker):]
+            position = lower.find(marker, position + 1)
+        return None
+
+    @classmethod
+    def open_archive(cls, archive_path):
+        """获取打开的压缩包及其文件目录，压缩包被修改后重新打开"""
+        stat = os.stat(archive_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with cls.lock:
+            cached = cls.archives.get(archive_path)
+            if cached is not None and cached[0] == signature:
+                return cached[1], cached[2]
+            import zipfile
+            archive = zipfile.ZipFile(archive_path)
+            members = {}
+            for info in archive.infolist():
+                name = info.filename
+                if not info.flag_bits & 0x800:
+                    # 未标记为UTF-8的文件名通常是Windows中文系统下打包的GBK编码
+                    try:
+                        name = name.encode("cp437").decode("gbk")
+                    except (UnicodeEncodeError, UnicodeDecodeError):
+                        pass
+                members[name] = info
+            if cached is not None:
+                cached[1].close()
+            cls.archives[archive_path] = (signature, archive, members)
+            return archive, members
+
+    @classmethod
+    def forget_inherited(cls):
+        """丢弃从父进程继承的已打开压缩包（fork启动的子进程中调用）。继承的文件句柄与父进程和其他子进程
+        共用读取位置，同时读取会互相干扰，因此子进程需要自己重新打开；继承的句柄不能关闭，否则会影响父进程"""
+        cls.archives = {}
+        cls.lock = threading.Lock()
+
+    @classmethod
+    def get_member(cls, file_path):
+        """获取虚拟路径对应的压缩包和ZipInfo，包内没有该文件时抛出FileNotFoundError"""
+        archive_path, member_name = cls.split_path(file_path)
+        archive, members = cls.open_archive(archive_path)
+        info = members.get(member_name)
+        if info is None:
+            raise FileNotFoundError(f"压缩包中没有文件: {file_path}")
+        return archive, info
+
+    @classmethod
+    def list_files(cls, archive_path, extensions):
+        """列出压缩包中指定类型的文件（包内路径），跳过目录和macOS生成的附加文件"""
+        _, members = cls.open_archive(archive_path)
+        return [name for name, info in members.items()
+                if not info.is_dir() and name.lower().endswith(extensions)
+                and not name.startswith("__MACOSX/") and not os.path.basename(name).startswith("._")]
+
+    @classmethod
+    def read(cls, file_path):
+        """读取压缩包内文件的内容"""
+        archive, info = cls.get_member(file_path)
+        return archive.read(info)
+
+    @classmethod
+    def signature(cls, file_path):
+        """压缩包内文件的签名（CRC和大小），压缩包中其他文件变化时不受影响"""
+        _, info = cls.get_member(file_path)
+        return (info.CRC, info.file_size)
+
+    @classmethod
+    def getsize(cls, file_path):
+        """文件大小，压缩包内的文件为解压后的大小"""
+        if cls.split_path(file_path):
+            return cls.get_member(file_path)[1].file_size
+        return os.path.getsize(file_path)
+
+class DirectoryIndex:
+    """比对文件夹的目录索引：递归扫描子文件夹，每个文件夹的文件列表按该文件夹的修改时间缓存在本地缓存文件夹中。
+    文件夹中增加、删除或重命名文件时其修改时间会变化，未变化的文件夹直接使用缓存的列表，不再重新列出"""
+    INDEX_VERSION = 1  # 索引文件格式版本
+    SKIP_FOLDERS = ("匹配文件", MatchedFrameRegistry.SIDECAR_FOLDER)  # 不扫描的输出和缓存文件夹
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.path = os.path.join(local_cache_folder(os.path.join(folder_path, "匹配文件")), "dir_index.pkl")
+        self.folders = {}  # 相对路径 -> (修改时间, [文件名], [子文件夹名])
+        self.scanned = 0  # 上次list_files时重新列出的文件夹数
+
+    def load(self):
+        """读取索引文件，不存在或格式不符时为空"""
+        self.folders = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+            if data.get("version") == self.INDEX_VERSION:
+                self.folders = data["folders"]
+        except Exception as e:
+            print(f"读取目录索引时出错: {str(e)}")
+
+    def save(self):
+        """保存索引文件，先写临时文件再替换"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump({"version": self.INDEX_VERSION, "folders": self.folders}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
+
+    def list_files(self):
+        """递归列出所有文件相对于比对文件夹的路径（以/分隔），先列出文件夹本身的文件，再依次列出各子文件夹"""
+        folders = {}
+        files = []
+        pending = [""]
+        self.scanned = 0
+        while pending:
+            relative = pending.pop()
+            absolute = os.path.join(self.folder_path, relative) if relative else self.folder_path
+            try:
+                mtime = os.stat(absolute).st_mtime_ns
+            except OSError:
+                continue
+            cached = self.folders.get(relative)
+            if cached is None or cached[0] != mtime:
+                names, subfolders = [], []
+                with os.scandir(absolute) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in self.SKIP_FOLDERS:
+                                subfolders.append(entry.name)
+                        elif entry.is_file():
+                            names.append(entry.name)
+                cached = (mtime, names, subfolders)
+                self.scanned += 1
+            folders[relative] = cached
+            prefix = relative + "/" if relative else ""
+            files.extend(prefix + name for name in cached[1])
+            pending.extend(prefix + name for name in reversed(cached[2]))
+        
+        changed = self.scanned or folders.keys() != self.folders.keys()
+        self.folders = folders
+        if changed:
+            try:
+                self.save()
+            except Exception as e:
+                print(f"保存目录索引时出错: {str(e)}")
+        return files
+
+def match_path_patterns(relative_path, include_patterns=None, exclude_patterns=None):
+    """按包含/排除通配符过滤文件的相对路径，通配符匹配完整的相对路径或文件名即可（不区分大小写）"""
+    import fnmatch
+    path = relative_path.lower()
+    name = path.rsplit("/", 1)[-1]
+    
+    def matches(pattern):
+        pattern = pattern.lower()
+        return fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(name, pattern)
+    
+    if include_patterns and not any(matches(pattern) for pattern in include_patterns):
+        return False
+    return not any(matches(pattern) for pattern in exclude_patterns or [])
+
+def find_ambiguous_model_files(used_files, model_files):
+    """找出与其他子文件夹或压缩包中的文件同名的对应文件（used_files中的None表示没有对应文件），返回{使用的文件: [同名的其他文件]}。
+    查找Model对应的文件只按文件名匹配，同名的文件中只有先找到的一个会被比对"""
+    def file_name(file):
+        return file.replace("\\", "/").rsplit("/", 1)[-1].lower()
+    
+    by_name = {}
+    for file in model_files:
+        by_name.setdefault(file_name(file), []).append(file)
+    return {file: [other for other in by_name[file_name(file)] if other != file]
+            for file in dict.fromkeys(used_files) if file and len(by_name.get(file_name(file), ())) > 1}
+
+def format_ambiguous_files(ambiguous_files):
+    """同名对应文件的提示"""
+    lines = "\n".join(f"{file}（未比对: {', '.join(others)}）" for file, others in ambiguous_files.items())
+    return f"以下文件在其他子文件夹或压缩包中有同名文件，只比对了列出的文件:\n{lines}"
+
+def list_model_files(folder_path, recursive=False, include_patterns=None, exclude_patterns=None):
+    """列出比对文件夹中所有支持的文件（Excel和CSV），zip压缩包中的文件以"压缩包名/包内路径"列出。
+    recursive为True时包括子文件夹（以"子文件夹/文件名"列出，使用缓存的目录索引），
+    include_patterns/exclude_patterns为包含/排除的通配符列表"""
+    extensions = ('.xlsx', '.xls', '.csv')
+    if recursive:
+        directory_index = DirectoryIndex(folder_path)
+        directory_index.load()
+        files = directory_index.list_files()
+    else:
+        files = os.listdir(folder_path)
+    
+    model_files = []
+    for file in files:
+        if file.lower().endswith(extensions):
+            model_files.append(file)
+        elif file.lower().endswith(ArchiveFolder.EXTENSION):
+            try:
+                model_files.extend(f"{file}/{member}" for member in
+                                   ArchiveFolder.list_files(os.path.join(folder_path, file), extensions))
+            except Exception as e:
+                print(f"读取压缩包 {file} 时出错: {str(e)}")
+    if include_patterns or exclude_patterns:
+        model_files = [file for file in model_files if match_path_patterns(file, include_patterns, exclude_patterns)]
+    return model_files
+
+def get_config_path():
+    """配置文件路径：程序所在目录下的config.json"""
+    try:
+        # PyInstaller打包后的应用程序位置
+        if getattr(sys, 'frozen', False):
+            application_path = os.path.dirname(sys.executable)
+        else:
+            application_path = os.path.dirname(os.path.abspath(__file__))
+        return os.path.join(application_path, "config.json")
+    except Exception as e:
+        print(f"配置文件路径设置错误: {str(e)}")
+        # 备用方案：保存在当前工作目录
+        return "config.json"
+
+def peak_memory_mb():
+    """当前进程的峰值内存占用（MB），无法获取时返回None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS以字节为单位，Linux以KB为单位
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+        
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+        
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize / 1024 / 1024
+    except Exception:
+        pass
+    return None
+
+def diff_frames(old_df, new_df, old_key, new_key):
+    """按主键列比较同一文件的两个版本，返回新增行、删除行和修改的单元格。
+    每行先按两个版本共有的列计算哈希，只有哈希不同的行才逐列比较单元格；重复的主键按出现顺序区分。
+    返回{"added": 新增的行, "removed": 删除的行, "changed": 修改的单元格(主键, 列, 旧值, 新值), "changed_rows": 修改的行数,
+    "added_columns": 新增的列, "removed_columns": 删除的列, "unchanged": 未变化的行数, "key_columns": (旧版本主键列, 新版本主键列)}"""
+    def deduplicate(df):
+        # 重复的列名（去掉首尾空格后）只保留第一列
+        return df.loc[:, ~pd.Index([str(col).strip() for col in df.columns]).duplicated()]
+    
+    def is_number(values):
+        return pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+    
+    def as_text(values):
+        # 统一转换为文本：空值为空文本，整数值的浮点数不带".0"（与整数列、文本中的数字一致）
+        if is_number(values):
+            if pd.api.types.is_integer_dtype(values) and not values.hasnans:
+                return values.astype(str).to_numpy(dtype=object)
+            floats = values.to_numpy(dtype="float64", na_value=np.nan)
+            text = floats.astype(str).astype(object)
+            integral = np.isfinite(floats) & (np.abs(floats) < 2 ** 53) & (floats == np.floor(floats))
+            text[integral] = floats[integral].astype(np.int64).astype(str)
+            text[np.isnan(floats)] = ""
+            return text
+        if pd.api.types.infer_dtype(values, skipna=True) in ("string", "empty"):
+            return values.astype(object).where(values.notna(), "").to_numpy(dtype=object)
+        # 混合类型的列逐个转换，其中的浮点数与数值列使用相同的写法
+        return np.array([
+            "" if value is None or value is pd.NA or (isinstance(value, float) and value != value)
+            else str(int(value)) if isinstance(value, float) and value.is_integer()
+            else str(value)
+            for value in values.to_numpy(dtype=object)
+        ], dtype=object)
+    
+    def normalize(df, key_column, other_df):
+        # 返回规范化的数据：两个版本中都是数值的列统一为浮点数（整数列含空值时会被读取为浮点数），
+        # 其他列（包括主键列和只有一个版本是数值的列）统一为文本，两个版本的同一列总是以相同的形式比较
+        other_numeric = {str(col).strip(): is_number(other_df[col]) for col in other_df.columns}
+        key_name = str(key_column).strip()
+        columns = {}
+        for col in df.columns:
+            name = str(col).strip()
+            values = df[col]
+            if name != key_name and is_number(values) and other_numeric.get(name, True):
+                columns[name] = values.astype("float64")
+            else:
+                columns[name] = pd.Series(as_text(values), index=df.index)
+        normalized = pd.DataFrame(columns, copy=False)
+        keys = pd.Index(normalized[key_name].str.strip().to_numpy(dtype=object))
+        if not keys.is_unique:
+            # 重复的主键附加出现序号（第一次出现时不附加）
+            occurrence = pd.Series(keys).groupby(keys, sort=False).cumcount().to_numpy()
+            keys = pd.Index([key if n == 0 else f"{key}\x00{n}" for key, n in zip(keys, occurrence)], dtype=object)
+        normalized.index = keys
+        return normalized
+    
+    old_df, new_df = deduplicate(old_df), deduplicate(new_df)
+    old_norm = normalize(old_df, old_key, new_df)
+    new_norm = normalize(new_df, new_key, old_df)
+    new_column_set = set(new_norm.columns)
+    shared_columns = [col for col in old_norm.columns if col in new_column_set]
+    
+    # 以主键连接两个版本：只在一个版本中出现的主键为新增或删除
+    new_positions = new_norm.index.get_indexer(old_norm.index)
+    in_new = new_positions >= 0
+    old_in_new = np.zeros(len(new_norm), dtype=bool)
+    old_in_new[new_positions[in_new]] = True
+    
+    # 两个版本都有的行：比较行哈希，哈希相同的行视为未变化
+    old_hashes = pd.util.hash_pandas_object(old_norm[shared_columns], index=False).to_numpy()
+    new_hashes = pd.util.hash_pandas_object(new_norm[shared_columns], index=False).to_numpy()
+    common_old = np.flatnonzero(in_new)
+    common_new = new_positions[in_new]
+    differs = old_hashes[common_old] != new_hashes[common_new]
+    changed_old, changed_new = common_old[differs], common_new[differs]
+    
+    # 只对哈希不同的行逐列比较单元格（两个版本都为空的数值视为相同）
+    changes = []
+    for col in shared_columns:
+        old_values = old_norm[col].to_numpy()[changed_old]
+        new_values = new_norm[col].to_numpy()[changed_new]
+        different = old_values != new_values
+        if old_values.dtype.kind == "f" and new_values.dtype.kind == "f":
+            different &= ~(np.isnan(old_values) & np.isnan(new_values))
+        rows = np.flatnonzero(different)
+        if len(rows):
+            # 输出原始值而不是规范化后的值
+            old_column = old_df.columns[old_norm.columns.get_loc(col)]
+            new_column = new_df.columns[new_norm.columns.get_loc(col)]
+            changes.append(pd.DataFrame({
+                "row": rows, "列": col,
+                "旧值": old_df[old_column].to_numpy(dtype=object)[changed_old[rows]],
+                "新值": new_df[new_column].to_numpy(dtype=object)[changed_new[rows]]
+            }))
+    key_column_name = str(new_key).strip()
+    if changes:
+        changed = pd.concat(changes, ignore_index=True).sort_values("row", kind="stable")
+        key_values = old_df[old_df.columns[old_norm.columns.get_loc(str(old_key).strip())]].to_numpy(dtype=object)
+        changed.insert(0, key_column_name, key_values[changed_old[changed["row"].to_numpy()]])
+        changed = changed.drop(columns="row").reset_index(drop=True)
+    else:
+        changed = pd.DataFrame(columns=[key_column_name, "列", "旧值", "新值"])
+    
+    return {
+        "added": new_df.iloc[np.flatnonzero(~old_in_new)],
+        "removed": old_df.iloc[np.flatnonzero(~in_new)],
+        "changed": changed,
+        "added_columns": [col for col in new_norm.columns if col not in set(old_norm.columns)],
+        "removed_columns": [col for col in old_norm.columns if col not in new_column_set],
+        "changed_rows": int(len(changed_old)),
+        "unchanged": int(len(common_old) - len(changed_old)),
+        "key_columns": (old_key, new_key)
+    }
+
+class FrameHandoff:
+    """子进程向主程序交回结果的内存映射文件：用pickle协议5把DataFrame的数值数据和Part No数组
+    作为带外缓冲区写入文件，主程序映射文件后直接在映射的内存上重建，不再经过进程间管道复制。
+    文本（object）列仍随pickle数据一起保存。交接文件只由本机的子进程写在当前用户的本地缓存文件夹中"""
+    FILE_PREFIX = "handoff-"
+    sequence = 0  # 本进程写出的交接文件序号
+
+    @staticmethod
+    def encode_part_nos(part_nos):
+        """把Part No列表连接后一次编码为UTF-8字节数组，并记录每个Part No的结束位置（字符数），可作为带外缓冲区传递"""
+        blob = np.frombuffer("".join(part_nos).encode("utf-8"), dtype=np.uint8)
+        ends = np.cumsum([len(part_no) for part_no in part_nos], dtype=np.int64)
+        return blob, ends
+
+    @staticmethod
+    def decode_part_nos(blob, ends):
+        """encode_part_nos的逆过程：直接从（映射的）缓冲区一次解码，再按字符位置切分"""
+        text = str(memoryview(blob), "utf-8")
+        starts = [0] + ends[:-1].tolist()
+        return [text[start:end] for start, end in zip(starts, ends.tolist())]
+
+    @classmethod
+    def pack(cls, obj, folder):
+        """在子进程中写出交接文件，返回交给主程序的描述（文件路径和各缓冲区的位置）"""
+        buffers = []
+        payload = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        cls.sequence += 1
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{cls.FILE_PREFIX}{os.getpid()}-{cls.sequence}.bin")
+        layout = []
+        with open(path, 'wb') as f:
+            f.write(payload)
+            offset = len(payload)
+            for buffer in buffers:
+                raw = buffer.raw()
+                f.write(raw)
+                layout.append((offset, raw.nbytes))
+                offset += raw.nbytes
+        return {"path": path, "payload_size": len(payload), "layout": layout}
+
+    @staticmethod
+    def unpack(handoff):
+        """在主程序中映射交接文件并重建对象，数值数据直接引用映射的内存"""
+        import mmap
+        with open(handoff["path"], 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        buffers = [view[offset:offset + size] for offset, size in handoff["layout"]]
+        obj = pickle.loads(view[:handoff["payload_size"]], buffers=buffers)
+        try:
+            # 映射后即可删除文件（Windows上映射期间无法删除，留待下次清理）
+            os.remove(handoff["path"])
+        except OSError:
+            pass
+        return obj
+
+    @classmethod
+    def cleanup(cls, folder):
+        """删除之前遗留的交接文件"""
+        if not os.path.isdir(folder):
+            return
+        for file in os.listdir(folder):
+            if file.startswith(cls.FILE_PREFIX):
+                try:
+                    os.remove(os.path.join(folder, file))
+                except OSError:
+                    pass
+
+# 子进程中的文件提取器，由进程池初始化时创建，同一进程处理的所有文件共用
+worker_extractor = None
+
+def init_file_worker(settings):
+    """进程池的初始化函数：设置只传给每个子进程一次，而不是随每个任务传递"""
+    global worker_extractor
+    ArchiveFolder.forget_inherited()
+    worker_extractor = FileExtractor.from_settings(settings)
+    # 匹配数据在任务结束时交给主程序，子进程中不按预算转存
+    worker_extractor.matched_registry.memory_budget_mb = float("inf")
+
+def run_file_job(file_path, output_folder):
+    """在子进程中处理单个比对文件：读取、按规则提取并写出匹配文件，返回提取结果和资源使用情况"""
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    extractor = worker_extractor
+    # 每个任务只交回本任务产生的记录
+    extractor.written_files = []
+    extractor.deferred_matches = {}
+    extractor.rule_stats.recorded = {}
+    handoff = None
+    try:
+        df = extractor.read_file(file_path, all_sheets=extractor.all_sheets)
+        part_nos = extractor.extract_special_part_nos(df, file_path, output_folder)
+        error = None
+        
+        # Part No和匹配数据通过内存映射文件交回主程序
+        registry = extractor.matched_registry
+        matched = {}
+        for output_file in extractor.written_files:
+            frame = registry.frames.get(registry.normalize_path(output_file))
+            if frame is not None:
+                matched[output_file] = frame[1]
+        handoff = FrameHandoff.pack(
+            {"part_nos": FrameHandoff.encode_part_nos(part_nos), "matched": matched},
+            local_cache_folder(output_folder)
+        )
+    except Exception as e:
+        error = str(e)
+    finally:
+        extractor.matched_registry.clear()
+    return {
+        "handoff": handoff,
+        "error": error,
+        "written_files": extractor.written_files,
+        "deferred_matches": extractor.deferred_matches,
+        "timed_out_rules": extractor.timed_out_rules,
+        "rule_stats": extractor.rule_stats.recorded,
+        "seconds": time.perf_counter() - start,
+        "cpu_seconds": time.process_time() - cpu_start,
+        "peak_memory_mb": peak_memory_mb()
+    }
+
+class FilePrefetcher:
+    """预读比对文件：在后台线程中按处理顺序提前把后面的文件读入内存，
+    网络共享文件夹上读取文件的等待与当前文件的解析和规则求值同时进行"""
+    # 超过此大小的文件不预读，避免占用过多内存
+    MAX_FILE_BYTES = 512 * 1024 * 1024
+
+    def __init__(self, file_paths, depth=2):
+        from concurrent.futures import ThreadPoolExecutor
+        self.file_paths = list(file_paths)
+        self.depth = depth  # 同时预读的文件数
+        self.executor = ThreadPoolExecutor(max_workers=depth, thread_name_prefix="prefetch") if depth > 0 else None
+        self.futures = {}  # 文件路径 -> Future
+        self.next_position = 0  # 下一个要提交预读的文件位置
+        self.read_seconds = 0.0  # 后台线程读取文件的总耗时
+        self.wait_seconds = 0.0  # 处理时等待文件读取完成的总耗时
+        self.lock = threading.Lock()
+        self.fill()
+
+    def read(self, file_path):
+        """在后台线程中读取文件内容"""
+        start = time.perf_counter()
+        try:
+            if ArchiveFolder.getsize(file_path) > self.MAX_FILE_BYTES:
+                return None
+            if ArchiveFolder.split_path(file_path):
+                return ArchiveFolder.read(file_path)
+            with open(file_path, 'rb') as f:
+                return f.read()
+        finally:
+            with self.lock:
+                self.read_seconds += time.perf_counter() - start
+
+    def fill(self):
+        """保持最多depth个文件在预读中"""
+        if self.executor is None:
+            return
+        while len(self.futures) < self.depth and self.next_position < len(self.file_paths):
+            file_path = self.file_paths[self.next_position]
+            self.futures[file_path] = self.executor.submit(self.read, file_path)
+            self.next_position += 1
+
+    def get(self, file_path):
+        """获取文件内容并提交后面文件的预读，文件未预读或读取失败时返回None（由调用方直接读取磁盘）"""
+        future = self.futures.pop(file_path, None)
+        data = None
+        if future is not None:
+            start = time.perf_counter()
+            try:
+                data = future.result()
+            except Exception as e:
+                print(f"预读文件失败，改为直接读取: {file_path} ({str(e)})")
+            self.wait_seconds += time.perf_counter() - start
+        self.fill()
+        return data
+
+    def close(self):
+        """停止预读，丢弃尚未使用的内容"""
+        if self.executor is not None:
+            for future in self.futures.values():
+                future.cancel()
+            self.executor.shutdown(wait=False)
+            self.futures.clear()
+
+class FileJobScheduler:
+    """按文件大小调度并行提取任务：大文件优先，避免最后只剩一个大文件在运行而其他核心空闲；
+    同时按文件大小估算内存占用，正在处理的文件估算总量不超过内存预算（单个超出预算的文件单独处理）"""
+    # 读入内存后的大小约为文件大小的倍数（xlsx为压缩格式，膨胀最多）
+    MEMORY_FACTORS = {".xlsx": 10, ".xls": 4, ".csv": 3}
+    # 待处理文件总大小低于此值时在本进程中处理，启动子进程的开销比并行节省的时间更多
+    PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+
+    def __init__(self, max_workers=0, memory_budget_mb=1024):
+        self.max_workers = max_workers or os.cpu_count() or 1  # 0表示使用所有核心
+        self.memory_budget_mb = memory_budget_mb
+
+    @classmethod
+    def estimate_memory(cls, file_path):
+        """估算文件读入后占用的内存（字节）"""
+        try:
+            size = ArchiveFolder.getsize(file_path)
+        except OSError:
+            size = 0
+        return size * cls.MEMORY_FACTORS.get(os.path.splitext(file_path)[1].lower(), 4)
+
+    def should_parallelize(self, file_paths):
+        """文件数量和总大小是否值得使用子进程并行处理"""
+        if self.max_workers < 2 or len(file_paths) < 2:
+            return False
+        total = 0
+        for file_path in file_paths:
+            try:
+                total += ArchiveFolder.getsize(file_path)
+            except OSError:
+                pass
+        return total >= self.PARALLEL_MIN_BYTES
+
+    def run(self, file_paths, settings, output_folder, on_result):
+        """
+        在进程池中处理所有文件，每完成一个文件调用on_result(文件路径, 结果字典)，任务出错时结果字典只包含error
+        返回运行报告：进程数、耗时、平均使用的核心数、估算的最大在途内存和子进程峰值内存
+        """
+        from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+        
+        # 大文件优先
+        pending = sorted(((self.estimate_memory(path), path) for path in file_paths), reverse=True)
+        budget = self.memory_budget_mb * 1024 * 1024
+        workers = min(self.max_workers, len(pending))
+        report = {"workers": workers, "cpu_seconds": 0.0, "peak_in_flight_mb": 0.0, "peak_worker_memory_mb": None}
+        start = time.perf_counter()
+        
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_file_worker, initargs=(settings,)) as pool:
+            running = {}  # future -> (文件路径, 估算内存)
+            in_flight = 0
+            while pending or running:
+                # 按从大到小的顺序提交放得进预算的文件，没有任务在运行时至少提交一个
+                position = 0
+                while position < len(pending) and len(running) < workers:
+                    cost, path = pending[position]
+                    if running and in_flight + cost > budget:
+                        position += 1
+                        continue
+                    del pending[position]
+                    running[pool.submit(run_file_job, path, output_folder)] = (path, cost)
+                    in_flight += cost
+                    report["peak_in_flight_mb"] = max(report["peak_in_flight_mb"], in_flight / 1024 / 1024)
+                
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, cost = running.pop(future)
+                    in_flight -= cost
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {"error": str(e)}
+                    report["cpu_seconds"] += result.get("cpu_seconds", 0.0)
+                    worker_peak = result.get("peak_memory_mb")
+                    if worker_peak is not None:
+                        report["peak_worker_memory_mb"] = max(report["peak_worker_memory_mb"] or 0, worker_peak)
+                    on_result(path, result)
+        
+        report["seconds"] = time.perf_counter() - start
+        report["cores_utilized"] = report["cpu_seconds"] / report["seconds"] if report["seconds"] else 0.0
+        return report
+
+class ComparisonCheckpoint:
+    """比对进度检查点：定期把已完成的行数、部分结果和已写出的匹配文件保存到本地缓存文件夹中，
+    程序中断后重新比对时，只要输入文件和配置未变（指纹相同）就可以从中断处继续"""
+    CHECKPOINT_VERSION = 4  # 检查点文件格式版本
+    SAVE_INTERVAL_SECONDS = 30  # 两次保存之间的最短间隔
+
+    def __init__(self, output_folder):
+        self.path = os.path.join(local_cache_folder(output_folder), "checkpoint.pkl")
+        self.last_saved = time.perf_counter()
+
+    def load(self, fingerprint):
+        """读取与指纹相符的检查点，不存在、格式不符或已写出的匹配文件丢失时返回None"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'rb') as f:
+                state = pickle.load(f)
+        except Exception as e:
+            print(f"读取比对进度时出错: {str(e)}")
+            return None
+        if state.get("version") != self.CHECKPOINT_VERSION or state.get("fingerprint") != fingerprint:
+            print("输入文件或配置已变化，忽略上次的比对进度")
+            return None
+        missing = [file for file in state["written_files"] if not os.path.exists(file)]
+        if missing:
+            print(f"上次写出的匹配文件已不存在，忽略上次的比对进度: {missing[0]}")
+            return None
+        return state
+
+    def save(self, state):
+        """保存检查点，先写临时文件再替换，中途断电也不会留下损坏的检查点"""
+        state = dict(state, version=self.CHECKPOINT_VERSION)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
+        self.last_saved = time.perf_counter()
+
+    def save_if_due(self, make_state):
+        """距上次保存超过间隔时保存，make_state只在需要保存时调用"""
+        if time.perf_counter() - self.last_saved >= self.SAVE_INTERVAL_SECONDS:
+            try:
+                self.save(make_state())
+            except Exception as e:
+                print(f"保存比对进度时出错: {str(e)}")
+
+    def remove(self):
+        """比对完成后删除检查点"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class RunHistory:
+    """比对结果历史：每次比对完成后把结果存储的内容（已按字典编码的数组）保存到本地缓存文件夹的runs中，
+    下次比对相同的主文件时按(主文件, Model, 总文件Part No, 对应文件Part No)连接两次的结果，
+    得出新增、消失和比对结果变化的条目，无需重新比对"""
+    HISTORY_VERSION = 1  # 历史文件格式版本
+    MAX_RUNS = 10  # 保留的历史记录数量
+    KEY_COLUMNS = ["主文件", "Model", "总文件Part No", "对应文件Part No"]
+    DELTA_COLUMNS = ("变化", "主文件", "Model", "总文件Part No", "对应文件Part No", "上次结果", "本次结果")
+
+    def __init__(self, output_folder):
+        self.folder = os.path.join(local_cache_folder(output_folder), "runs")
+
+    def list_runs(self):
+        """按时间顺序列出历史文件"""
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted(os.path.join(self.folder, file) for file in os.listdir(self.folder)
+                      if file.startswith("run_") and file.endswith(".pkl"))
+
+    def save(self, store, masters):
+        """保存一次比对的结果，masters为比对的主文件列表，只保留最近的MAX_RUNS次"""
+        os.makedirs(self.folder, exist_ok=True)
+        now = time.time()
+        # 文件名按时间排序，附加微秒避免同一秒内的两次比对重名
+        file_name = f"run_{time.strftime('%Y%m%d_%H%M%S', time.localtime(now))}_{int(now * 1e6) % 1000000:06d}.pkl"
+        path = os.path.join(self.folder, file_name)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump({"version": self.HISTORY_VERSION, "time": now, "masters": masters,
+                         "results": store.get_state()}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+        for old_path in self.list_runs()[:-self.MAX_RUNS]:
+            os.remove(old_path)
+
+    def load_runs(self, masters, count=1):
+        """读取最近count次比对相同主文件的结果，返回[(比对时间, 结果存储)]，按时间从新到旧排列"""
+        runs = []
+        for path in reversed(self.list_runs()):
+            try:
+                with open(path, 'rb') as f:
+                    run = pickle.load(f)
+            except Exception as e:
+                print(f"读取比对历史时出错: {str(e)}")
+                continue
+            if run.get("version") != self.HISTORY_VERSION or run.get("masters") != masters:
+                continue
+            store = ResultStore()
+            store.set_state(run["results"])
+            runs.append((run["time"], store))
+            if len(runs) >= count:
+                break
+        return runs
+
     @classmethod
-    def from_dict(cls, rule_dict):
-        """从字典创建规则对象"""
-        conditions = [ColumnCondition.from_dict(cond) for cond in rule_dict.get("conditions", [])]
-        return cls(
-            name=rule_dict.get("name", "未命名规则"),
-            conditions=conditions,
-            match_all=rule_dict.get("match_all", True),
-            enabled=rule_dict.get("enabled", True)
+    def delta(cls, previous, current):
+        """以(主文件, Model, 总文件Part No, 对应文件Part No)为键连接两次比对的结果，返回变化的条目。
+        同一个键出现多次时按出现顺序对应"""
+        def keyed(store):
+            df = store.to_dataframe()
+            if "主文件" not in df.columns:
+                df["主文件"] = ""
+            df = df[cls.KEY_COLUMNS + ["比对结果"]].astype(str)
+            df["出现次数"] = df.groupby(cls.KEY_COLUMNS, sort=False).cumcount()
+            return df
+        
+        merged = keyed(previous).merge(keyed(current), on=cls.KEY_COLUMNS + ["出现次数"], how="outer",
+                                       suffixes=("_上次", "_本次"), indicator=True)
+        change = np.select(
+            [merged["_merge"].to_numpy() == "right_only", merged["_merge"].to_numpy() == "left_only",
+             merged["比对结果_上次"].to_numpy() != merged["比对结果_本次"].to_numpy()],
+            ["新增", "消失", "结果变化"], default="")
+        merged["变化"] = change
+        merged = merged[change != ""].rename(columns={"比对结果_上次": "上次结果", "比对结果_本次": "本次结果"})
+        return merged[list(cls.DELTA_COLUMNS)].fillna("").reset_index(drop=True)
+
+class DeferredMatchStore:
+    """只比对模式下暂不生成的匹配文件：记录每个匹配文件对应的比对文件、文件签名和匹配行的位置，
+    保存在本地缓存文件夹中。需要匹配文件时重新读取比对文件并按位置取出匹配行写出，不必重新执行规则"""
+    STORE_VERSION = 2  # 文件格式版本
+
+    def __init__(self, output_folder):
+        self.path = os.path.join(local_cache_folder(output_folder), "deferred_matches.pkl")
+        self.entries = {}  # 匹配文件 -> (比对文件, 文件签名, 匹配行位置, 是否读取所有工作表)
+
+    def load(self):
+        """读取记录，不存在或格式不符时为空"""
+        self.entries = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+            if data.get("version") == self.STORE_VERSION:
+                self.entries = data["entries"]
+        except Exception as e:
+            print(f"读取待生成的匹配文件记录时出错: {str(e)}")
+
+    def save(self):
+        """保存记录，没有记录时删除文件"""
+        if not self.entries:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump({"version": self.STORE_VERSION, "entries": self.entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
+
+    def materialize(self, read_file, progress=None):
+        """生成所有记录的匹配文件，返回(写出的文件, 比对文件已修改而跳过的文件, 出错的文件)。
+        read_file为读取比对文件的函数read_file(file_path, all_sheets=...)，需与比对时使用的相同，保证行位置一致"""
+        written, stale, failed = [], [], []
+        registry = MatchedFrameRegistry(0)
+        for position, (output_file, (file_path, signature, positions, all_sheets)) in enumerate(list(self.entries.items())):
+            if progress:
+                progress(position + 1, len(self.entries), os.path.basename(output_file))
+            try:
+                unchanged = MatchedFrameRegistry.file_signature(file_path) == signature
+            except OSError:
+                unchanged = False
+            if not unchanged:
+                # 比对文件在比对之后被修改或删除，行位置已不可靠，需要重新比对
+                stale.append(output_file)
+                del self.entries[output_file]
+                continue
+            try:
+                df = read_file(file_path, all_sheets=all_sheets)
+                FileExtractor.write_matched_file(df.iloc[positions], output_file, registry)
+            except Exception as e:
+                print(f"生成匹配文件 {output_file} 时出错: {str(e)}")
+                failed.append(output_file)
+                continue
+            written.append(output_file)
+            del self.entries[output_file]
+        return written, stale, failed
+
+def make_comparison_job(settings, master_path, folder_path, sheet_name=None):
+    """由配置（与config.json格式相同）生成提交给比对服务的任务"""
+    return {
+        "master": os.path.abspath(master_path),
+        "sheet": sheet_name,
+        "folder": os.path.abspath(folder_path),
+        "rules": settings.get("rules", []),
+        "extract_columns": settings.get("extract_columns", []),
+        "exact_model_match": settings.get("exact_model_match", True),
+        "extract_all_when_no_rules": settings.get("extract_all_when_no_rules", False),
+        "regex_time_budget_seconds": settings.get("regex_time_budget_seconds", 30),
+        "compare_only": settings.get("compare_only", False),
+        "all_sheets": settings.get("all_sheets", False),
+        "recursive_scan": settings.get("recursive_scan", False),
+        "folder_include_patterns": settings.get("folder_include_patterns", []),
+        "folder_exclude_patterns": settings.get("folder_exclude_patterns", [])
+    }
+
+class ComparisonEngine:
+    """不依赖界面的比对引擎，供服务模式使用：在多次比对之间保留已解析的文件、各文件的提取结果和列名解析缓存。
+    文件未修改且规则配置相同时直接复用上次的提取结果，多个用户比对相同的文件夹时只需解析一次"""
+    def __init__(self, memory_budget_mb=2048):
+        self.memory_budget_mb = memory_budget_mb  # 已解析文件缓存的内存预算（MB）
+        self.column_resolver = ColumnResolver()
+        self.rule_stats = RuleStatistics(None)
+        self.matched_registry = MatchedFrameRegistry(memory_budget_mb)
+        self.frames = {}  # (规范化路径, 工作表, 是否读取所有工作表) -> (文件签名, DataFrame)，按使用顺序排列
+        self.frame_sizes = {}  # (规范化路径, 工作表, 是否读取所有工作表) -> 占用字节数
+        self.extractions = {}  # (规范化路径, 配置键, 匹配文件) -> (文件签名, Part No列表, 写出的匹配文件, 只比对模式下暂不生成的匹配文件)
+
+    def load_frame(self, file_path, sheet_name=None, all_sheets=False):
+        """读取文件，文件未修改时直接返回缓存的DataFrame；all_sheets为True时读取Excel文件的所有工作表"""
+        key = (MatchedFrameRegistry.normalize_path(file_path), sheet_name, all_sheets)
+        signature = MatchedFrameRegistry.file_signature(file_path)
+        cached = self.frames.pop(key, None)
+        if cached is not None and cached[0] == signature:
+            self.frames[key] = cached
+            return cached[1]
+        
+        if sheet_name is not None and file_path.lower().endswith(('.xlsx', '.xls')):
+            df = pd.read_excel(file_path, sheet_name=sheet_name)
+            df.attrs["sheet_name"] = sheet_name
+        else:
+            df = FileExtractor.read_file(file_path, all_sheets=all_sheets)
+        self.frames[key] = (signature, df)
+        self.frame_sizes[key] = int(df.memory_usage(deep=True).sum())
+        
+        # 超出预算时释放最久未使用的文件
+        budget = self.memory_budget_mb * 1024 * 1024
+        while len(self.frames) > 1 and sum(self.frame_sizes.values()) > budget:
+            oldest = next(iter(self.frames))
+            del self.frames[oldest]
+            self.frame_sizes.pop(oldest, None)
+        return df
+
+    def run(self, job, progress=print):
+        """执行一个比对任务，进度消息交给progress，返回(结果列表, 摘要)"""
+        master_path = job["master"]
+        folder_path = job["folder"]
+        extract_all = job.get("extract_all_when_no_rules", False)
+        compare_only = job.get("compare_only", False)
+        all_sheets = job.get("all_sheets", False)
+        extractor = FileExtractor(
+            [ComparisonRule.from_dict(rule) for rule in job.get("rules", [])],
+            [ExtractColumn.from_dict(column) for column in job.get("extract_columns", [])],
+            extract_all,
+            job.get("regex_time_budget_seconds", 30),
+            column_resolver=self.column_resolver,
+            rule_stats=self.rule_stats,
+            matched_registry=self.matched_registry,
+            write_matched_files=not compare_only,
+            all_sheets=all_sheets
         )
-    
-    def match(self, row, columns_map):
-        """检查行是否符合规则条件"""
-        if not self.enabled or not self.conditions:
-            return False
+        # 影响提取结果的配置，配置不同时不复用提取结果
+        config_key = json.dumps([job.get("rules", []), job.get("extract_columns", []), extract_all, compare_only, all_sheets],
+                                ensure_ascii=False, sort_keys=True)
+        
+        progress("正在读取主文件...")
+        master_df = self.load_frame(master_path, job.get("sheet"))
+        model_col = job.get("model_column")
+        if not model_col:
+            match = self.column_resolver.resolve(master_df.columns, ExcelComparator.MODEL_COLUMN_ALIASES)
+            model_col = match[0] if match else None
+        partno_col = job.get("partno_column")
+        if not partno_col:
+            match = self.column_resolver.resolve(master_df.columns, ExcelComparator.PARTNO_COLUMN_ALIASES)
+            partno_col = match[0] if match else None
+        if not model_col or not partno_col:
+            raise ValueError("无法识别主文件中的Model列或Part No列，请在任务中指定model_column和partno_column")
         
-        # 检查每个条件
-        matches = []
-        for condition in self.conditions:
-            # 获取实际列名
-            actual_column = columns_map.get(condition.column_name.lower().strip())
-            if not actual_column:
-                # 尝试部分匹配
-                for col_lower, col in columns_map.items():
-                    if condition.column_name.lower().strip() in col_lower or col_lower in condition.column_name.lower().strip():
-                        actual_column = col
-                        break
-            
-            if not actual_column:
-                # 列不存在
-                matches.append(False)
-                continue
-            
-            # 获取单元格值
-            cell_value = str(row[actual_column]).strip()
-            if not condition.case_sensitive:
-                cell_value = cell_value.lower()
+        output_folder = os.path.join(folder_path, "匹配文件")
+        os.makedirs(output_folder, exist_ok=True)
+        model_files = list_model_files(folder_path, job.get("recursive_scan", False),
+                                       job.get("folder_include_patterns"), job.get("folder_exclude_patterns"))
+        
+        # 为主表每一行找到对应文件，相同的Model只查找一次
+        row_plans = []
+        model_file_cache = {}
+        for index, row in master_df.iterrows():
+            model = str(row[model_col]).strip()
+            master_part_no = str(row[partno_col]).strip()
+            if model not in model_file_cache:
+                model_file_cache[model] = find_model_file(model, model_files, job.get("exact_model_match", True))
+            row_plans.append((index, model, master_part_no, model_file_cache[model]))
+        ambiguous_files = find_ambiguous_model_files(model_file_cache.values(), model_files)
+        extractor.output_names = FileExtractor.output_file_names(model_files)
+        
+        # 每个对应文件只处理一次，未修改的文件复用之前任务的提取结果
+        files = list(dict.fromkeys(plan[3] for plan in row_plans if plan[3]))
+        file_results = {}
+        reused = 0
+        written_outputs = []  # 本次写出（或确认未变化）的匹配文件
+        for position, file in enumerate(files):
+            file_path = os.path.join(folder_path, file)
+            try:
+                # 匹配文件名随文件夹中的其他文件变化（重名时加序号），名称变化后不复用之前的提取结果
+                key = (MatchedFrameRegistry.normalize_path(file_path), config_key,
+                       FileExtractor.get_output_file(file_path, output_folder, extractor.output_names))
+                signature = MatchedFrameRegistry.file_signature(file_path)
+                cached = self.extractions.get(key)
+                if cached is not None and cached[0] == signature and all(os.path.exists(output) for output in cached[2]):
+                    progress(f"文件 {position + 1}/{len(files)}: {file}（未修改，使用之前的提取结果）")
+                    file_results[file] = ("ok", cached[1])
+                    written_outputs.extend(cached[2])
+                    extractor.deferred_matches.update(cached[3])
+                    reused += 1
+                    continue
+                
+                progress(f"正在处理文件 {position + 1}/{len(files)}: {file}")
+                extractor.written_files = []
+                deferred_before = set(extractor.deferred_matches)
+                part_nos = extractor.extract_special_part_nos(self.load_frame(file_path, all_sheets=all_sheets), file_path, output_folder)
+                deferred = {output: entry for output, entry in extractor.deferred_matches.items() if output not in deferred_before}
+                self.extractions[key] = (signature, part_nos, list(extractor.written_files), deferred)
+                written_outputs.extend(extractor.written_files)
+                file_results[file] = ("ok", part_nos)
+            except Exception as e:
+                file_results[file] = ("error", str(e))
+        
+        # 与界面相同，记录只比对模式下暂不生成的匹配文件，本次已写出的匹配文件不再需要生成
+        deferred_store = DeferredMatchStore(output_folder)
+        deferred_store.load()
+        for output_file in written_outputs:
+            deferred_store.entries.pop(output_file, None)
+        deferred_store.entries.update(extractor.deferred_matches)
+        deferred_store.save()
+        
+        results = []
+        for index, model, master_part_no, model_file in row_plans:
+            for result in build_row_results(index, model, master_part_no, file_results.get(model_file)):
+                results.append([int(result[0])] + list(result[1:]))
+        
+        counts = {status: 0 for status in ResultStore.STATUS_CATEGORIES}
+        for result in results:
+            counts[result[4]] += 1
+        summary = {"counts": counts, "files": len(files), "reused_files": reused,
+                   "timed_out_rules": list(extractor.timed_out_rules.values()), "ambiguous_files": ambiguous_files,
+                   "deferred_files": len(extractor.deferred_matches)}
+        return results, summary
+
+class ComparisonService:
+    """本机比对服务：在127.0.0.1上监听，按提交顺序逐个执行比对任务，任务之间保留比对引擎的缓存。
+    协议为每行一个JSON对象：客户端发送一个任务，服务依次返回queued和progress消息，最后返回result或error"""
+    DEFAULT_PORT = 47831
+
+    def __init__(self, port=DEFAULT_PORT, memory_budget_mb=2048):
+        self.port = port
+        self.engine = ComparisonEngine(memory_budget_mb)
+        self.jobs = queue.Queue()  # (任务, 该任务的消息队列)
+
+    def process_jobs(self):
+        """任务线程：逐个执行排队的任务，把进度和结果放入各任务的消息队列"""
+        while True:
+            job, messages = self.jobs.get()
+            start = time.perf_counter()
+            try:
+                results, summary = self.engine.run(job, lambda message: messages.put({"type": "progress", "message": message}))
+                summary["seconds"] = time.perf_counter() - start
+                messages.put({"type": "result", "results": results, "summary": summary})
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                messages.put({"type": "error", "message": str(e)})
+
+    def serve_forever(self):
+        """启动服务，直到进程被终止"""
+        import socketserver
+        service = self
+        
+        class JobHandler(socketserver.StreamRequestHandler):
+            def send(self, message):
+                self.wfile.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+                self.wfile.flush()
             
-            # 检查是否匹配
-            condition_match = False
-            for value in condition.search_values:
-                search_value = value if condition.case_sensitive else value.lower()
+            def handle(self):
+                try:
+                    job = json.loads(self.rfile.readline().decode("utf-8"))
+                except Exception as e:
+                    self.send({"type": "error", "message": f"无效的任务: {str(e)}"})
+                    return
                 
-                if condition.is_regex:
-                    try:
-                        if re.search(search_value, cell_value):
-                            condition_match = True
-                            break
-                    except re.error:
-                        # 正则表达式错误，视为不匹配
-                        pass
-                elif condition.exact_match:
-                    # 精确匹配
-                    if cell_value == search_value:
-                        condition_match = True
-                        break
-                else:
-                    # 部分匹配
-                    if search_value in cell_value:
-                        condition_match = True
+                messages = queue.Queue()
+                service.jobs.put((job, messages))
+                self.send({"type": "queued", "position": service.jobs.qsize()})
+                print(f"收到比对任务: {job.get('master')} -> {job.get('folder')}")
+                
+                # 把任务的进度和结果转发给客户端
+                while True:
+                    message = messages.get()
+                    self.send(message)
+                    if message["type"] in ("result", "error"):
                         break
-            
-            matches.append(condition_match)
         
-        # 根据match_all判断最终结果
-        if self.match_all:
-            return all(matches)
-        else:
-            return any(matches)
+        threading.Thread(target=self.process_jobs, daemon=True).start()
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        socketserver.ThreadingTCPServer.daemon_threads = True
+        with socketserver.ThreadingTCPServer(("127.0.0.1", self.port), JobHandler) as server:
+            print(f"比对服务已启动，监听 127.0.0.1:{self.port}")
+            server.serve_forever()
 
-class ColumnCondition:
-    """列条件类，表示对单个列的匹配条件"""
-    def __init__(self, column_name, search_values, case_sensitive=False, is_regex=False, exact_match=False):
-        self.column_name = column_name  # 列名
-        self.search_values = search_values  # 搜索值列表
-        self.case_sensitive = case_sensitive  # 是否区分大小写
-        self.is_regex = is_regex  # 是否使用正则表达式
-        self.exact_match = exact_match  # 是否精确匹配
-    
-    def to_dict(self):
-        """将条件转换为字典，用于JSON序列化"""
-        return {
-            "column_name": self.column_name,
-            "search_values": self.search_values,
-            "case_sensitive": self.case_sensitive,
-            "is_regex": self.is_regex,
-            "exact_match": self.exact_match
-        }
-    
-    @classmethod
-    def from_dict(cls, condition_dict):
-        """从字典创建条件对象"""
-        return cls(
-            column_name=condition_dict.get("column_name", ""),
-            search_values=condition_dict.get("search_values", []),
-            case_sensitive=condition_dict.get("case_sensitive", False),
-            is_regex=condition_dict.get("is_regex", False),
-            exact_match=condition_dict.get("exact_match", False)
-        )
+def submit_comparison_job(job, port=ComparisonService.DEFAULT_PORT, on_progress=None, timeout=5):
+    """向本机比对服务提交任务，排队和进度消息交给on_progress，返回最终的result消息。
+    服务不可用时抛出OSError，服务返回错误时抛出RuntimeError"""
+    import socket
+    with socket.create_connection(("127.0.0.1", port), timeout=timeout) as connection:
+        # 连接建立后等待任务完成，不设超时
+        connection.settimeout(None)
+        connection.sendall((json.dumps(job, ensure_ascii=False) + "\n").encode("utf-8"))
+        with connection.makefile('r', encoding='utf-8') as reader:
+            for line in reader:
+                message = json.loads(line)
+                if message["type"] == "result":
+                    return message
+                if message["type"] == "error":
+                    raise RuntimeError(message["message"])
+                if on_progress:
+                    on_progress(message)
+    raise ConnectionError("与比对服务的连接意外中断")
+
+def format_summary(counts):
+    """比对结果摘要"""
+    return f"匹配: {counts['匹配']}\n不匹配: {counts['不匹配']}\n其他结果: {counts['其他结果']}\n错误: {counts['错误']}"
 
 class ExcelComparator:
+    # 主文件中Model列和Part No列的可能写法（按优先级排列）
+    MODEL_COLUMN_ALIASES = ('model', 'model no', 'model number', 'model#', 'models', '型号', '模型', 'model号')
+    PARTNO_COLUMN_ALIASES = ('part no', 'partno', 'part number', 'part#', 'partnumber', 'part_no', 'part-no', 'part', '零件号', '零件编号', '料号')
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Excel文件比对工具")
@@ -174,7 +2899,7 @@ class ExcelComparator:
         # 设置变量
         self.master_file_path = tk.StringVar()
         self.folder_path = tk.StringVar()
-        self.result_data = []
+        self.result_data = ResultStore()
         self.master_sheet_name = None  # 保存选择的工作表名称
         
         # 添加模型匹配模式变量，默认为完全匹配
@@ -183,29 +2908,68 @@ class ExcelComparator:
         # 添加无规则时提取所有行的设置，默认为False
         self.extract_all_when_no_rules = tk.BooleanVar(value=False)
         
+        # 只比对模式：只给出比对结果，不写出匹配文件（需要时再生成），默认为False
+        self.compare_only = tk.BooleanVar(value=False)
+        
+        # 读取比对文件的所有工作表（默认只读取第一个有数据的工作表）
+        self.all_sheets = tk.BooleanVar(value=False)
+        
+        # 包括比对文件夹的子文件夹，以及查找比对文件时包含/排除的通配符
+        self.recursive_scan = tk.BooleanVar(value=False)
+        self.folder_include_patterns = []
+        self.folder_exclude_patterns = []
+        
         # 比对规则列表
         self.comparison_rules = []
         
         # 添加提取列配置列表
         self.extract_columns = []
         
+        # 列名解析器，按表头签名缓存列名解析结果
+        self.column_resolver = ColumnResolver()
+        
+        # 匹配数据登记表的内存预算（MB），超出后转存到磁盘
+        self.merge_memory_budget_mb = 512
+        
+        # 正则条件在单个文件上的时间预算（秒），超时的规则在本次比对中跳过，0表示不限制
+        self.regex_time_budget_seconds = 30
+        self.timed_out_rules = {}  # 规则在规则列表中的位置 -> (规则名, 超时的文件名)
+        self.written_files = []  # 本次比对写出的匹配文件
+        self.deferred_matches = {}  # 只比对模式下暂不生成的匹配文件 -> (比对文件, 文件签名, 匹配行位置, 是否读取所有工作表)
+        
+        # 并行处理比对文件的进程数（0表示使用所有核心，1表示不使用子进程）和同时处理文件的内存预算（MB）
+        self.max_workers = 0
+        self.parallel_memory_budget_mb = 1024
+        
+        # 逐个处理比对文件时在后台预读的文件数，0表示不预读
+        self.prefetch_depth = 2
+        
+        # 本机比对服务的端口，设置后比对任务交给服务执行（服务未运行时仍在本程序中比对），0表示不使用
+        self.service_port = 0
+        
+        # 批量比对的主文件列表[(主文件路径, 工作表)]，工作表为None时读取第一个工作表
+        self.batch_jobs = []
+        
+        # 最近一次比对与上次比对相同主文件的结果相比的变化(上次比对时间, 变化的条目)
+        self.last_run_delta = None
+        
         # 配置文件路径
-        try:
-            # PyInstaller打包后的应用程序位置
-            if getattr(sys, 'frozen', False):
-                application_path = os.path.dirname(sys.executable)
-            else:
-                application_path = os.path.dirname(os.path.abspath(__file__))
-            self.config_file = os.path.join(application_path, "config.json")
-            print(f"配置文件路径: {self.config_file}")
-        except Exception as e:
-            print(f"配置文件路径设置错误: {str(e)}")
-            # 备用方案：保存在当前工作目录
-            self.config_file = "config.json"
+        self.config_file = get_config_path()
+        print(f"配置文件路径: {self.config_file}")
         
         # 加载上次的设置和规则
         self.load_settings()
         
+        # 规则求值统计，保存在配置文件旁，下次运行直接按统计安排求值顺序
+        self.rule_stats = RuleStatistics(os.path.join(os.path.dirname(self.config_file), "rule_stats.json"))
+        self.rule_stats.load()
+        
+        # 本次运行写出的匹配数据登记表，合并时直接复用
+        self.matched_registry = MatchedFrameRegistry(self.merge_memory_budget_mb)
+        
+        # 各比对文件夹的Part No倒排索引（按需加载）
+        self.partno_indexes = {}
+        
         # 如果没有任何规则，创建默认规则
         if not self.comparison_rules:
             self.create_default_rules()
@@ -217,6 +2981,26 @@ class ExcelComparator:
         # 创建界面
         self.create_widgets()
         
+        # 窗口显示后在后台预先导入pandas等模块，首次比对时无需等待
+        self.preload_thread = None
+        self.preload_seconds = None
+        self.root.after(100, self.preload_modules)
+        
+    def preload_modules(self):
+        """在后台线程中导入pandas、numpy和Excel读写引擎（不操作任何界面控件）"""
+        def worker():
+            start = time.perf_counter()
+            try:
+                pd._import_module()
+                np._import_module()
+                import openpyxl  # noqa: F401
+            except Exception as e:
+                print(f"后台预加载模块时出错: {str(e)}")
+            self.preload_seconds = time.perf_counter() - start
+        
+        self.preload_thread = threading.Thread(target=worker, daemon=True)
+        self.preload_thread.start()
+    
     def setup_styles(self):
         """设置应用样式"""
         style = ttk.Style()
@@ -292,6 +3076,7 @@ class ExcelComparator:
         ttk.Label(folder_frame, text="比对文件夹:").pack(side=tk.LEFT, padx=(0, 5))
         ttk.Entry(folder_frame, textvariable=self.folder_path, width=60).pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
         ttk.Button(folder_frame, text="浏览...", command=self.browse_folder).pack(side=tk.LEFT, padx=5)
+        ttk.Button(folder_frame, text="预览文件", command=self.preview_folder_file).pack(side=tk.LEFT, padx=2)
         
         # 添加模型匹配模式选项 - 放在新的框架中
         match_mode_frame = ttk.Frame(file_frame)
@@ -304,6 +3089,18 @@ class ExcelComparator:
         ttk.Checkbutton(match_mode_frame, text="无规则时提取所有行", 
                         variable=self.extract_all_when_no_rules).pack(side=tk.LEFT, padx=(20, 5))
         
+        # 只比对模式选项
+        ttk.Checkbutton(match_mode_frame, text="只比对（暂不生成匹配文件）", 
+                        variable=self.compare_only).pack(side=tk.LEFT, padx=(20, 5))
+        
+        # 读取所有工作表选项
+        ttk.Checkbutton(match_mode_frame, text="读取比对文件的所有工作表", 
+                        variable=self.all_sheets).pack(side=tk.LEFT, padx=(20, 5))
+        
+        # 包括子文件夹选项
+        ttk.Checkbutton(match_mode_frame, text="包括子文件夹", 
+                        variable=self.recursive_scan).pack(side=tk.LEFT, padx=(20, 5))
+        
         # 动作按钮框架
         action_frame = ttk.Frame(main_frame)
         action_frame.pack(fill=tk.X, padx=5, pady=10)
@@ -311,12 +3108,21 @@ class ExcelComparator:
         # 执行按钮 - 使用突出显示的样式
         ttk.Button(action_frame, text="开始比对", command=self.compare_files, style='Primary.TButton').pack(side=tk.LEFT, padx=5)
         
+        # 批量比对按钮
+        ttk.Button(action_frame, text="批量比对", command=self.show_batch_compare).pack(side=tk.LEFT, padx=5)
+        
         # 管理规则按钮
         ttk.Button(action_frame, text="管理比对规则", command=self.manage_rules).pack(side=tk.LEFT, padx=5)
         
         # 在action_frame中添加管理提取列按钮
         ttk.Button(action_frame, text="管理提取列", command=self.manage_extract_columns).pack(side=tk.LEFT, padx=5)
         
+        # Part No反查按钮
+        ttk.Button(action_frame, text="Part No反查", command=self.show_partno_lookup).pack(side=tk.LEFT, padx=5)
+        
+        # 版本比对按钮
+        ttk.Button(action_frame, text="版本比对", command=self.show_workbook_diff).pack(side=tk.LEFT, padx=5)
+        
         # 添加使用说明按钮 - 移到管理提取列按钮后面
         ttk.Button(action_frame, text="使用说明", command=self.show_help).pack(side=tk.LEFT, padx=5)
         
@@ -334,38 +3140,21 @@ class ExcelComparator:
                 break
         
         # 设置结果列名
-        columns = ("序号", "Model", "总文件Part No", primary_column_name, "比对结果")
-        self.result_tree = ttk.Treeview(result_frame, columns=columns, show="headings")
-        
+        columns = ("序号", "Model", "总文件Part No", primary_column_name, "比对结果", "主文件")
+
         # 设置列标题和宽度
         column_widths = {
             "序号": 60,
             "Model": 120,
             "总文件Part No": 200,
-            "比对结果": 100
+            "比对结果": 100,
+            "主文件": 150
         }
         # 为主键列动态添加宽度
         column_widths[primary_column_name] = 200
-        
-        for col in columns:
-            self.result_tree.heading(col, text=col)
-            self.result_tree.column(col, width=column_widths[col], minwidth=50)
-        
-        # 添加水平和垂直滚动条
-        v_scrollbar = ttk.Scrollbar(result_frame, orient=tk.VERTICAL, command=self.result_tree.yview)
-        self.result_tree.configure(yscrollcommand=v_scrollbar.set)
-        
-        h_scrollbar = ttk.Scrollbar(result_frame, orient=tk.HORIZONTAL, command=self.result_tree.xview)
-        self.result_tree.configure(xscrollcommand=h_scrollbar.set)
-        
-        # 使用网格布局放置树形视图和滚动条
-        self.result_tree.grid(row=0, column=0, sticky='nsew')
-        v_scrollbar.grid(row=0, column=1, sticky='ns')
-        h_scrollbar.grid(row=1, column=0, sticky='ew')
-        
-        # 设置行列权重使得树形视图可随窗口调整大小
-        result_frame.columnconfigure(0, weight=1)
-        result_frame.rowconfigure(0, weight=1)
+
+        # 虚拟化结果表格：只为可见的行创建项目，支持按比对结果/Model/Part No过滤和点击列标题排序
+        self.result_view = VirtualResultView(result_frame, self.result_data, columns, column_widths)
         
         # 底部工具栏
         toolbar_frame = ttk.Frame(main_frame, padding="5")
@@ -381,6 +3170,8 @@ class ExcelComparator:
         button_frame.pack(side=tk.RIGHT)
         
         ttk.Button(button_frame, text="导出结果", command=self.export_results).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="比对变化", command=self.show_run_delta).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="生成匹配文件", command=self.materialize_matched_files).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="合并匹配文件", command=self.merge_matched_files).pack(side=tk.LEFT, padx=5)
     
     def browse_master_file(self):
@@ -517,17 +3308,33 @@ class ExcelComparator:
         except Exception as e:
             messagebox.showerror("错误", f"读取Excel文件失败: {str(e)}")
     
-    def save_settings(self):
-        """保存当前设置和规则到配置文件"""
-        settings = {
+    def get_settings(self):
+        """当前设置和规则（config.json的内容）"""
+        return {
             "master_file_path": self.master_file_path.get(),
             "folder_path": self.folder_path.get(),
             "rules": [rule.to_dict() for rule in self.comparison_rules],
             "extract_columns": [column.to_dict() for column in self.extract_columns],
             "master_sheet_name": self.master_sheet_name,
             "exact_model_match": self.exact_model_match.get(),
-            "extract_all_when_no_rules": self.extract_all_when_no_rules.get()
+            "extract_all_when_no_rules": self.extract_all_when_no_rules.get(),
+            "compare_only": self.compare_only.get(),
+            "all_sheets": self.all_sheets.get(),
+            "recursive_scan": self.recursive_scan.get(),
+            "folder_include_patterns": self.folder_include_patterns,
+            "folder_exclude_patterns": self.folder_exclude_patterns,
+            "merge_memory_budget_mb": self.merge_memory_budget_mb,
+            "regex_time_budget_seconds": self.regex_time_budget_seconds,
+            "max_workers": self.max_workers,
+            "parallel_memory_budget_mb": self.parallel_memory_budget_mb,
+            "prefetch_depth": self.prefetch_depth,
+            "service_port": self.service_port,
+            "batch_jobs": [list(job) for job in self.batch_jobs]
         }
+    
+    def save_settings(self):
+        """保存当前设置和规则到配置文件"""
+        settings = self.get_settings()
         try:
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(settings, f, ensure_ascii=False, indent=2)
@@ -550,6 +3357,36 @@ class ExcelComparator:
                     # 加载无规则时提取所有行设置，默认为False
                     self.extract_all_when_no_rules.set(settings.get("extract_all_when_no_rules", False))
                     
+                    # 加载只比对模式设置，默认为False
+                    self.compare_only.set(settings.get("compare_only", False))
+                    
+                    # 加载读取所有工作表设置，默认为False
+                    self.all_sheets.set(settings.get("all_sheets", False))
+                    
+                    # 加载子文件夹和通配符设置，默认只查找比对文件夹本身的文件
+                    self.recursive_scan.set(settings.get("recursive_scan", False))
+                    self.folder_include_patterns = settings.get("folder_include_patterns", [])
+                    self.folder_exclude_patterns = settings.get("folder_exclude_patterns", [])
+                    
+                    # 加载合并时的内存预算设置，默认为512MB
+                    self.merge_memory_budget_mb = settings.get("merge_memory_budget_mb", 512)
+                    
+                    # 加载正则条件在单个文件上的时间预算，默认为30秒
+                    self.regex_time_budget_seconds = settings.get("regex_time_budget_seconds", 30)
+                    
+                    # 加载并行处理设置，默认使用所有核心，内存预算为1024MB
+                    self.max_workers = settings.get("max_workers", 0)
+                    self.parallel_memory_budget_mb = settings.get("parallel_memory_budget_mb", 1024)
+                    
+                    # 加载预读文件数，默认为2
+                    self.prefetch_depth = settings.get("prefetch_depth", 2)
+                    
+                    # 加载比对服务端口，默认为0（不使用比对服务）
+                    self.service_port = settings.get("service_port", 0)
+                    
+                    # 加载批量比对的主文件列表
+                    self.batch_jobs = [tuple(job) for job in settings.get("batch_jobs", [])]
+                    
                     # 加载规则
                     rules_data = settings.get("rules", [])
                     self.comparison_rules = [ComparisonRule.from_dict(rule_dict) for rule_dict in rules_data]
@@ -904,6 +3741,21 @@ class ExcelComparator:
             # 如果有正在编辑的规则，先保存它
             if current_rule_index["value"] >= 0:
                 update_rule()
+            
+            # 检查正则表达式条件中容易导致长时间回溯的写法
+            warnings = []
+            for rule in self.comparison_rules:
+                for condition in rule.conditions:
+                    if not condition.is_regex:
+                        continue
+                    for value in condition.search_values:
+                        for problem in RegexGuard.analyze(value):
+                            warnings.append(f"规则 '{rule.name}' 条件 '{condition.column_name}': {value}\n    {problem}")
+            if warnings:
+                message = "以下正则表达式可能在大文件上执行很慢:\n\n" + "\n".join(warnings) + "\n\n仍然保存吗？"
+                if not messagebox.askyesno("正则表达式警告", message, parent=rules_dialog):
+                    return
+            
             self.save_settings()
             rules_dialog.destroy()
         
@@ -929,322 +3781,386 @@ class ExcelComparator:
         rules_dialog.focus_set()
         rules_dialog.wait_window()
     
-    def read_file(self, file_path):
-        """根据文件类型读取文件内容"""
-        if file_path.lower().endswith(('.xlsx', '.xls')):
-            # 读取Excel文件
-            if self.master_sheet_name and file_path == self.master_file_path.get():
-                # 如果是主文件并且已选择工作表，则使用选择的工作表
-                return pd.read_excel(file_path, sheet_name=self.master_sheet_name)
-            else:
-                # 尝试获取所有工作表名称
-                xls = pd.ExcelFile(file_path)
-                sheet_names = xls.sheet_names
-                
-                if not sheet_names:
-                    raise ValueError(f"Excel文件不包含任何工作表: {file_path}")
-                
-                # 尝试读取所有工作表，直到找到有数据的工作表
-                for sheet in sheet_names:
-                    temp_df = pd.read_excel(file_path, sheet_name=sheet)
-                    if not temp_df.empty:
-                        print(f"在工作表 '{sheet}' 中找到数据")
-                        return temp_df
-                
-                # 如果所有工作表都为空，尝试不同的header选项
-                for sheet in sheet_names:
-                    for header_row in range(5):  # 尝试前5行作为表头
-                        try:
-                            temp_df = pd.read_excel(file_path, sheet_name=sheet, header=header_row)
-                            if not temp_df.empty and len(temp_df.columns) > 1:  # 确保有多列数据
-                                return temp_df
-                        except Exception:
-                            pass
-                
-                raise ValueError(f"无法从Excel文件中读取有效数据: {file_path}")
+    def read_master_file(self, file_path, sheet_name=None):
+        """读取主文件，指定了工作表时读取该工作表"""
+        if sheet_name and file_path.lower().endswith(('.xlsx', '.xls')):
+            df = pd.read_excel(file_path, sheet_name=sheet_name)
+            df.attrs["sheet_name"] = sheet_name
+            return df
+        return self.read_file(file_path)
+    
+    @staticmethod
+    def master_label(master_path, sheet_name=None):
+        """批量比对结果中的主文件标签：文件名，指定了工作表时附加工作表名"""
+        label = os.path.basename(master_path)
+        return f"{label} [{sheet_name}]" if sheet_name else label
+    
+    def read_file(self, file_path, data=None, all_sheets=False):
+        """根据文件类型读取文件内容，data为预读的文件内容，all_sheets为True时读取Excel文件所有有数据的工作表"""
+        if file_path.lower().endswith(('.xlsx', '.xls')) and self.master_sheet_name and file_path == self.master_file_path.get():
+            # 如果是主文件并且已选择工作表，则使用选择的工作表
+            df = pd.read_excel(file_path, sheet_name=self.master_sheet_name)
+            df.attrs["sheet_name"] = self.master_sheet_name
+            return df
         
-        elif file_path.lower().endswith('.csv'):
-            # 读取CSV文件，优先尝试中文编码
-            # 根据日志分析，调整编码尝试顺序，将中文编码放在前面
-            encodings = ['gb18030', 'gbk', 'gb2312', 'utf-8', 'latin1']
-            
-            for encoding in encodings:
-                try:
-                    print(f"尝试使用编码 {encoding} 读取CSV文件...")
-                    df = pd.read_csv(file_path, encoding=encoding)
-                    if not df.empty:
-                        print(f"成功使用编码 {encoding} 读取CSV文件")
-                        return df
-                except Exception as e:
-                    print(f"尝试使用编码 {encoding} 读取失败: {str(e)}")
-            
-            # 如果所有编码都失败，询问用户
-            encoding_dialog = tk.Toplevel(self.root)
-            encoding_dialog.title("选择编码")
-            encoding_dialog.geometry("350x200")
-            encoding_dialog.transient(self.root)
-            encoding_dialog.grab_set()
-            
-            ttk.Label(encoding_dialog, text="无法自动识别CSV文件编码，请选择:").pack(pady=10)
-            
-            encoding_var = tk.StringVar(value="utf-8")
-            encoding_combo = ttk.Combobox(encoding_dialog, textvariable=encoding_var)
-            encoding_combo['values'] = ('utf-8', 'gb18030', 'gbk', 'gb2312', 'latin1', 'utf-16', 'ascii')
-            encoding_combo.pack(pady=10)
-            
-            result = {"df": None, "success": False}
-            
-            def on_confirm():
-                try:
-                    result["df"] = pd.read_csv(file_path, encoding=encoding_var.get())
-                    result["success"] = True
-                    encoding_dialog.destroy()
-                except Exception as e:
-                    messagebox.showerror("错误", f"使用编码 {encoding_var.get()} 读取失败: {str(e)}")
-            
-            ttk.Button(encoding_dialog, text="确认", command=on_confirm).pack(pady=10)
-            
-            # 等待对话框关闭
-            self.root.wait_window(encoding_dialog)
-            
-            if result["success"] and result["df"] is not None:
-                return result["df"]
-            
-            raise ValueError(f"无法读取CSV文件: {file_path}")
-        else:
-            raise ValueError(f"不支持的文件类型: {file_path}")
+        try:
+            return FileExtractor.read_file(file_path, data, all_sheets)
+        except CsvEncodingError:
+            pass
+        
+        # 如果所有编码都失败，询问用户
+        encoding_dialog = tk.Toplevel(self.root)
+        encoding_dialog.title("选择编码")
+        encoding_dialog.geometry("350x200")
+        encoding_dialog.transient(self.root)
+        encoding_dialog.grab_set()
+        
+        ttk.Label(encoding_dialog, text="无法自动识别CSV文件编码，请选择:").pack(pady=10)
+        
+        encoding_var = tk.StringVar(value="utf-8")
+        encoding_combo = ttk.Combobox(encoding_dialog, textvariable=encoding_var)
+        encoding_combo['values'] = ('utf-8', 'gb18030', 'gbk', 'gb2312', 'latin1', 'utf-16', 'ascii')
+        encoding_combo.pack(pady=10)
+        
+        result = {"df": None, "success": False}
+        
+        def on_confirm():
+            try:
+                source = io.BytesIO(ArchiveFolder.read(file_path)) if ArchiveFolder.split_path(file_path) else file_path
+                result["df"] = pd.read_csv(source, encoding=encoding_var.get())
+                result["success"] = True
+                encoding_dialog.destroy()
+            except Exception as e:
+                messagebox.showerror("错误", f"使用编码 {encoding_var.get()} 读取失败: {str(e)}")
+        
+        ttk.Button(encoding_dialog, text="确认", command=on_confirm).pack(pady=10)
+        
+        # 等待对话框关闭
+        self.root.wait_window(encoding_dialog)
+        
+        if result["success"] and result["df"] is not None:
+            return result["df"]
+        
+        raise ValueError(f"无法读取CSV文件: {file_path}")
     
-    def compare_files(self):
+    def compare_files(self, jobs=None):
+        """执行比对。jobs为批量比对的[(主文件路径, 工作表)]列表，各主文件共用比对文件夹的文件列表，
+        每个对应文件只读取和提取一次，结果按主文件标注；为None时比对界面中选择的主文件"""
         # 更新状态
         self.update_status("正在准备比对...")
         
-        master_path = self.master_file_path.get()
         folder_path = self.folder_path.get()
+        batch = jobs is not None
+        if not batch:
+            master_path = self.master_file_path.get()
+            jobs = [(master_path, self.master_sheet_name)] if master_path else []
         
-        if not master_path or not folder_path:
+        if not jobs or not folder_path:
             messagebox.showerror("错误", "请选择总Excel文件和比对文件夹")
             self.update_status("就绪")
             return
         
+        # 已配置比对服务时交给服务执行（批量比对在本程序中执行）
+        if not batch and self.service_port and self.compare_via_service(jobs[0][0], folder_path):
+            return
+        
         # 创建输出文件夹
         output_folder = os.path.join(folder_path, "匹配文件")
         if not os.path.exists(output_folder):
             os.makedirs(output_folder)
             
-        try:
-            # 清空先前的结果
-            for item in self.result_tree.get_children():
-                self.result_tree.delete(item)
-            self.result_data = []
+        try:
+            # 清空先前的结果
+            self.result_view.reset()
+            self.matched_registry.clear()
+            self.timed_out_rules = {}
+            self.written_files = []
+            self.deferred_matches = {}
+            
+            masters = []  # (主文件路径, 工作表, Model列, Part No列)
+            master_tables = []  # (主文件数据, Model列, Part No列, 结果标签)
+            for master_path, sheet_name in jobs:
+                # 检查文件是否存在和可访问
+                if not os.path.exists(master_path):
+                    messagebox.showerror("错误", f"找不到文件: {master_path}")
+                    self.update_status("就绪")
+                    return
+                
+                self.update_status(f"正在读取主文件: {os.path.basename(master_path)}...")
+                
+                try:
+                    # 读取主文件
+                    master_df = self.read_master_file(master_path, sheet_name)
+                    
+                    # 显示读取到的数据基本信息
+                    print(f"成功读取数据，行数: {len(master_df)}")
+                    print(f"列名: {master_df.columns.tolist()}")
+                    print("前3行内容:")
+                    print(master_df.head(3))
+                    
+                except Exception as e:
+                    import traceback
+                    error_details = traceback.format_exc()
+                    messagebox.showerror("错误", f"读取文件失败: {str(e)}\n\n请确保文件格式正确且未被其他程序锁定。\n\n详细信息:\n{error_details}")
+                    self.update_status("就绪")
+                    return
+                
+                # 列名规范化处理
+                # 将DataFrame的列名转换为小写，并存储原始列名与小写列名的映射
+                columns_lower = {str(col).lower().strip(): col for col in master_df.columns}
+                
+                # 显示处理后的列名映射，帮助调试
+                print("处理后的列名映射:")
+                for k, v in columns_lower.items():
+                    print(f"  {k} -> {v}")
+                
+                # 检查必要的列是否存在（不区分大小写），相同表头布局直接使用缓存的解析结果
+                model_col = None
+                partno_col = None
+                
+                # 查找model列（尝试多种可能的写法）
+                model_match = self.column_resolver.resolve(master_df.columns, self.MODEL_COLUMN_ALIASES)
+                if model_match:
+                    model_col = model_match[0]
+                    print(f"找到model列({model_match[1]}): {model_col}")
+                
+                # 查找Part No列（尝试多种可能的写法）
+                partno_match = self.column_resolver.resolve(master_df.columns, self.PARTNO_COLUMN_ALIASES)
+                if partno_match:
+                    partno_col = partno_match[0]
+                    print(f"找到part no列({partno_match[1]}): {partno_col}")
+                
+                # 如果找不到列，让用户手动选择
+                if not model_col or not partno_col:
+                    # 创建列选择对话框
+                    select_dialog = tk.Toplevel(self.root)
+                    select_dialog.title("列选择")
+                    select_dialog.geometry("400x300")
+                    select_dialog.transient(self.root)
+                    select_dialog.grab_set()
+                
+                    ttk.Label(select_dialog, text=f"无法自动识别{os.path.basename(master_path)}中必要的列，请手动选择:").pack(pady=10)
+                
+                    # Model列选择
+                    model_frame = ttk.Frame(select_dialog)
+                    model_frame.pack(fill=tk.X, padx=10, pady=5)
+                    ttk.Label(model_frame, text="选择Model列:").pack(side=tk.LEFT)
+                    model_var = tk.StringVar()
+                    model_combo = ttk.Combobox(model_frame, textvariable=model_var, values=list(master_df.columns))
+                    model_combo.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+                
+                    # Part No列选择
+                    partno_frame = ttk.Frame(select_dialog)
+                    partno_frame.pack(fill=tk.X, padx=10, pady=5)
+                    ttk.Label(partno_frame, text="选择Part No列:").pack(side=tk.LEFT)
+                    partno_var = tk.StringVar()
+                    partno_combo = ttk.Combobox(partno_frame, textvariable=partno_var, values=list(master_df.columns))
+                    partno_combo.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+                
+                    # 返回选择结果
+                    result_vars = {"model": None, "partno": None, "confirmed": False}
+                
+                    def on_confirm():
+                        if model_var.get() and partno_var.get():
+                            result_vars["model"] = model_var.get()
+                            result_vars["partno"] = partno_var.get()
+                            result_vars["confirmed"] = True
+                            select_dialog.destroy()
+                        else:
+                            messagebox.showwarning("警告", "请选择两个列")
+                
+                    ttk.Button(select_dialog, text="确认", command=on_confirm).pack(pady=10)
+                
+                    # 等待对话框关闭
+                    self.root.wait_window(select_dialog)
+                
+                    # 如果用户取消了选择
+                    if not result_vars["confirmed"]:
+                        self.update_status("就绪")
+                        return
+                
+                    # 使用用户选择的列
+                    model_col = result_vars["model"]
+                    partno_col = result_vars["partno"]
+                
+                    print(f"用户选择 - Model列: {model_col}, Part No列: {partno_col}")
+                
+                masters.append((master_path, sheet_name, model_col, partno_col))
+                master_tables.append((master_df, model_col, partno_col, self.master_label(master_path, sheet_name) if batch else ""))
+            
+            # 比对文件夹中的文件列表只读取一次，所有主文件共用
+            model_files = self.list_model_files(folder_path)
             
-            # 检查文件是否存在和可访问
-            if not os.path.exists(master_path):
-                messagebox.showerror("错误", f"找不到文件: {master_path}")
-                self.update_status("就绪")
-                return
+            # 为各主表的每一行找到对应文件，相同的Model只查找一次
+            row_plans = []  # (行号, Model, 总文件Part No, 对应文件名或None, 主文件标签)
+            model_file_cache = {}
+            for master_df, model_col, partno_col, label in master_tables:
+                for index, row in master_df.iterrows():
+                    model = str(row[model_col]).strip()
+                    master_part_no = str(row[partno_col]).strip()
+                    if model not in model_file_cache:
+                        model_file_cache[model] = self.find_model_file(model, model_files)
+                    row_plans.append((index, model, master_part_no, model_file_cache[model], label))
+            total_rows = len(row_plans)
             
-            self.update_status("正在读取主文件...")
+            # 只按文件名查找对应文件，不同子文件夹中有同名文件时只比对先找到的一个，完成时提示
+            ambiguous_files = find_ambiguous_model_files(model_file_cache.values(), model_files)
+            if ambiguous_files:
+                print(format_ambiguous_files(ambiguous_files))
             
-            try:
-                # 读取主文件
-                master_df = self.read_file(master_path)
-                
-                # 显示读取到的数据基本信息
-                print(f"成功读取数据，行数: {len(master_df)}")
-                print(f"列名: {master_df.columns.tolist()}")
-                print("前3行内容:")
-                print(master_df.head(3))
-                
-            except Exception as e:
-                import traceback
-                error_details = traceback.format_exc()
-                messagebox.showerror("错误", f"读取文件失败: {str(e)}\n\n请确保文件格式正确且未被其他程序锁定。\n\n详细信息:\n{error_details}")
-                self.update_status("就绪")
-                return
+            # 检查是否有上次中断的比对进度
+            checkpoint = ComparisonCheckpoint(output_folder)
+            fingerprint = self.run_fingerprint(masters, folder_path, model_files)
+            start_row = 0
+            file_results = {}  # 对应文件名 -> ("ok", Part No列表) 或 ("error", 错误信息)
+            saved_state = checkpoint.load(fingerprint)
+            if saved_state and 0 < saved_state["processed_rows"] < total_rows:
+                if messagebox.askyesno("继续比对", f"发现上次未完成的比对（已完成 {saved_state['processed_rows']}/{total_rows} 行），输入文件和配置均未变化。\n\n是否从中断处继续？"):
+                    start_row = saved_state["processed_rows"]
+                    file_results = saved_state["file_results"]
+                    self.result_data.set_state(saved_state["results"])
+                    self.written_files = saved_state["written_files"]
+                    self.timed_out_rules = saved_state["timed_out_rules"]
+                    self.deferred_matches = saved_state.get("deferred_matches", {})
+                    self.result_view.refresh()
+                    print(f"从第 {start_row + 1} 行继续比对")
             
-            # 列名规范化处理
-            # 将DataFrame的列名转换为小写，并存储原始列名与小写列名的映射
-            columns_lower = {str(col).lower().strip(): col for col in master_df.columns}
-            
-            # 显示处理后的列名映射，帮助调试
-            print("处理后的列名映射:")
-            for k, v in columns_lower.items():
-                print(f"  {k} -> {v}")
-            
-            # 检查必要的列是否存在（不区分大小写）
-            model_col = None
-            partno_col = None
-            
-            # 查找model列（尝试多种可能的写法）
-            for possible_name in ['model', 'model no', 'model number', 'model#', 'models', '型号', '模型', 'model号']:
-                possible_lower = possible_name.lower()
-                # 精确匹配
-                if possible_lower in columns_lower:
-                    model_col = columns_lower[possible_lower]
-                    print(f"找到model列(精确匹配): {model_col}")
-                    break
-                # 部分匹配
-                for col_lower, col in columns_lower.items():
-                    if possible_lower in col_lower or col_lower in possible_lower:
-                        model_col = col
-                        print(f"找到model列(部分匹配): {model_col}")
-                        break
-                if model_col:
-                    break
+            def make_checkpoint_state():
+                return {
+                    "fingerprint": fingerprint,
+                    "processed_rows": processed_rows,
+                    "file_results": file_results,
+                    "results": self.result_data.get_state(),
+                    "written_files": self.written_files,
+                    "timed_out_rules": self.timed_out_rules,
+                    "deferred_matches": self.deferred_matches
+                }
             
-            # 查找Part No列（尝试多种可能的写法）
-            for possible_name in ['part no', 'partno', 'part number', 'part#', 'partnumber', 'part_no', 'part-no', 'part', '零件号', '零件编号', '料号']:
-                possible_lower = possible_name.lower()
-                # 尝试精确匹配
-                if possible_lower in columns_lower:
-                    partno_col = columns_lower[possible_lower]
-                    print(f"找到part no列(精确匹配): {partno_col}")
-                    break
-                # 尝试部分匹配
-                for col_lower, col in columns_lower.items():
-                    if possible_lower in col_lower or col_lower in possible_lower:
-                        partno_col = col
-                        print(f"找到part no列(部分匹配): {partno_col}")
+            def append_ready_rows():
+                # 按主表顺序输出对应文件已处理完的行，遇到尚未处理的文件时停止
+                nonlocal processed_rows
+                while processed_rows < total_rows:
+                    index, model, master_part_no, model_file, label = row_plans[processed_rows]
+                    if model_file and model_file not in file_results:
                         break
-                if partno_col:
-                    break
+                    self.append_row_results(index, model, master_part_no, file_results.get(model_file), label)
+                    processed_rows += 1
+                self.result_view.notify_appended()
+                # 定期保存比对进度
+                checkpoint.save_if_due(make_checkpoint_state)
             
-            # 如果找不到列，让用户手动选择
-            if not model_col or not partno_col:
-                # 创建列选择对话框
-                select_dialog = tk.Toplevel(self.root)
-                select_dialog.title("列选择")
-                select_dialog.geometry("400x300")
-                select_dialog.transient(self.root)
-                select_dialog.grab_set()
-                
-                ttk.Label(select_dialog, text="无法自动识别必要的列，请手动选择:").pack(pady=10)
-                
-                # Model列选择
-                model_frame = ttk.Frame(select_dialog)
-                model_frame.pack(fill=tk.X, padx=10, pady=5)
-                ttk.Label(model_frame, text="选择Model列:").pack(side=tk.LEFT)
-                model_var = tk.StringVar()
-                model_combo = ttk.Combobox(model_frame, textvariable=model_var, values=list(master_df.columns))
-                model_combo.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
-                
-                # Part No列选择
-                partno_frame = ttk.Frame(select_dialog)
-                partno_frame.pack(fill=tk.X, padx=10, pady=5)
-                ttk.Label(partno_frame, text="选择Part No列:").pack(side=tk.LEFT)
-                partno_var = tk.StringVar()
-                partno_combo = ttk.Combobox(partno_frame, textvariable=partno_var, values=list(master_df.columns))
-                partno_combo.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
-                
-                # 返回选择结果
-                result_vars = {"model": None, "partno": None, "confirmed": False}
-                
-                def on_confirm():
-                    if model_var.get() and partno_var.get():
-                        result_vars["model"] = model_var.get()
-                        result_vars["partno"] = partno_var.get()
-                        result_vars["confirmed"] = True
-                        select_dialog.destroy()
-                    else:
-                        messagebox.showwarning("警告", "请选择两个列")
-                
-                ttk.Button(select_dialog, text="确认", command=on_confirm).pack(pady=10)
+            # 每个对应文件只读取和提取一次（继续比对时跳过已处理的文件）
+            pending_files = []
+            for _, _, _, model_file, _ in row_plans[start_row:]:
+                if model_file and model_file not in file_results and model_file not in pending_files:
+                    pending_files.append(model_file)
+            
+            extractor = self.make_extractor()
+            extractor.output_names = FileExtractor.output_file_names(model_files)
+            processed_rows = start_row
+            append_ready_rows()
+            
+            scheduler = FileJobScheduler(self.max_workers, self.parallel_memory_budget_mb)
+            pending_paths = [os.path.join(folder_path, file) for file in pending_files]
+            parallel_report = None
+            if scheduler.should_parallelize(pending_paths):
+                # 在子进程中并行处理，大文件优先
+                FrameHandoff.cleanup(local_cache_folder(output_folder))
+                self.update_status(f"正在并行处理 {len(pending_files)} 个文件...")
                 
-                # 等待对话框关闭
-                self.root.wait_window(select_dialog)
+                completed_files = 0
+                # 子进程按完整路径返回结果，对应回文件列表中的名称（可能位于压缩包内）
+                path_files = dict(zip(pending_paths, pending_files))
                 
-                # 如果用户取消了选择
-                if not result_vars["confirmed"]:
-                    self.update_status("就绪")
-                    return
-                    
-                # 使用用户选择的列
-                model_col = result_vars["model"]
-                partno_col = result_vars["partno"]
+                def on_file_done(file_path, result):
+                    nonlocal completed_files
+                    file = path_files[file_path]
+                    if result.get("error") is None:
+                        extractor.merge_worker_result(result)
+                        handed_off = FrameHandoff.unpack(result["handoff"])
+                        for output_file, matched_df in handed_off["matched"].items():
+                            self.matched_registry.adopt(output_file, matched_df)
+                        file_results[file] = ("ok", FrameHandoff.decode_part_nos(*handed_off["part_nos"]))
+                    else:
+                        file_results[file] = ("error", result["error"])
+                    completed_files += 1
+                    self.update_status(f"已处理 {completed_files}/{len(pending_files)} 个文件: {file}")
+                    append_ready_rows()
                 
-                print(f"用户选择 - Model列: {model_col}, Part No列: {partno_col}")
-            
-            # 遍历主表中的每一行
-            total_rows = len(master_df)
-            for index, row in master_df.iterrows():
-                # 更新进度状态
-                self.update_status(f"正在比对第 {index+1}/{total_rows} 行...")
-                
-                model = str(row[model_col]).strip()
-                master_part_no = str(row[partno_col]).strip()
-                
-                # 查找对应文件
-                model_file = None
-                for file in os.listdir(folder_path):
-                    if file.lower().endswith(('.xlsx', '.xls', '.csv')):
-                        # 根据匹配模式选择不同的比对逻辑
-                        if self.exact_model_match.get():
-                            # 完全匹配模式 - 使用正则表达式匹配完整模型名称
-                            pattern = r'(^|[^\w])' + re.escape(model.lower()) + r'([^\w]|$)'
-                            if re.search(pattern, file.lower()):
-                                model_file = file
-                                break
-                        else:
-                            # 部分匹配模式 - 保持原有逻辑
-                            if model.lower() in file.lower():
-                                model_file = file
-                                break
-                
-                if model_file:
-                    # 读取对应的文件
-                    file_path = os.path.join(folder_path, model_file)
-                    try:
-                        compare_df = self.read_file(file_path)
-                        
-                        # 新的Part No提取逻辑
-                        compare_part_nos = self.extract_special_part_nos(compare_df, file_path, output_folder)
-                        
-                        if compare_part_nos:
-                            # 有匹配的Part No
-                            
-                            # 修改为显示所有匹配结果
-                            # 首先检查是否有完全匹配的结果
-                            exact_matches = [pn for pn in compare_part_nos if pn == master_part_no]
+                parallel_report = scheduler.run(pending_paths, extractor.get_settings(), output_folder, on_file_done)
+            else:
+                # 在本进程中逐个处理，后台线程提前读取后面的文件
+                prefetcher = FilePrefetcher(pending_paths, self.prefetch_depth)
+                try:
+                    for position, (file, file_path) in enumerate(zip(pending_files, pending_paths)):
+                        # 更新进度状态
+                        self.update_status(f"正在比对第 {processed_rows + 1}/{total_rows} 行（文件 {position + 1}/{len(pending_files)}: {file}）...")
+                        try:
+                            compare_df = self.read_file(file_path, prefetcher.get(file_path), extractor.all_sheets)
                             
-                            if exact_matches:
-                                # 有完全匹配的结果
-                                for match_pn in exact_matches:
-                                    result = (index + 1, model, master_part_no, match_pn, "匹配")
-                                    self.result_data.append(result)
-                                    self.result_tree.insert("", tk.END, values=result)
-                                
-                                # 同时显示其他不匹配的结果，但标记为"其他结果"
-                                other_part_nos = [pn for pn in compare_part_nos if pn != master_part_no]
-                                for other_pn in other_part_nos:
-                                    result = (index + 1, model, master_part_no, other_pn, "其他结果")
-                                    self.result_data.append(result)
-                                    self.result_tree.insert("", tk.END, values=result)
-                            else:
-                                # 没有完全匹配的结果，显示所有结果为"不匹配"
-                                for pn in compare_part_nos:
-                                    result = (index + 1, model, master_part_no, pn, "不匹配")
-                                    self.result_data.append(result)
-                                    self.result_tree.insert("", tk.END, values=result)
-                        else:
-                            result = (index + 1, model, master_part_no, "未找到符合条件的Part No", "不匹配")
-                            self.result_data.append(result)
-                            self.result_tree.insert("", tk.END, values=result)
-                    except Exception as e:
-                        result = (index + 1, model, master_part_no, f"文件读取错误: {str(e)}", "错误")
-                        self.result_data.append(result)
-                        self.result_tree.insert("", tk.END, values=result)
-                else:
-                    result = (index + 1, model, master_part_no, "未找到对应文件", "错误")
-                    self.result_data.append(result)
-                    self.result_tree.insert("", tk.END, values=result)
+                            # 新的Part No提取逻辑
+                            file_results[file] = ("ok", extractor.extract_special_part_nos(compare_df, file_path, output_folder))
+                        except Exception as e:
+                            file_results[file] = ("error", str(e))
+                        append_ready_rows()
+                finally:
+                    prefetcher.close()
+                if prefetcher.executor is not None and pending_paths:
+                    print(f"预读文件耗时 {prefetcher.read_seconds:.1f} 秒，处理时等待读取 {prefetcher.wait_seconds:.1f} 秒")
+            
+            append_ready_rows()
+            
+            # 比对已完成，不再需要检查点
+            checkpoint.remove()
+            
+            # 按当前的过滤和排序条件刷新结果表格
+            self.result_view.refresh()
+            
+            # 保存本次运行的规则统计
+            self.rule_stats.save()
+            
+            # 记录只比对模式下暂不生成的匹配文件：保留之前比对留下、本次未重新写出的记录，本次写出的匹配文件不再需要生成
+            deferred_store = DeferredMatchStore(output_folder)
+            deferred_store.load()
+            for output_file in self.written_files:
+                deferred_store.entries.pop(output_file, None)
+            deferred_store.entries.update(self.deferred_matches)
+            deferred_store.save()
+            
+            # 保存本次比对结果，并与上次比对相同主文件的结果对比
+            history_masters = [[os.path.abspath(master_path), sheet_name] for master_path, sheet_name, _, _ in masters]
+            self.last_run_delta = None
+            try:
+                run_history = RunHistory(output_folder)
+                previous_runs = run_history.load_runs(history_masters)
+                run_history.save(self.result_data, history_masters)
+                if previous_runs:
+                    self.last_run_delta = (previous_runs[0][0], RunHistory.delta(previous_runs[0][1], self.result_data))
+            except Exception as e:
+                print(f"保存比对历史时出错: {str(e)}")
             
             # 给用户提供结果摘要
-            matches_count = len([r for r in self.result_data if r[4] == "匹配"])
-            non_matches_count = len([r for r in self.result_data if r[4] == "不匹配"])
-            other_results_count = len([r for r in self.result_data if r[4] == "其他结果"])
-            error_count = len([r for r in self.result_data if r[4] == "错误"])
+            # 各类结果的数量在追加结果时已同步计数，无需再次扫描
+            matches_count = self.result_data.count("匹配")
+            non_matches_count = self.result_data.count("不匹配")
+            other_results_count = self.result_data.count("其他结果")
+            error_count = self.result_data.count("错误")
             
-            summary = f"比对完成!\n\n匹配: {matches_count}\n不匹配: {non_matches_count}\n其他结果: {other_results_count}\n错误: {error_count}"
+            summary = f"比对完成!\n\n" + format_summary({"匹配": matches_count, "不匹配": non_matches_count,
+                                                        "其他结果": other_results_count, "错误": error_count})
+            if parallel_report:
+                report_text = self.format_parallel_report(parallel_report)
+                print(report_text)
+                summary += f"\n\n{report_text}"
+            if self.deferred_matches:
+                summary += f"\n\n只比对模式: {len(self.deferred_matches)} 个文件有匹配行，未生成匹配文件，需要时点击\"生成匹配文件\""
+            if self.last_run_delta is not None:
+                summary += f"\n\n{self.format_run_delta(*self.last_run_delta)}，点击\"比对变化\"查看详情"
+            if self.timed_out_rules:
+                timed_out = "\n".join(f"{name}（{file_name}）" for name, file_name in self.timed_out_rules.values())
+                summary += f"\n\n以下规则的正则表达式执行超时，已在后续文件中跳过，请检查:\n{timed_out}"
+            if ambiguous_files:
+                summary += f"\n\n{format_ambiguous_files(ambiguous_files)}"
             messagebox.showinfo("完成", summary)
             
             self.update_status("比对完成")
@@ -1255,106 +4171,261 @@ class ExcelComparator:
             messagebox.showerror("错误", f"比对过程中发生错误: {str(e)}\n\n详细信息:\n{error_details}")
             self.update_status("就绪")
     
-    def extract_special_part_nos(self, df, file_path, output_folder):
-        """
-        根据自定义规则和提取列配置从DataFrame中提取数据
-        """
-        try:
-            # 将列名转为小写便于查找
-            columns_lower = {str(col).lower().strip(): col for col in df.columns}
-            
-            # 查找主键列（通常是Part No）
-            primary_column = None
-            primary_actual_col = None
-            
-            for column in self.extract_columns:
-                if column.is_primary and column.enabled:
-                    primary_column = column
-                    break
-            
-            if not primary_column:
-                # 如果没有设置主键列，使用第一个启用的列作为主键
-                for column in self.extract_columns:
-                    if column.enabled:
-                        primary_column = column
-                        break
-            
-            if not primary_column:
-                print("没有找到可用的主键列配置")
-                return []
-            
-            # 查找主键列的实际列名
-            for search_name in primary_column.search_names:
-                search_name_lower = search_name.lower().strip()
-                if search_name_lower in columns_lower:
-                    primary_actual_col = columns_lower[search_name_lower]
-                    print(f"找到主键列 '{primary_column.name}': {primary_actual_col}")
-                    break
-                
-                # 尝试部分匹配
-                for col_lower, col in columns_lower.items():
-                    if search_name_lower in col_lower or col_lower in search_name_lower:
-                        primary_actual_col = col
-                        print(f"找到主键列 '{primary_column.name}'(部分匹配): {primary_actual_col}")
-                        break
-                
-                if primary_actual_col:
-                    break
-            
-            if not primary_actual_col:
-                print(f"找不到主键列 '{primary_column.name}'")
-                return []
-            
-            # 检查是否有启用的规则
-            has_enabled_rules = any(rule.enabled for rule in self.comparison_rules)
-            has_rule_conditions = any(rule.enabled and rule.conditions for rule in self.comparison_rules)
-            
-            # 如果没有规则或没有条件，且设置为提取所有行
-            if (not has_enabled_rules or not has_rule_conditions) and self.extract_all_when_no_rules.get():
-                print("没有启用的规则或规则没有条件，且设置了提取所有行")
-                matching_rows = df.to_dict('records')  # 提取所有行
-            else:
-                # 应用所有启用的规则
-                matching_rows = []
-                
-                # 检查每一行
-                for index, row in df.iterrows():
-                    # 检查每个规则
-                    for rule in self.comparison_rules:
-                        if rule.enabled and rule.match(row, columns_lower):
-                            matching_rows.append(row)
-                            part_no = str(row[primary_actual_col]).strip()
-                            print(f"找到匹配行: {primary_column.name}={part_no}, 规则={rule.name}")
-                            break  # 一旦找到匹配的规则就不再检查其他规则
-            
-            # 如果有匹配行，创建新的DataFrame并保存到输出文件夹
-            if matching_rows:
-                matched_df = pd.DataFrame(matching_rows)
-                
-                # 生成输出文件名
-                file_name = os.path.basename(file_path)
-                file_base, file_ext = os.path.splitext(file_name)
-                output_file = os.path.join(output_folder, f"{file_base}_匹配{file_ext}")
-                
-                # 保存文件
-                if file_ext.lower() in ['.xlsx', '.xls']:
-                    matched_df.to_excel(output_file, index=False)
-                else:  # CSV文件
-                    matched_df.to_csv(output_file, encoding='gb18030', index=False)
-                
-                print(f"已保存匹配文件: {output_file}")
-                
-                # 返回匹配行的主键列值
-                return [str(row[primary_actual_col]).strip() for row in matching_rows]
+    def show_batch_compare(self):
+        """打开批量比对对话框：选择多个主文件（可分别指定工作表），与比对文件夹一次比对完成"""
+        batch_dialog = tk.Toplevel(self.root)
+        batch_dialog.title("批量比对")
+        batch_dialog.geometry("700x400")
+        batch_dialog.transient(self.root)
+        batch_dialog.grab_set()
+        
+        main_frame = ttk.Frame(batch_dialog, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(main_frame, text="以下主文件共用比对文件夹，每个对应文件只读取和提取一次，结果按主文件标注:").pack(anchor=tk.W, pady=(0, 5))
+        
+        # 主文件列表
+        list_frame = ttk.Frame(main_frame)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ("主文件", "工作表")
+        jobs_tree = ttk.Treeview(list_frame, columns=columns, show="headings", selectmode="browse")
+        for col, width in zip(columns, (500, 150)):
+            jobs_tree.heading(col, text=col)
+            jobs_tree.column(col, width=width, minwidth=50)
+        
+        v_scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=jobs_tree.yview)
+        jobs_tree.configure(yscrollcommand=v_scrollbar.set)
+        jobs_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        jobs = list(self.batch_jobs)
+        default_sheet = "(第一个工作表)"
+        
+        def refresh_jobs():
+            jobs_tree.delete(*jobs_tree.get_children())
+            for position, (master_path, sheet_name) in enumerate(jobs):
+                jobs_tree.insert("", tk.END, iid=str(position), values=(master_path, sheet_name or default_sheet))
+        
+        # 工作表选择
+        sheet_frame = ttk.Frame(main_frame)
+        sheet_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(sheet_frame, text="所选主文件的工作表:").pack(side=tk.LEFT)
+        sheet_var = tk.StringVar()
+        sheet_combo = ttk.Combobox(sheet_frame, textvariable=sheet_var, state="readonly", width=30)
+        sheet_combo.pack(side=tk.LEFT, padx=5)
+        
+        def selected_position():
+            selection = jobs_tree.selection()
+            return int(selection[0]) if selection else None
+        
+        def on_select(event=None):
+            position = selected_position()
+            if position is None:
+                return
+            master_path, sheet_name = jobs[position]
+            sheet_names = []
+            if master_path.lower().endswith(('.xlsx', '.xls')):
+                try:
+                    sheet_names = pd.ExcelFile(master_path).sheet_names
+                except Exception as e:
+                    print(f"读取工作表列表失败: {e}")
+            sheet_combo["values"] = [default_sheet] + sheet_names
+            sheet_var.set(sheet_name or default_sheet)
+        
+        def on_sheet_selected(event=None):
+            position = selected_position()
+            if position is None:
+                return
+            sheet_name = sheet_var.get()
+            jobs[position] = (jobs[position][0], None if sheet_name == default_sheet else sheet_name)
+            refresh_jobs()
+            jobs_tree.selection_set(str(position))
+        
+        jobs_tree.bind('<<TreeviewSelect>>', on_select)
+        sheet_combo.bind('<<ComboboxSelected>>', on_sheet_selected)
+        
+        def add_masters():
+            file_paths = filedialog.askopenfilenames(
+                parent=batch_dialog,
+                filetypes=[("Excel files", "*.xlsx *.xls"), ("CSV files", "*.csv"), ("All files", "*.*")]
+            )
+            for file_path in file_paths:
+                jobs.append((file_path, None))
+            refresh_jobs()
+        
+        def remove_master():
+            position = selected_position()
+            if position is not None:
+                del jobs[position]
+                refresh_jobs()
+        
+        def start_compare():
+            if not jobs:
+                messagebox.showwarning("警告", "请先添加主文件", parent=batch_dialog)
+                return
+            self.batch_jobs = list(jobs)
+            self.save_settings()
+            batch_dialog.destroy()
+            self.compare_files(self.batch_jobs)
+        
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(fill=tk.X, pady=5)
+        ttk.Button(button_frame, text="添加主文件...", command=add_masters).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="移除", command=remove_master).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="开始比对", command=start_compare).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="取消", command=batch_dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        
+        refresh_jobs()
+    
+    def compare_via_service(self, master_path, folder_path):
+        """把比对任务提交给本机比对服务并显示结果，服务未运行时返回False（改为在本程序中比对）"""
+        job = make_comparison_job(self.get_settings(), master_path, folder_path, self.master_sheet_name)
+        
+        def on_progress(message):
+            if message["type"] == "queued":
+                self.update_status(f"已提交到比对服务，排队位置: {message['position']}")
             else:
-                print("未找到满足规则的行")
-                return []
-                
-        except Exception as e:
-            print(f"提取特殊Part No时出错: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return []
+                self.update_status(message["message"])
+        
+        self.result_view.reset()
+        try:
+            message = submit_comparison_job(job, self.service_port, on_progress)
+        except RuntimeError as e:
+            messagebox.showerror("错误", f"比对服务执行任务时出错: {str(e)}")
+            self.update_status("就绪")
+            return True
+        except OSError as e:
+            print(f"无法连接比对服务，改为在本程序中比对: {str(e)}")
+            return False
+        
+        for result in message["results"]:
+            self.result_data.append(tuple(result))
+        self.result_view.refresh()
+        
+        summary = message["summary"]
+        text = f"比对完成!\n\n{format_summary(summary['counts'])}"
+        text += f"\n\n由比对服务执行，耗时 {summary['seconds']:.1f} 秒，{summary['reused_files']}/{summary['files']} 个文件使用了缓存的结果"
+        if summary.get("deferred_files"):
+            text += f"\n\n只比对模式: {summary['deferred_files']} 个文件有匹配行，未生成匹配文件，需要时点击\"生成匹配文件\""
+        if summary.get("ambiguous_files"):
+            text += f"\n\n{format_ambiguous_files(summary['ambiguous_files'])}"
+        messagebox.showinfo("完成", text)
+        self.update_status("比对完成")
+        return True
+    
+    def find_model_file(self, model, model_files):
+        """在比对文件列表中查找Model对应的文件，找不到时返回None"""
+        return find_model_file(model, model_files, self.exact_model_match.get())
+    
+    def append_row_results(self, index, model, master_part_no, file_result, label=""):
+        """根据对应文件的提取结果追加主表一行的比对结果，file_result为None表示没有对应文件，label为批量比对时的主文件标签"""
+        for result in build_row_results(index, model, master_part_no, file_result):
+            self.result_data.append(result + (label,))
+    
+    @staticmethod
+    def format_run_delta(previous_time, delta):
+        """与上次比对相比的变化摘要"""
+        counts = delta["变化"].value_counts()
+        return (f"与上次比对({time.strftime('%Y-%m-%d %H:%M', time.localtime(previous_time))})相比: "
+                f"新增 {counts.get('新增', 0)} 条，消失 {counts.get('消失', 0)} 条，比对结果变化 {counts.get('结果变化', 0)} 条")
+    
+    def show_run_delta(self):
+        """显示最近一次比对与上次比对相同主文件的结果相比的变化"""
+        if self.last_run_delta is None:
+            # 本次打开程序后还没有比对过，读取比对历史中当前主文件最近的两次结果
+            folder_path = self.folder_path.get()
+            master_path = self.master_file_path.get()
+            runs = []
+            if folder_path and master_path:
+                history_masters = [[os.path.abspath(master_path), self.master_sheet_name]]
+                runs = RunHistory(os.path.join(folder_path, "匹配文件")).load_runs(history_masters, count=2)
+            if len(runs) < 2:
+                messagebox.showinfo("提示", "没有可以对比的上次比对结果")
+                return
+            self.last_run_delta = (runs[1][0], RunHistory.delta(runs[1][1], runs[0][1]))
+        previous_time, delta = self.last_run_delta
+        
+        delta_dialog = tk.Toplevel(self.root)
+        delta_dialog.title("比对变化")
+        delta_dialog.geometry("900x450")
+        delta_dialog.transient(self.root)
+        
+        main_frame = ttk.Frame(delta_dialog, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        message = self.format_run_delta(previous_time, delta)
+        max_display_rows = 2000
+        if len(delta) > max_display_rows:
+            message += f"，只显示前 {max_display_rows} 条，完整结果请导出"
+        ttk.Label(main_frame, text=message).pack(anchor=tk.W, pady=(0, 5))
+        
+        result_frame = ttk.Frame(main_frame)
+        result_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = RunHistory.DELTA_COLUMNS
+        delta_tree = ttk.Treeview(result_frame, columns=columns, show="headings")
+        for col, width in zip(columns, (70, 150, 120, 160, 160, 80, 80)):
+            delta_tree.heading(col, text=col)
+            delta_tree.column(col, width=width, minwidth=50)
+        
+        v_scrollbar = ttk.Scrollbar(result_frame, orient=tk.VERTICAL, command=delta_tree.yview)
+        delta_tree.configure(yscrollcommand=v_scrollbar.set)
+        delta_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        for row in delta.head(max_display_rows).itertuples(index=False):
+            delta_tree.insert("", tk.END, values=tuple(row))
+        
+        def export_delta():
+            file_path = filedialog.asksaveasfilename(parent=delta_dialog, defaultextension=".xlsx",
+                                                     filetypes=[("Excel files", "*.xlsx")])
+            if not file_path:
+                return
+            try:
+                delta.to_excel(file_path, index=False)
+                messagebox.showinfo("成功", f"比对变化已导出至 {file_path}", parent=delta_dialog)
+            except Exception as e:
+                messagebox.showerror("错误", f"导出过程中发生错误: {str(e)}", parent=delta_dialog)
+        
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(fill=tk.X, pady=5)
+        ttk.Button(button_frame, text="导出", command=export_delta).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="关闭", command=delta_dialog.destroy).pack(side=tk.RIGHT, padx=5)
+    
+    @staticmethod
+    def format_parallel_report(report):
+        """并行处理的运行报告"""
+        text = (f"并行处理: {report['workers']} 个进程，耗时 {report['seconds']:.1f} 秒，"
+                f"平均使用 {report['cores_utilized']:.1f} 个核心，估算最大在途内存 {report['peak_in_flight_mb']:.0f} MB")
+        if report["peak_worker_memory_mb"] is not None:
+            text += f"，子进程峰值内存 {report['peak_worker_memory_mb']:.0f} MB"
+        return text
+    
+    def make_extractor(self):
+        """用当前设置创建文件提取器，与本次比对共用列名解析缓存、规则统计、匹配数据登记表、超时规则和匹配文件记录"""
+        return FileExtractor(
+            self.comparison_rules,
+            self.extract_columns,
+            self.extract_all_when_no_rules.get(),
+            self.regex_time_budget_seconds,
+            column_resolver=self.column_resolver,
+            rule_stats=self.rule_stats,
+            matched_registry=self.matched_registry,
+            timed_out_rules=self.timed_out_rules,
+            written_files=self.written_files,
+            write_matched_files=not self.compare_only.get(),
+            deferred_matches=self.deferred_matches,
+            all_sheets=self.all_sheets.get()
+        )
+    
+    def get_primary_extract_column(self):
+        """获取主键列配置，没有设置主键列时使用第一个启用的列"""
+        return FileExtractor.primary_extract_column(self.extract_columns)
+    
+    def find_primary_column(self, columns):
+        """在给定的列名中查找主键列，返回(主键列配置, 实际列名)"""
+        return FileExtractor.resolve_primary_column(self.extract_columns, self.column_resolver, columns)
     
     def export_results(self):
         if not self.result_data:
@@ -1369,15 +4440,42 @@ class ExcelComparator:
         if file_path:
             try:
                 # 创建DataFrame并导出
-                result_df = pd.DataFrame(
-                    self.result_data, 
-                    columns=["序号", "Model", "总文件Part No", "对应文件Part No", "比对结果"]
+                # 直接由列存储生成DataFrame，不逐行组装
+                result_df = self.result_data.to_dataframe(
+                    columns=["序号", "Model", "总文件Part No", "对应文件Part No", "比对结果", "主文件"]
                 )
                 result_df.to_excel(file_path, index=False)
                 messagebox.showinfo("成功", f"结果已导出至 {file_path}")
             except Exception as e:
                 messagebox.showerror("错误", f"导出过程中发生错误: {str(e)}")
     
+    def materialize_matched_files(self):
+        """生成只比对模式下暂不生成的匹配文件：按记录的匹配行位置从比对文件中取出匹配行写出"""
+        folder_path = self.folder_path.get()
+        if not folder_path:
+            messagebox.showerror("错误", "请先选择比对文件夹")
+            return
+        
+        deferred_store = DeferredMatchStore(os.path.join(folder_path, "匹配文件"))
+        deferred_store.load()
+        if not deferred_store.entries:
+            messagebox.showinfo("提示", "没有尚未生成的匹配文件")
+            return
+        
+        def progress(current, total, file_name):
+            self.update_status(f"正在生成匹配文件 {current}/{total}: {file_name}")
+        
+        written, stale, failed = deferred_store.materialize(self.read_file, progress)
+        deferred_store.save()
+        
+        message = f"已生成 {len(written)} 个匹配文件"
+        if stale:
+            message += f"\n\n{len(stale)} 个比对文件在比对之后已被修改，请重新比对:\n" + "\n".join(os.path.basename(file) for file in stale)
+        if failed:
+            message += f"\n\n{len(failed)} 个文件生成失败，详见控制台输出"
+        messagebox.showinfo("完成", message)
+        self.update_status("就绪")
+    
     def merge_matched_files(self):
         """合并所有匹配文件为一个单一文件"""
         folder_path = self.folder_path.get()
@@ -1389,15 +4487,35 @@ class ExcelComparator:
         if not os.path.exists(output_folder):
             messagebox.showinfo("提示", "匹配文件夹不存在，请先运行比对")
             return
+        
+        # 上次以只比对模式运行时，先生成匹配文件
+        deferred_store = DeferredMatchStore(output_folder)
+        deferred_store.load()
+        if deferred_store.entries and messagebox.askyesno(
+                "生成匹配文件", f"上次比对以只比对模式运行，有 {len(deferred_store.entries)} 个匹配文件尚未生成。\n\n是否先生成这些文件再合并？"):
+            self.materialize_matched_files()
+            deferred_store.load()
+        
+        # 仍未生成的匹配文件如果存在，是更早的完整比对留下的旧内容，不参与合并
+        deferred_outputs = {MatchedFrameRegistry.normalize_path(output_file) for output_file in deferred_store.entries}
             
         # 获取所有匹配文件
         matched_files = []
+        skipped_files = []
         for file in os.listdir(output_folder):
             if "_匹配" in file and file.lower().endswith(('.xlsx', '.xls', '.csv')):
-                matched_files.append(os.path.join(output_folder, file))
+                file_path = os.path.join(output_folder, file)
+                if MatchedFrameRegistry.normalize_path(file_path) in deferred_outputs:
+                    skipped_files.append(file)
+                else:
+                    matched_files.append(file_path)
+        skipped_note = ""
+        if skipped_files:
+            skipped_note = (f"\n\n以下 {len(skipped_files)} 个匹配文件尚未按最近一次比对生成，文件中是之前的旧内容，未合并:\n"
+                            + "\n".join(skipped_files))
                 
         if not matched_files:
-            messagebox.showinfo("提示", "未找到任何匹配文件")
+            messagebox.showinfo("提示", "未找到任何匹配文件" + skipped_note)
             return
         
         # 弹出对话框询问合并方式
@@ -1428,55 +4546,63 @@ class ExcelComparator:
             
         try:
             if merge_method:  # 合并为一张表
-                # 读取并合并所有文件
-                all_dfs = []
+                # 第一遍只读取元数据（列名），确定统一的列集合
+                readable_files = []
+                merged_columns = []
                 
                 for file_path in matched_files:
                     try:
-                        # 读取文件
-                        if file_path.lower().endswith(('.xlsx', '.xls')):
-                            df = pd.read_excel(file_path)
-                        else:  # CSV文件
-                            df = pd.read_csv(file_path, encoding='gb18030')
-                        
-                        # 添加来源文件名列
-                        file_name = os.path.basename(file_path)
-                        df['来源文件'] = file_name
-                        
-                        all_dfs.append(df)
+                        for col in self.matched_registry.load_columns(file_path):
+                            if col not in merged_columns:
+                                merged_columns.append(col)
+                        readable_files.append(file_path)
                     except Exception as e:
                         print(f"读取文件 {file_path} 时出错: {str(e)}")
                 
-                if not all_dfs:
+                if not readable_files:
                     messagebox.showerror("错误", "无法读取任何匹配文件")
                     return
-                    
-                # 合并所有DataFrame
-                merged_df = pd.concat(all_dfs, ignore_index=True)
-                
-                # 保存合并后的文件
-                if merged_file_path.lower().endswith('.xlsx'):
-                    merged_df.to_excel(merged_file_path, index=False)
-                else:  # CSV文件
-                    merged_df.to_csv(merged_file_path, encoding='gb18030', index=False)
-                    
-                messagebox.showinfo("成功", f"已成功合并 {len(all_dfs)} 个文件到单个表格!\n保存至: {merged_file_path}")
+                
+                # 按首次出现的顺序排列所有文件的列，最后添加来源文件列
+                if '来源文件' not in merged_columns:
+                    merged_columns.append('来源文件')
+                
+                # 第二遍逐个文件追加到输出。先读完一个文件的所有块再写出，读取中途出错的文件不会留下部分行，
+                # 同一时间内存中只保留一个文件的数据
+                writer = MergeOutputWriter(merged_file_path)
+                success_count = 0
+                try:
+                    writer.start_sheet("Sheet1", merged_columns)
+                    for i, file_path in enumerate(readable_files):
+                        file_name = os.path.basename(file_path)
+                        self.update_status(f"正在合并第 {i+1}/{len(readable_files)} 个文件: {file_name}")
+                        try:
+                            chunks = list(self.matched_registry.iter_chunks(file_path))
+                        except Exception as e:
+                            print(f"读取文件 {file_path} 时出错: {str(e)}")
+                            continue
+                        for chunk in chunks:
+                            chunk = chunk.reindex(columns=merged_columns)
+                            chunk['来源文件'] = file_name
+                            writer.append_frame(chunk)
+                        success_count += 1
+                finally:
+                    writer.close()
+                
+                self.update_status("就绪")
+                messagebox.showinfo("成功", f"已成功合并 {success_count} 个文件到单个表格!\n保存至: {merged_file_path}{skipped_note}")
             
             else:  # 每个文件作为单独的工作表
-                # 使用ExcelWriter将每个文件写入不同的工作表
-                with pd.ExcelWriter(merged_file_path, engine='openpyxl') as writer:
-                    success_count = 0
-                    
-                    for file_path in matched_files:
+                # 每次只处理一个文件，逐块写入独立工作表
+                writer = MergeOutputWriter(merged_file_path)
+                success_count = 0
+                used_sheet_names = set()
+                try:
+                    for i, file_path in enumerate(matched_files):
                         try:
-                            # 读取文件
-                            if file_path.lower().endswith(('.xlsx', '.xls')):
-                                df = pd.read_excel(file_path)
-                            else:  # CSV文件
-                                df = pd.read_csv(file_path, encoding='gb18030')
-                            
                             # 设置工作表名称 - 使用文件名但去掉扩展名和"_匹配"部分
                             file_name = os.path.basename(file_path)
+                            self.update_status(f"正在合并第 {i+1}/{len(matched_files)} 个文件: {file_name}")
                             sheet_name = os.path.splitext(file_name)[0]
                             if "_匹配" in sheet_name:
                                 sheet_name = sheet_name.replace("_匹配", "")
@@ -1488,22 +4614,32 @@ class ExcelComparator:
                             # 避免重复的工作表名
                             original_name = sheet_name
                             counter = 1
-                            while sheet_name in writer.sheets:
+                            while sheet_name in used_sheet_names:
                                 sheet_name = f"{original_name[:27]}_{counter}"
                                 counter += 1
                             
-                            # 写入到工作表
-                            df.to_excel(writer, sheet_name=sheet_name, index=False)
+                            # 读完所有块后再创建工作表，读取失败时不会留下空表或只有部分行的表
+                            chunks = list(self.matched_registry.iter_chunks(file_path))
+                            used_sheet_names.add(sheet_name)
+                            writer.start_sheet(sheet_name, list(chunks[0].columns))
+                            for chunk in chunks:
+                                writer.append_frame(chunk)
                             success_count += 1
                             
                         except Exception as e:
                             print(f"处理文件 {file_path} 时出错: {str(e)}")
-                    
+                finally:
                     if success_count == 0:
-                        messagebox.showerror("错误", "无法读取任何匹配文件")
-                        return
+                        writer.discard()
+                    else:
+                        writer.close()
                 
-                messagebox.showinfo("成功", f"已成功将 {success_count} 个文件合并为独立工作表!\n保存至: {merged_file_path}")
+                self.update_status("就绪")
+                if success_count == 0:
+                    messagebox.showerror("错误", "无法读取任何匹配文件")
+                    return
+                
+                messagebox.showinfo("成功", f"已成功将 {success_count} 个文件合并为独立工作表!\n保存至: {merged_file_path}{skipped_note}")
             
             # 询问是否打开合并后的文件
             if messagebox.askyesno("提示", "是否打开合并后的文件?"):
@@ -1514,6 +4650,289 @@ class ExcelComparator:
             error_details = traceback.format_exc()
             messagebox.showerror("错误", f"合并文件时发生错误: {str(e)}\n\n详细信息:\n{error_details}")
 
+    def run_fingerprint(self, masters, folder_path, model_files):
+        """比对输入和配置的指纹：各主文件及所选工作表和列、比对文件夹中各文件的签名以及规则和提取列配置，
+        masters为[(主文件路径, 工作表, Model列, Part No列)]"""
+        import hashlib
+        payload = {
+            "masters": [[os.path.abspath(master_path), MatchedFrameRegistry.file_signature(master_path),
+                         sheet_name, str(model_col), str(partno_col)]
+                        for master_path, sheet_name, model_col, partno_col in masters],
+            "folder": [os.path.abspath(folder_path),
+                       [[file, MatchedFrameRegistry.file_signature(os.path.join(folder_path, file))] for file in model_files]],
+            "rules": [rule.to_dict() for rule in self.comparison_rules],
+            "extract_columns": [column.to_dict() for column in self.extract_columns],
+            "exact_model_match": self.exact_model_match.get(),
+            "extract_all_when_no_rules": self.extract_all_when_no_rules.get(),
+            "compare_only": self.compare_only.get(),
+            "all_sheets": self.all_sheets.get()
+        }
+        text = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+    
+    def list_model_files(self, folder_path):
+        """列出比对文件夹中所有支持的文件（Excel和CSV），按设置包括子文件夹并按通配符过滤"""
+        return list_model_files(folder_path, self.recursive_scan.get(),
+                                self.folder_include_patterns, self.folder_exclude_patterns)
+    
+    def read_primary_values(self, file_path):
+        """读取文件主键列的所有值，返回(工作表, [(行号, Part No)])，行号与Excel中显示的行号一致"""
+        df = self.read_file(file_path)
+        _, primary_actual_col = self.find_primary_column(df.columns)
+        sheet_name = df.attrs.get("sheet_name")
+        if not primary_actual_col:
+            return sheet_name, []
+        
+        # 表头占一行，数据从表头的下一行开始
+        first_row = df.attrs.get("header_row", 0) + 2
+        values = df[primary_actual_col]
+        mask = values.notna().to_numpy()
+        positions = np.flatnonzero(mask)
+        return sheet_name, list(zip((positions + first_row).tolist(), values[mask].tolist()))
+    
+    def get_partno_index(self, folder_path):
+        """获取比对文件夹对应的Part No索引（首次使用时从磁盘加载）"""
+        key = os.path.normcase(os.path.abspath(folder_path))
+        if key not in self.partno_indexes:
+            index_path = os.path.join(local_cache_folder(os.path.join(folder_path, "匹配文件")), "partno_index.pkl")
+            index = PartNoIndex(index_path)
+            index.load()
+            self.partno_indexes[key] = index
+        return self.partno_indexes[key]
+    
+    def update_partno_index(self, folder_path=None, progress=None):
+        """增量更新比对文件夹的Part No索引，返回(索引对象, 更新文件数, 删除文件数, 出错文件列表)"""
+        folder_path = folder_path or self.folder_path.get()
+        primary_column = self.get_primary_extract_column()
+        if not primary_column:
+            raise ValueError("没有找到可用的主键列配置")
+        
+        index = self.get_partno_index(folder_path)
+        config_key = (primary_column.name, tuple(primary_column.search_names))
+        updated, removed, failed = index.update(folder_path, self.list_model_files(folder_path),
+                                                self.read_primary_values, config_key, progress)
+        return index, updated, removed, failed
+    
+    def query_partno(self, part_no, folder_path=None, refresh=False):
+        """查询Part No出现在比对文件夹的哪些文件中，返回[(文件名, 工作表, 行号)]。
+        默认直接查询已有的索引；refresh为True时先增量更新索引（需要检查文件夹中每个文件的签名）"""
+        folder_path = folder_path or self.folder_path.get()
+        if refresh:
+            index = self.update_partno_index(folder_path)[0]
+        else:
+            index = self.get_partno_index(folder_path)
+        return index.query(part_no)
+    
+    def show_partno_lookup(self):
+        """打开Part No反查对话框"""
+        folder_path = self.folder_path.get()
+        if not folder_path or not os.path.isdir(folder_path):
+            messagebox.showerror("错误", "请先选择比对文件夹")
+            return
+        
+        lookup_dialog = tk.Toplevel(self.root)
+        lookup_dialog.title("Part No反查")
+        lookup_dialog.geometry("700x450")
+        lookup_dialog.transient(self.root)
+        
+        main_frame = ttk.Frame(lookup_dialog, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # 查询输入区域
+        query_frame = ttk.Frame(main_frame)
+        query_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        ttk.Label(query_frame, text="Part No:").pack(side=tk.LEFT)
+        part_no_var = tk.StringVar()
+        part_no_entry = ttk.Entry(query_frame, textvariable=part_no_var, width=30)
+        part_no_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        
+        status_var = tk.StringVar(value="")
+        
+        # 结果表格
+        result_frame = ttk.Frame(main_frame)
+        result_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ("文件", "工作表", "行号")
+        lookup_tree = ttk.Treeview(result_frame, columns=columns, show="headings")
+        for col, width in zip(columns, (400, 150, 80)):
+            lookup_tree.heading(col, text=col)
+            lookup_tree.column(col, width=width, minwidth=50)
+        
+        v_scrollbar = ttk.Scrollbar(result_frame, orient=tk.VERTICAL, command=lookup_tree.yview)
+        lookup_tree.configure(yscrollcommand=v_scrollbar.set)
+        lookup_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        ttk.Label(main_frame, textvariable=status_var).pack(anchor=tk.W, pady=5)
+        
+        def refresh_index():
+            """增量更新索引，只重新读取有变化的文件"""
+            def progress(current, total, file_name):
+                status_var.set(f"正在建立索引 {current}/{total}: {file_name}")
+                lookup_dialog.update_idletasks()
+            
+            try:
+                index, updated, removed, failed = self.update_partno_index(folder_path, progress)
+            except Exception as e:
+                messagebox.showerror("错误", f"更新索引失败: {str(e)}", parent=lookup_dialog)
+                return
+            message = f"索引已更新: {len(index.files)} 个文件, {len(index.postings)} 个Part No (本次更新 {updated} 个, 删除 {removed} 个)"
+            if failed:
+                message += f", {len(failed)} 个文件读取失败"
+            status_var.set(message)
+        
+        def do_query(event=None):
+            """在索引中查询Part No"""
+            part_no = part_no_var.get().strip()
+            if not part_no:
+                return
+            lookup_tree.delete(*lookup_tree.get_children())
+            locations = self.get_partno_index(folder_path).query(part_no)
+            for location in locations:
+                lookup_tree.insert("", tk.END, values=tuple("" if v is None else v for v in location))
+            status_var.set(f"找到 {len(locations)} 处")
+        
+        ttk.Button(query_frame, text="查询", command=do_query).pack(side=tk.LEFT, padx=5)
+        ttk.Button(query_frame, text="更新索引", command=refresh_index).pack(side=tk.LEFT, padx=5)
+        part_no_entry.bind('<Return>', do_query)
+        
+        ttk.Button(main_frame, text="关闭", command=lookup_dialog.destroy).pack(pady=5)
+        
+        # 打开对话框时先增量更新索引
+        lookup_dialog.update_idletasks()
+        refresh_index()
+        part_no_entry.focus_set()
+    
+    def diff_workbooks(self, old_path, new_path):
+        """比较同一文件的两个版本，以主键列对应两个版本中的行，返回diff_frames的结果"""
+        old_df = self.read_file(old_path)
+        new_df = self.read_file(new_path)
+        _, old_key = self.find_primary_column(old_df.columns)
+        _, new_key = self.find_primary_column(new_df.columns)
+        if not old_key or not new_key:
+            raise ValueError("两个文件中都需要有主键列，请检查提取列配置")
+        return diff_frames(old_df, new_df, old_key, new_key)
+    
+    def show_workbook_diff(self):
+        """打开版本比对对话框：比较同一文件的旧版本和新版本，列出新增、删除和修改的行"""
+        diff_dialog = tk.Toplevel(self.root)
+        diff_dialog.title("版本比对")
+        diff_dialog.geometry("800x500")
+        diff_dialog.transient(self.root)
+        
+        main_frame = ttk.Frame(diff_dialog, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # 文件选择区域
+        path_vars = {}
+        for label, key in (("旧版本:", "old"), ("新版本:", "new")):
+            path_frame = ttk.Frame(main_frame)
+            path_frame.pack(fill=tk.X, pady=2)
+            ttk.Label(path_frame, text=label, width=8).pack(side=tk.LEFT)
+            path_vars[key] = tk.StringVar()
+            ttk.Entry(path_frame, textvariable=path_vars[key]).pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+            
+            def browse(var=path_vars[key]):
+                file_path = filedialog.askopenfilename(
+                    parent=diff_dialog,
+                    filetypes=[("Excel files", "*.xlsx *.xls"), ("CSV files", "*.csv"), ("All files", "*.*")]
+                )
+                if file_path:
+                    var.set(file_path)
+            
+            ttk.Button(path_frame, text="浏览...", command=browse).pack(side=tk.LEFT)
+        
+        status_var = tk.StringVar(value="")
+        
+        # 差异表格，行数很多时只显示前面的部分，完整结果可导出
+        result_frame = ttk.Frame(main_frame)
+        result_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+        
+        columns = ("类型", "主键", "列", "旧值", "新值")
+        diff_tree = ttk.Treeview(result_frame, columns=columns, show="headings")
+        for col, width in zip(columns, (60, 200, 150, 180, 180)):
+            diff_tree.heading(col, text=col)
+            diff_tree.column(col, width=width, minwidth=50)
+        
+        v_scrollbar = ttk.Scrollbar(result_frame, orient=tk.VERTICAL, command=diff_tree.yview)
+        diff_tree.configure(yscrollcommand=v_scrollbar.set)
+        diff_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        ttk.Label(main_frame, textvariable=status_var, wraplength=760, justify=tk.LEFT).pack(anchor=tk.W, pady=5)
+        
+        max_display_rows = 2000
+        current = {"diff": None}
+        
+        def display_value(value):
+            return "" if value is None or (isinstance(value, float) and np.isnan(value)) else value
+        
+        def run_diff():
+            old_path, new_path = path_vars["old"].get(), path_vars["new"].get()
+            if not old_path or not new_path:
+                messagebox.showerror("错误", "请选择旧版本和新版本文件", parent=diff_dialog)
+                return
+            status_var.set("正在比较...")
+            diff_dialog.update_idletasks()
+            try:
+                start = time.perf_counter()
+                diff = self.diff_workbooks(old_path, new_path)
+                seconds = time.perf_counter() - start
+            except Exception as e:
+                status_var.set("")
+                messagebox.showerror("错误", f"版本比对失败: {str(e)}", parent=diff_dialog)
+                return
+            current["diff"] = diff
+            
+            diff_tree.delete(*diff_tree.get_children())
+            shown = 0
+            old_key, new_key = diff["key_columns"]
+            for kind, rows, key_column in (("新增", diff["added"], new_key), ("删除", diff["removed"], old_key)):
+                for key in rows[key_column].iloc[:max_display_rows - shown]:
+                    diff_tree.insert("", tk.END, values=(kind, display_value(key), "", "", ""))
+                    shown += 1
+            for key, column, old_value, new_value in diff["changed"].head(max_display_rows - shown).itertuples(index=False):
+                diff_tree.insert("", tk.END, values=("修改", display_value(key), column,
+                                                     display_value(old_value), display_value(new_value)))
+                shown += 1
+            
+            message = (f"新增 {len(diff['added'])} 行，删除 {len(diff['removed'])} 行，"
+                       f"修改 {diff['changed_rows']} 行"
+                       f"（{len(diff['changed'])} 个单元格），未变化 {diff['unchanged']} 行，耗时 {seconds:.1f} 秒")
+            if diff["added_columns"]:
+                message += f"\n新增列: {', '.join(diff['added_columns'])}"
+            if diff["removed_columns"]:
+                message += f"\n删除列: {', '.join(diff['removed_columns'])}"
+            total = len(diff["added"]) + len(diff["removed"]) + len(diff["changed"])
+            if total > shown:
+                message += f"\n只显示前 {shown} 条差异，完整结果请导出"
+            status_var.set(message)
+        
+        def export_diff():
+            diff = current["diff"]
+            if diff is None:
+                messagebox.showinfo("提示", "请先进行比较", parent=diff_dialog)
+                return
+            file_path = filedialog.asksaveasfilename(parent=diff_dialog, defaultextension=".xlsx",
+                                                     filetypes=[("Excel files", "*.xlsx")])
+            if not file_path:
+                return
+            try:
+                with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
+                    diff["added"].to_excel(writer, sheet_name="新增", index=False)
+                    diff["removed"].to_excel(writer, sheet_name="删除", index=False)
+                    diff["changed"].to_excel(writer, sheet_name="修改", index=False)
+                messagebox.showinfo("成功", f"差异已导出至 {file_path}", parent=diff_dialog)
+            except Exception as e:
+                messagebox.showerror("错误", f"导出过程中发生错误: {str(e)}", parent=diff_dialog)
+        
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(fill=tk.X)
+        ttk.Button(button_frame, text="比较", command=run_diff).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="导出差异", command=export_diff).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="关闭", command=diff_dialog.destroy).pack(side=tk.RIGHT, padx=5)
+    
     def update_status(self, message):
         """更新状态栏消息"""
         self.status_var.set(message)
@@ -1655,9 +5074,11 @@ class ExcelComparator:
 7. 处理比对结果
 --------------------------
 • 查看结果表格，了解每一行的匹配情况
+• 使用表格上方的过滤栏按比对结果、Model或Part No筛选结果，点击列标题排序
 • 点击"导出结果"可将表格内容导出为Excel文件
 • 浏览"匹配文件"文件夹查看自动生成的匹配文件
 • 使用"合并匹配文件"功能整合匹配结果
+• 使用"Part No反查"功能查询某个Part No出现在哪些文件中(按主键列建立索引，文件变化时自动增量更新)
 
 四、高级功能详解
 ===============================
@@ -2196,9 +5617,11 @@ class ExcelComparator:
         columns_dialog.focus_set()
         columns_dialog.wait_window()
 
-    def preview_file(self):
-        """预览主文件的内容"""
-        file_path = self.master_file_path.get()
+    def preview_file(self, file_path=None):
+        """预览文件的内容（默认为主文件），只读取需要显示的前若干行"""
+        is_master = file_path is None
+        if is_master:
+            file_path = self.master_file_path.get()
         if not file_path:
             messagebox.showwarning("警告", "请先选择Excel文件")
             return
@@ -2208,23 +5631,33 @@ class ExcelComparator:
             messagebox.showerror("错误", f"找不到文件: {file_path}")
             return
         
+        preview_rows = 100  # 预览显示的行数
+        
         try:
-            # 读取文件
-            if file_path.lower().endswith(('.xlsx', '.xls','.csv')):
-                # Excel文件
-                if self.master_sheet_name:
-                    df = pd.read_excel(file_path, sheet_name=self.master_sheet_name)
-                else:
-                    df = pd.read_excel(file_path)
-            else:
-                # CSV文件
-                try:
-                    df = pd.read_csv(file_path, encoding='utf-8')
-                except:
+            # 只读取预览需要的行，大文件也能立即打开
+            if file_path.lower().endswith(('.xlsx', '.xls')):
+                # Excel文件，主文件使用已选择的工作表，其他文件使用第一个工作表
+                sheet_name = self.master_sheet_name if is_master and self.master_sheet_name else 0
+                df = pd.read_excel(file_path, sheet_name=sheet_name, nrows=preview_rows)
+            elif file_path.lower().endswith('.csv'):
+                # CSV文件，依次尝试常用编码
+                df = None
+                for encoding in ['utf-8', 'gbk', 'gb18030']:
                     try:
-                        df = pd.read_csv(file_path, encoding='gbk')
-                    except:
-                        df = pd.read_csv(file_path, encoding='gb18030')
+                        df = pd.read_csv(file_path, encoding=encoding, nrows=preview_rows)
+                        break
+                    except UnicodeDecodeError:
+                        continue
+                if df is None:
+                    df = pd.read_csv(file_path, encoding='latin1', nrows=preview_rows)
+            else:
+                messagebox.showerror("错误", f"不支持的文件类型: {file_path}")
+                return
+            
+            # 统一转换为显示文本，并按列向量化计算最长文本长度
+            cols = list(df.columns)
+            text_df = df.astype(object).apply(lambda column: column.map(str))
+            max_lengths = text_df.apply(lambda column: column.str.len().max()) if len(text_df) else {}
         
             # 创建预览对话框
             preview_dialog = tk.Toplevel(self.root)
@@ -2236,7 +5669,7 @@ class ExcelComparator:
             main_frame.pack(fill=tk.BOTH, expand=True)
             
             # 显示前100行数据
-            ttk.Label(main_frame, text=f"显示前 {min(100, len(df))} 行数据:").pack(anchor=tk.W, pady=(0, 5))
+            ttk.Label(main_frame, text=f"显示前 {len(df)} 行数据:").pack(anchor=tk.W, pady=(0, 5))
             
             # 创建表格展示数据
             preview_frame = ttk.Frame(main_frame)
@@ -2249,9 +5682,9 @@ class ExcelComparator:
             h_scrollbar = ttk.Scrollbar(preview_frame, orient=tk.HORIZONTAL)
             h_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
             
-            # 创建Treeview
-            cols = list(df.columns)
-            preview_tree = ttk.Treeview(preview_frame, columns=cols, show="headings",
+            # 创建Treeview，使用列位置作为内部列标识，避免重复或非文本列名出错
+            column_ids = [f"#{i}" for i in range(len(cols))]
+            preview_tree = ttk.Treeview(preview_frame, columns=column_ids, show="headings",
                                        yscrollcommand=v_scrollbar.set,
                                        xscrollcommand=h_scrollbar.set)
             
@@ -2259,19 +5692,16 @@ class ExcelComparator:
             h_scrollbar.config(command=preview_tree.xview)
             
             # 设置列标题和宽度
-            for col in cols:
-                preview_tree.heading(col, text=str(col))
+            for i, col in enumerate(cols):
+                preview_tree.heading(column_ids[i], text=str(col))
                 # 设置适当的列宽
                 max_width = len(str(col)) * 30
-                for i in range(min(100, len(df))):
-                    val = str(df.iloc[i][col])
-                    width = len(val) * 10
-                    max_width = max(max_width, min(width, 300))
-                preview_tree.column(col, width=max_width)
+                if len(text_df):
+                    max_width = max(max_width, min(int(max_lengths.iloc[i]) * 10, 300))
+                preview_tree.column(column_ids[i], width=max_width)
             
             # 添加数据行
-            for i in range(min(100, len(df))):
-                values = [str(df.iloc[i][col]) for col in cols]
+            for values in text_df.values.tolist():
                 preview_tree.insert("", tk.END, values=values)
             
             preview_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -2291,11 +5721,78 @@ class ExcelComparator:
             messagebox.showerror("错误", f"预览文件失败: {str(e)}")
             import traceback
             traceback.print_exc()
+    
+    def preview_folder_file(self):
+        """选择比对文件夹中的任意文件进行预览"""
+        folder_path = self.folder_path.get()
+        if not folder_path:
+            messagebox.showwarning("警告", "请先选择比对文件夹")
+            return
+        
+        file_types = [("所有支持的文件", "*.xlsx *.xls *.csv"), 
+                      ("Excel文件", "*.xlsx *.xls"), 
+                      ("CSV文件", "*.csv")]
+        file_path = filedialog.askopenfilename(title="选择要预览的文件", filetypes=file_types,
+                                               initialdir=folder_path)
+        if file_path:
+            self.preview_file(file_path)
 
 if __name__ == "__main__":
+    # 打包后的程序启动子进程时需要此调用，否则子进程会再次打开主窗口
+    import multiprocessing
+    multiprocessing.freeze_support()
+    
+    import argparse
+    parser = argparse.ArgumentParser(description="Excel文件比对工具")
+    parser.add_argument("--startup-time", action="store_true", help="显示窗口后输出启动耗时并退出")
+    parser.add_argument("--serve", action="store_true", help="以本机比对服务模式运行（不显示界面）")
+    parser.add_argument("--submit", nargs=2, metavar=("MASTER", "FOLDER"), help="向比对服务提交任务，使用config.json中的规则")
+    parser.add_argument("--sheet", help="--submit时主文件的工作表")
+    parser.add_argument("--output", help="--submit时把比对结果保存为Excel文件")
+    parser.add_argument("--port", type=int, default=ComparisonService.DEFAULT_PORT, help="比对服务端口")
+    args, _ = parser.parse_known_args()
+    
+    if args.serve or args.submit:
+        settings = {}
+        if os.path.exists(get_config_path()):
+            with open(get_config_path(), 'r', encoding='utf-8') as f:
+                settings = json.load(f)
+        
+        if args.serve:
+            # 服务模式：已解析文件缓存的内存预算默认为2048MB
+            ComparisonService(args.port, settings.get("service_cache_mb", 2048)).serve_forever()
+        else:
+            # 命令行客户端：输出进度，完成后输出摘要
+            job = make_comparison_job(settings, args.submit[0], args.submit[1], args.sheet)
+            try:
+                message = submit_comparison_job(job, args.port, lambda m: print(m.get("message") or f"排队位置: {m['position']}"))
+            except (OSError, RuntimeError) as e:
+                print(f"比对失败: {str(e)}")
+                sys.exit(1)
+            print(format_summary(message["summary"]["counts"]))
+            if args.output:
+                store = ResultStore()
+                for result in message["results"]:
+                    store.append(tuple(result))
+                store.to_dataframe().to_excel(args.output, index=False)
+                print(f"结果已保存至 {args.output}")
+        sys.exit(0)
+    
+    # 启动耗时测量模式：显示窗口后输出耗时，等待后台预加载完成后退出
+    measure_startup = args.startup_time
+    
     root = tk.Tk()
     app = ExcelComparator(root)
     
+    if measure_startup:
+        root.update()  # 强制完成首次绘制
+        print(f"启动耗时（到首个窗口显示）: {time.perf_counter() - STARTUP_TIME:.3f} 秒")
+        app.preload_modules()
+        app.preload_thread.join()
+        print(f"后台预加载模块耗时: {app.preload_seconds:.3f} 秒")
+        root.destroy()
+        sys.exit(0)
+    
     # 在程序关闭时保存设置
     def on_closing():
         app.save_settings()
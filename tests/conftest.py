@@ -0,0 +1,28 @@
+import importlib.util
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app_module():
+    """按路径加载主程序模块（test.py与标准库的test包同名，不能直接import）"""
+    spec = importlib.util.spec_from_file_location("excel_comparison_tool", os.path.join(ROOT, "test.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def app():
+    return load_app_module()
+
+
+@pytest.fixture(autouse=True)
+def local_cache(tmp_path, monkeypatch):
+    """把本地缓存文件夹指向临时目录，测试不会读写用户自己的缓存"""
+    cache = tmp_path / "local-cache"
+    monkeypatch.setenv("LOCALAPPDATA", str(cache))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache))
+    return cache
@@ -0,0 +1,48 @@
+import zipfile
+
+import pytest
+
+
+@pytest.fixture
+def bundle(tmp_path):
+    path = tmp_path / "Supplier.ZIP"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("bom/M100.csv", "Part No\nP1\n")
+        archive.writestr("__MACOSX/bom/._M100.csv", "")
+        archive.writestr("readme.txt", "")
+    return path
+
+
+def test_split_path_finds_archive_and_member(app, bundle):
+    assert app.ArchiveFolder.split_path(f"{bundle}/bom/M100.csv") == (str(bundle).replace("\\", "/"), "bom/M100.csv")
+
+
+def test_split_path_accepts_backslashes(app, bundle):
+    archive_path, member = app.ArchiveFolder.split_path(str(bundle) + "\\bom\\M100.csv")
+    assert member == "bom/M100.csv"
+    assert archive_path.lower().endswith("supplier.zip")
+
+
+def test_split_path_ignores_plain_files_and_folders_named_like_zips(app, tmp_path):
+    folder = tmp_path / "old.zip"
+    folder.mkdir()
+    (folder / "M1.xlsx").write_bytes(b"")
+
+    assert app.ArchiveFolder.split_path(str(tmp_path / "M1.xlsx")) is None
+    assert app.ArchiveFolder.split_path(str(folder / "M1.xlsx")) is None
+
+
+def test_list_files_and_read_member(app, bundle):
+    assert app.ArchiveFolder.list_files(str(bundle), (".csv", ".xlsx")) == ["bom/M100.csv"]
+    assert app.ArchiveFolder.read(f"{bundle}/bom/M100.csv") == b"Part No\nP1\n"
+    with pytest.raises(FileNotFoundError):
+        app.ArchiveFolder.read(f"{bundle}/bom/missing.csv")
+
+
+def test_forget_inherited_keeps_handles_open(app, bundle):
+    archive, _ = app.ArchiveFolder.open_archive(str(bundle))
+    app.ArchiveFolder.forget_inherited()
+
+    assert app.ArchiveFolder.archives == {}
+    assert archive.fp is not None  # 继承的句柄没有被关闭
+    assert app.ArchiveFolder.read(f"{bundle}/bom/M100.csv") == b"Part No\nP1\n"
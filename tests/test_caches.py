@@ -0,0 +1,145 @@
+import os
+
+import pandas as pd
+
+
+def write_output(app, tmp_path, df, registry):
+    output_folder = tmp_path / "匹配文件"
+    output_folder.mkdir(exist_ok=True)
+    output_file = str(output_folder / "M1_匹配.csv")
+    app.FileExtractor.write_matched_file(df, output_file, registry)
+    return output_file
+
+
+def test_sidecar_is_written_to_local_cache_and_reused(app, tmp_path, local_cache):
+    df = pd.DataFrame({"Part No": ["P1", "P2"], "Qty": [1, 2]})
+    registry = app.MatchedFrameRegistry(0)  # 不在内存中保留，只能从缓存文件读取
+    output_file = write_output(app, tmp_path, df, registry)
+
+    sidecar = registry.sidecar_path(output_file)
+    assert sidecar.startswith(str(local_cache))
+    assert not (tmp_path / "匹配文件" / ".cache").exists()
+    meta = registry.read_sidecar_meta(output_file, registry.file_signature(output_file))
+    assert meta["columns"] == ["Part No", "Qty"]
+    pd.testing.assert_frame_equal(pd.concat(registry.iter_chunks(output_file)), df)
+
+
+def test_sidecar_ignored_after_output_is_modified_or_version_changes(app, tmp_path, monkeypatch):
+    df = pd.DataFrame({"Part No": ["P1"], "Qty": [1]})
+    registry = app.MatchedFrameRegistry(0)
+    output_file = write_output(app, tmp_path, df, registry)
+    signature = registry.file_signature(output_file)
+
+    monkeypatch.setattr(app.MatchedFrameRegistry, "SIDECAR_VERSION", app.MatchedFrameRegistry.SIDECAR_VERSION + 1)
+    assert registry.read_sidecar_meta(output_file, signature) is None
+    monkeypatch.undo()
+
+    with open(output_file, "a", encoding="gb18030") as f:
+        f.write("P2,2\n")
+    assert registry.read_sidecar_meta(output_file, registry.file_signature(output_file)) is None
+    assert pd.concat(registry.iter_chunks(output_file))["Part No"].tolist() == ["P1", "P2"]
+
+
+def test_registry_tracks_memory_total(app, tmp_path):
+    registry = app.MatchedFrameRegistry(512)
+    output_folder = tmp_path / "匹配文件"
+    output_folder.mkdir()
+    for i in range(3):
+        output_file = str(output_folder / f"M{i}_匹配.csv")
+        app.FileExtractor.write_matched_file(pd.DataFrame({"Part No": [f"P{i}"] * (i + 1)}), output_file, registry)
+    assert registry.memory_usage() == sum(registry.frame_sizes.values())
+
+    registry.memory_budget_mb = 0
+    registry.enforce_budget()
+    assert registry.memory_usage() == 0 and not registry.frames
+
+
+def test_checkpoint_requires_matching_fingerprint(app, tmp_path):
+    output_folder = str(tmp_path / "匹配文件")
+    checkpoint = app.ComparisonCheckpoint(output_folder)
+    checkpoint.save({"fingerprint": "abc", "written_files": [], "completed": 3})
+
+    assert app.ComparisonCheckpoint(output_folder).load("abc")["completed"] == 3
+    assert app.ComparisonCheckpoint(output_folder).load("other") is None
+
+
+def test_checkpoint_ignored_when_written_file_is_missing(app, tmp_path):
+    output_folder = str(tmp_path / "匹配文件")
+    checkpoint = app.ComparisonCheckpoint(output_folder)
+    checkpoint.save({"fingerprint": "abc", "written_files": [os.path.join(output_folder, "gone_匹配.xlsx")]})
+
+    assert checkpoint.load("abc") is None
+
+
+def test_deferred_matches_materialize_rows_by_position(app, tmp_path):
+    source = tmp_path / "M1.csv"
+    pd.DataFrame({"Part No": ["P1", "P2", "P3"], "Qty": [1, 2, 3]}).to_csv(source, index=False, encoding="gb18030")
+    output_folder = str(tmp_path / "匹配文件")
+    os.makedirs(output_folder)
+    output_file = app.FileExtractor.get_output_file(str(source), output_folder)
+
+    store = app.DeferredMatchStore(output_folder)
+    store.entries[output_file] = (str(source), app.MatchedFrameRegistry.file_signature(str(source)), [0, 2], False)
+    store.save()
+    store = app.DeferredMatchStore(output_folder)
+    store.load()
+    written, stale, failed = store.materialize(app.FileExtractor.read_file)
+
+    assert (written, stale, failed) == ([output_file], [], [])
+    assert pd.read_csv(output_file, encoding="gb18030")["Part No"].tolist() == ["P1", "P3"]
+    assert store.entries == {}
+
+
+def test_deferred_matches_skip_modified_sources(app, tmp_path):
+    source = tmp_path / "M1.csv"
+    pd.DataFrame({"Part No": ["P1"]}).to_csv(source, index=False)
+    output_folder = str(tmp_path / "匹配文件")
+    output_file = app.FileExtractor.get_output_file(str(source), output_folder)
+    store = app.DeferredMatchStore(output_folder)
+    store.entries[output_file] = (str(source), (0, 0), [0], False)
+
+    assert store.materialize(app.FileExtractor.read_file) == ([], [output_file], [])
+    assert not os.path.exists(output_file)
+
+
+def test_unchanged_output_is_not_rewritten(app, tmp_path):
+    df = pd.DataFrame({"Part No": ["P1"], "Qty": [1]})
+    registry = app.MatchedFrameRegistry(0)
+    output_file = write_output(app, tmp_path, df, registry)
+
+    assert app.FileExtractor.write_matched_file(df.copy(), output_file, registry) is False
+    assert app.FileExtractor.write_matched_file(df.assign(Qty=[2]), output_file, registry) is True
+
+
+def make_store(app, rows):
+    store = app.ResultStore()
+    for sequence, row in enumerate(rows, 1):
+        store.append((sequence,) + row)
+    return store
+
+
+def test_run_history_delta_reports_added_removed_and_changed(app):
+    previous = make_store(app, [("M1", "P1", "P1", "匹配"), ("M1", "P1", "P1", "匹配"), ("M2", "P2", "P2", "匹配"),
+                                ("M3", "P3", "", "不匹配")])
+    current = make_store(app, [("M1", "P1", "P1", "匹配"), ("M2", "P2", "P2", "不匹配"), ("M4", "P4", "P4", "匹配"),
+                               ("M3", "P3", "", "不匹配")])
+
+    delta = app.RunHistory.delta(previous, current)
+
+    # 同一个键出现两次时按出现顺序对应，少了的一次记为消失
+    assert sorted(map(tuple, delta[["变化", "Model", "上次结果", "本次结果"]].values.tolist())) == [
+        ("新增", "M4", "", "匹配"), ("消失", "M1", "匹配", ""), ("结果变化", "M2", "匹配", "不匹配")]
+
+
+def test_run_history_keeps_recent_runs_per_master(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(app.RunHistory, "MAX_RUNS", 2)
+    history = app.RunHistory(str(tmp_path / "匹配文件"))
+    for model in ["M1", "M2", "M3"]:
+        history.save(make_store(app, [(model, "P", "P", "匹配")]), [["master.xlsx", None]])
+    history.save(make_store(app, [("X", "P", "P", "匹配")]), [["other.xlsx", None]])
+
+    runs = history.load_runs([["master.xlsx", None]], count=5)
+
+    assert len(history.list_runs()) == 2
+    assert [store.to_dataframe()["Model"].tolist() for _, store in runs] == [["M3"]]
+    assert not (tmp_path / "匹配文件").exists()
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+
+def test_added_removed_and_changed_rows(app):
+    old = pd.DataFrame({"Part No": ["A", "B", "C"], "Qty": [1, 2, 3], "Desc": ["x", "y", "z"]})
+    new = pd.DataFrame({"Part No": ["A", "C", "D"], "Qty": [1, 5, 4], "Desc": ["x", "z", "w"]})
+
+    diff = app.diff_frames(old, new, "Part No", "Part No")
+
+    assert diff["added"]["Part No"].tolist() == ["D"]
+    assert diff["removed"]["Part No"].tolist() == ["B"]
+    assert diff["changed"].values.tolist() == [["C", "Qty", 3, 5]]
+    assert diff["changed_rows"] == 1
+    assert diff["unchanged"] == 1
+
+
+def test_mixed_value_dtypes_only_report_real_changes(app):
+    """一个版本中数值列混入文本时，未变化的数值不算修改"""
+    old = pd.DataFrame({"Part No": ["A", "B", "C"], "Qty": [1, 2, 3]})
+    new = pd.DataFrame({"Part No": ["A", "B", "C"], "Qty": [1, 2, "N/A"]})
+
+    diff = app.diff_frames(old, new, "Part No", "Part No")
+
+    assert diff["changed"].values.tolist() == [["C", "Qty", 3, "N/A"]]
+    assert diff["changed_rows"] == 1
+    assert diff["unchanged"] == 2
+
+
+def test_numeric_key_matches_text_key(app):
+    """数值主键与文本中的相同数字视为同一行"""
+    old = pd.DataFrame({"Part No": [101, 102, 103], "Qty": [1, 2, 3]})
+    new = pd.DataFrame({"Part No": [101, 102, "X104"], "Qty": [1, 2, 3]})
+
+    diff = app.diff_frames(old, new, "Part No", "Part No")
+
+    assert diff["added"]["Part No"].tolist() == ["X104"]
+    assert diff["removed"]["Part No"].tolist() == [103]
+    assert diff["changed_rows"] == 0
+    assert diff["unchanged"] == 2
+
+
+def test_integral_floats_with_blanks_equal_integers(app):
+    """整数列含空值时读取为浮点数，与另一版本的整数列比较时不算修改"""
+    old = pd.DataFrame({"Part No": [1.0, 2.0, np.nan], "Qty": [1.0, np.nan, 3.0]})
+    new = pd.DataFrame({"Part No": ["1", "2", None], "Qty": [1, None, 3]})
+
+    diff = app.diff_frames(old, new, "Part No", "Part No")
+
+    assert diff["changed_rows"] == 0
+    assert diff["unchanged"] == 3
+
+
+def test_duplicate_keys_are_matched_in_order(app):
+    old = pd.DataFrame({"Part No": ["A", "A", "B"], "Qty": [1, 2, 3]})
+    new = pd.DataFrame({"Part No": ["A", "A", "B"], "Qty": [1, 9, 3]})
+
+    diff = app.diff_frames(old, new, "Part No", "Part No")
+
+    assert diff["changed"].values.tolist() == [["A", "Qty", 2, 9]]
+    assert diff["added"].empty and diff["removed"].empty
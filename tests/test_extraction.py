@@ -0,0 +1,155 @@
+import os
+
+import pandas as pd
+import pytest
+
+
+def make_extractor(app, rules, **kwargs):
+    extract_columns = [app.ExtractColumn("Part No", ["Part No"], is_primary=True)]
+    return app.FileExtractor(rules, extract_columns, **kwargs)
+
+
+def test_timed_out_rule_does_not_disable_rule_with_same_name(app, tmp_path):
+    """超时的规则按位置记录，同名的其他规则仍然执行"""
+    df = pd.DataFrame({"Part No": ["P1", "P2", "P3"], "Item Desc": ["pcb a", "cap", "pcb b"]})
+    rules = [
+        app.ComparisonRule("PCB", [app.ColumnCondition("Item Desc", ["p.b"], is_regex=True)]),
+        app.ComparisonRule("PCB", [app.ColumnCondition("Item Desc", ["pcb"])]),
+    ]
+    extractor = make_extractor(app, rules, regex_time_budget_seconds=1e-9)
+    output_folder = tmp_path / "匹配文件"
+    output_folder.mkdir()
+
+    part_nos = extractor.extract_special_part_nos(df, str(tmp_path / "M1.xlsx"), str(output_folder))
+
+    assert part_nos == ["P1", "P3"]
+    assert extractor.timed_out_rules == {0: ("PCB", "M1.xlsx")}
+
+
+def make_service_folder(app, tmp_path):
+    """主文件和比对文件夹：主表两行分别对应M1和M2，M1中有一行满足规则"""
+    master = tmp_path / "master.csv"
+    pd.DataFrame({"Model": ["M1", "M2"], "Part No": ["P1", "P9"]}).to_csv(master, index=False)
+    folder = tmp_path / "models"
+    folder.mkdir()
+    pd.DataFrame({"Part No": ["P1", "P2"], "Item Desc": ["pcb", "cap"]}).to_csv(folder / "M1.csv", index=False)
+    pd.DataFrame({"Part No": ["P9"], "Item Desc": ["cap"]}).to_csv(folder / "M2.csv", index=False)
+    settings = {
+        "rules": [app.ComparisonRule("PCB", [app.ColumnCondition("Item Desc", ["pcb"])]).to_dict()],
+        "extract_columns": [app.ExtractColumn("Part No", ["Part No"], is_primary=True).to_dict()],
+    }
+    return settings, str(master), str(folder)
+
+
+def test_service_compare_only_defers_matched_files(app, tmp_path):
+    """服务模式的只比对与界面相同：不写出匹配文件，记录到DeferredMatchStore，之后正常比对时清除记录"""
+    settings, master, folder = make_service_folder(app, tmp_path)
+    engine = app.ComparisonEngine()
+    output_folder = os.path.join(folder, "匹配文件")
+    output_file = app.FileExtractor.get_output_file(os.path.join(folder, "M1.csv"), output_folder)
+
+    _, summary = engine.run(app.make_comparison_job(dict(settings, compare_only=True), master, folder), progress=lambda m: None)
+    store = app.DeferredMatchStore(output_folder)
+    store.load()
+
+    assert summary["deferred_files"] == 1
+    assert not os.path.exists(output_file)
+    assert list(store.entries) == [output_file]
+
+    _, summary = engine.run(app.make_comparison_job(settings, master, folder), progress=lambda m: None)
+    store.load()
+
+    assert summary["deferred_files"] == 0
+    assert os.path.exists(output_file)
+    assert store.entries == {}
+
+
+def test_service_reads_all_sheets_when_configured(app, tmp_path):
+    """服务模式按all_sheets读取比对文件的所有工作表，与只读第一个工作表的提取结果分开缓存"""
+    settings, master, folder = make_service_folder(app, tmp_path)
+    os.remove(os.path.join(folder, "M1.csv"))
+    with pd.ExcelWriter(os.path.join(folder, "M1.xlsx")) as writer:
+        pd.DataFrame({"Part No": ["P2"], "Item Desc": ["cap"]}).to_excel(writer, sheet_name="A", index=False)
+        pd.DataFrame({"Part No": ["P1"], "Item Desc": ["pcb"]}).to_excel(writer, sheet_name="B", index=False)
+    engine = app.ComparisonEngine()
+
+    first, _ = engine.run(app.make_comparison_job(settings, master, folder), progress=lambda m: None)
+    every, summary = engine.run(app.make_comparison_job(dict(settings, all_sheets=True), master, folder), progress=lambda m: None)
+
+    assert [row[4] for row in first if row[1] == "M1"] == ["不匹配"]
+    assert [row[4] for row in every if row[1] == "M1"] == ["匹配"]
+    assert summary["reused_files"] == 0
+
+
+@pytest.fixture
+def thread_pool(app, monkeypatch):
+    """用线程池代替进程池运行调度器，记录各任务的提交顺序"""
+    import concurrent.futures
+    submitted = []
+
+    def run_file_job(file_path, output_folder):
+        submitted.append(os.path.basename(file_path))
+        app.time.sleep(0.05)
+        return {"cpu_seconds": 0.0}
+
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", concurrent.futures.ThreadPoolExecutor)
+    monkeypatch.setattr(app, "init_file_worker", lambda settings: None)
+    monkeypatch.setattr(app, "run_file_job", run_file_job)
+    return submitted
+
+
+def make_sized_files(tmp_path, sizes_kb):
+    paths = []
+    for size in sizes_kb:
+        path = tmp_path / f"{size}.csv"
+        path.write_bytes(b"x" * size * 1024)
+        paths.append(str(path))
+    return paths
+
+
+def test_scheduler_packs_largest_files_within_memory_budget(app, tmp_path, thread_pool):
+    """大文件优先，放不进预算的文件等待，用较小的文件填满剩余的预算"""
+    paths = make_sized_files(tmp_path, [100, 400, 200, 300])  # CSV估算内存为文件大小的3倍
+    scheduler = app.FileJobScheduler(max_workers=4, memory_budget_mb=1500 / 1024)
+    results = []
+
+    report = scheduler.run(paths, {}, str(tmp_path), lambda path, result: results.append(path))
+
+    assert thread_pool[:2] == ["400.csv", "100.csv"]
+    assert sorted(results) == sorted(paths)
+    assert report["peak_in_flight_mb"] <= 1500 / 1024
+
+
+def test_scheduler_runs_oversized_file_alone(app, tmp_path, thread_pool):
+    paths = make_sized_files(tmp_path, [400, 10])
+    scheduler = app.FileJobScheduler(max_workers=4, memory_budget_mb=0.5)
+
+    report = scheduler.run(paths, {}, str(tmp_path), lambda path, result: None)
+
+    assert thread_pool == ["400.csv", "10.csv"]
+    assert report["peak_in_flight_mb"] == pytest.approx(1200 / 1024)
+
+
+def test_engine_reuses_results_of_unchanged_files(app, tmp_path):
+    """未修改的文件直接使用上次的提取结果；文件被修改或匹配文件被删除后重新提取"""
+    settings, master, folder = make_service_folder(app, tmp_path)
+    engine = app.ComparisonEngine()
+    job = app.make_comparison_job(settings, master, folder)
+    first, summary = engine.run(job, progress=lambda m: None)
+    assert summary["reused_files"] == 0
+
+    again, summary = engine.run(job, progress=lambda m: None)
+    assert (again, summary["reused_files"], summary["files"]) == (first, 2, 2)
+
+    output_file = app.FileExtractor.get_output_file(os.path.join(folder, "M1.csv"), os.path.join(folder, "匹配文件"))
+    os.remove(output_file)
+    pd.DataFrame({"Part No": ["P9"], "Item Desc": ["pcb"]}).to_csv(os.path.join(folder, "M2.csv"), index=False)
+    changed, summary = engine.run(job, progress=lambda m: None)
+
+    assert summary["reused_files"] == 0
+    assert os.path.exists(output_file)
+    assert [row[4] for row in changed if row[1] == "M2"] == ["匹配"]
+
+    # 规则不同时不复用
+    _, summary = engine.run(app.make_comparison_job(dict(settings, rules=[]), master, folder), progress=lambda m: None)
+    assert summary["reused_files"] == 0
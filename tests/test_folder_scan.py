@@ -0,0 +1,99 @@
+import os
+import time
+import zipfile
+
+import pytest
+
+
+@pytest.fixture
+def folder(tmp_path):
+    root = tmp_path / "比对文件夹"
+    for relative in ["top.xlsx", "A/X100.xlsx", "A/deep/d.csv", "B/X100.xlsx", "B/old_b.xls",
+                     "A/note.txt", "匹配文件/X100_匹配.xlsx"]:
+        path = root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+    with zipfile.ZipFile(root / "A" / "bundle.zip", "w") as archive:
+        archive.writestr("in.csv", "Part No\n")
+    return root
+
+
+def test_list_model_files_top_level_only_by_default(app, folder):
+    assert app.list_model_files(str(folder)) == ["top.xlsx"]
+
+
+def test_recursive_scan_skips_output_folder_and_expands_zips(app, folder):
+    files = app.list_model_files(str(folder), recursive=True)
+
+    assert sorted(files) == ["A/X100.xlsx", "A/bundle.zip/in.csv", "A/deep/d.csv", "B/X100.xlsx", "B/old_b.xls",
+                             "top.xlsx"]
+
+
+def test_include_and_exclude_patterns(app, folder):
+    assert sorted(app.list_model_files(str(folder), True, ["A/*"], ["*.csv"])) == ["A/X100.xlsx"]
+    assert "B/old_b.xls" not in app.list_model_files(str(folder), True, None, ["OLD_*"])
+
+
+def test_directory_index_only_rescans_changed_folders(app, folder):
+    index = app.DirectoryIndex(str(folder))
+    index.load()
+    first = index.list_files()
+    assert index.scanned == 4  # 比对文件夹、A、A/deep、B
+
+    index = app.DirectoryIndex(str(folder))
+    index.load()
+    assert sorted(index.list_files()) == sorted(first)
+    assert index.scanned == 0
+
+    time.sleep(0.01)
+    (folder / "B" / "new.csv").write_bytes(b"")
+    os.utime(folder / "B", ns=(time.time_ns(), time.time_ns()))
+    index.load()
+    assert "B/new.csv" in index.list_files()
+    assert index.scanned == 1
+
+
+def test_directory_index_is_stored_in_local_cache(app, folder, local_cache):
+    index = app.DirectoryIndex(str(folder))
+    index.list_files()
+
+    assert os.path.exists(index.path)
+    assert index.path.startswith(str(local_cache))
+    assert not (folder / "匹配文件" / ".cache").exists()
+
+
+def test_same_file_name_in_two_folders(app, folder):
+    model_files = app.list_model_files(str(folder), recursive=True)
+    used = app.find_model_file("X100", model_files)
+
+    ambiguous = app.find_ambiguous_model_files([used, None], model_files)
+
+    assert list(ambiguous) == [used]
+    assert ambiguous[used] == [file for file in model_files if file.endswith("X100.xlsx") and file != used]
+
+
+def test_output_names_include_relative_path(app, tmp_path):
+    output_folder = str(tmp_path / "匹配文件")
+
+    top = app.FileExtractor.get_output_file(str(tmp_path / "X100.xlsx"), output_folder)
+    nested_a = app.FileExtractor.get_output_file(str(tmp_path / "A" / "X100.xlsx"), output_folder)
+    nested_b = app.FileExtractor.get_output_file(str(tmp_path / "B" / "X100.xlsx"), output_folder)
+
+    assert os.path.basename(top) == "X100_匹配.xlsx"
+    assert os.path.basename(nested_a) == "A_X100_匹配.xlsx"
+    assert nested_a != nested_b
+
+
+def test_output_names_do_not_collide_after_joining(app, tmp_path):
+    """sub_Y200.csv与sub/Y200.csv连接后同名，层级浅的保留原名，另一个加序号且不与已有名称重复"""
+    model_files = ["sub/Y200.csv", "sub_Y200.csv", "sub_Y200_2.csv", "a_b/c.xlsx", "a/b_c.xlsx", "sub/Y200.xlsx"]
+    output_folder = str(tmp_path / "匹配文件")
+    output_names = app.FileExtractor.output_file_names(model_files)
+
+    outputs = [os.path.basename(app.FileExtractor.get_output_file(str(tmp_path / file), output_folder, output_names))
+               for file in model_files]
+
+    assert len(set(outputs)) == len(outputs)
+    assert outputs[:3] == ["sub_Y200_3_匹配.csv", "sub_Y200_匹配.csv", "sub_Y200_2_匹配.csv"]
+    assert outputs[5] == "sub_Y200_匹配.xlsx"
+    assert set(output_names) == {"sub/y200.csv", "a_b/c.xlsx"}
@@ -0,0 +1,17 @@
+import pandas as pd
+
+
+def test_part_nos_round_trip_through_handoff_file(app, tmp_path):
+    part_nos = ["P-1", "", "电容-100uF", "x\U0001F600y", "P-1"]
+    matched = {"M1_匹配.xlsx": pd.DataFrame({"Part No": ["P-1"], "Qty": [3]})}
+
+    handoff = app.FrameHandoff.pack({"part_nos": app.FrameHandoff.encode_part_nos(part_nos), "matched": matched},
+                                    str(tmp_path))
+    obj = app.FrameHandoff.unpack(handoff)
+
+    assert app.FrameHandoff.decode_part_nos(*obj["part_nos"]) == part_nos
+    pd.testing.assert_frame_equal(obj["matched"]["M1_匹配.xlsx"], matched["M1_匹配.xlsx"])
+
+
+def test_decode_empty_part_nos(app):
+    assert app.FrameHandoff.decode_part_nos(*app.FrameHandoff.encode_part_nos([])) == []
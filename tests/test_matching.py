@@ -0,0 +1,136 @@
+import pytest
+
+
+@pytest.mark.parametrize("patterns, text, expected", [
+    (["he", "she", "his", "hers"], "ushers", True),
+    (["abcd", "bce"], "abce", True),  # 需要沿失败指针回退才能命中
+    (["abcd", "bcx"], "abcx", True),
+    (["abc", "bcd"], "abxbcx", False),
+    (["xyz"], "", False),
+    ([""], "anything", True),
+])
+def test_aho_corasick_search(app, patterns, text, expected):
+    assert app.AhoCorasickMatcher(patterns).search(text) is expected
+
+
+def test_aho_corasick_agrees_with_substring_search(app):
+    patterns = ["ab", "bab", "abba", "ca", "aac"]
+    texts = ["", "a", "b", "bab", "cab", "aacb", "bbbb", "abba", "cccc", "acac"]
+    matcher = app.AhoCorasickMatcher(patterns)
+    assert [matcher.search(text) for text in texts] == [any(p in text for p in patterns) for text in texts]
+
+
+@pytest.mark.parametrize("extra", [0, 1])
+def test_partial_match_threshold(app, extra):
+    """搜索值不超过阈值时逐个查找，超过时使用多模式匹配器，两种方式结果相同"""
+    count = app.ColumnCondition.MULTI_PATTERN_THRESHOLD + extra
+    values = [f"Part{i:03d}" for i in range(count)]
+    condition = app.ColumnCondition("Item Desc", values)
+    texts = ["xx part000 yy", "part", f"part{count - 1:03d}", "no match", ""]
+
+    hits = condition.evaluate(texts)
+
+    assert hits.tolist() == [True, False, True, False, False]
+    assert (condition.matcher_cache is not None) == bool(extra)
+
+
+def test_regex_patterns_compiled_once(app):
+    condition = app.ColumnCondition("Item Desc", ["^y2\\d\\d$", "("], is_regex=True)
+
+    first = condition.evaluate(["y200", "x200"])
+    patterns = condition.regex_cache[1]
+    second = condition.evaluate(["y299"])
+
+    assert first.tolist() == [True, False] and second.tolist() == [True]
+    assert condition.regex_cache[1] is patterns
+    assert len(patterns) == 1  # 无效的正则表达式被跳过
+
+
+def test_regex_condition_times_out_on_catastrophic_pattern(app):
+    """标准库re的回溯失控在沙箱进程中执行，超出预算后被结束，不会卡住程序"""
+    condition = app.ColumnCondition("Item Desc", ["(a+)+$"], is_regex=True)
+    if app.RegexGuard.is_linear(condition.get_patterns(["(a+)+$"])[0]):
+        pytest.skip("re2引擎不会回溯失控")
+
+    start = app.time.perf_counter()
+    with pytest.raises(app.RegexTimeoutError):
+        condition.evaluate(["a" * 40 + "b"], deadline=start + 0.5)
+    assert app.time.perf_counter() - start < 5
+
+    # 沙箱进程被结束后重新启动，正常的正则表达式仍可执行
+    hits = condition.evaluate(["aaa", "aab"], deadline=app.time.perf_counter() + 10)
+    assert hits.tolist() == [True, False]
+
+
+@pytest.mark.parametrize("pattern, flagged", [
+    ("(a+)+", True),
+    ("(a*)*b", True),
+    ("(a|ab)*c", True),
+    ("(\\d{3})+", False),
+    ("abc", False),
+    ("^y2\\d+$", False),
+])
+def test_regex_guard_analyze(app, pattern, flagged):
+    assert bool(app.RegexGuard.analyze(pattern)) is flagged
+
+
+def test_column_resolver_prefers_exact_then_partial_match(app):
+    resolver = app.ColumnResolver()
+
+    assert resolver.resolve(["Qty", " part no "], ["Part No"]) == (" part no ", "精确匹配")
+    assert resolver.resolve(["Qty", "Part No.(SAP)"], ["Part No"]) == ("Part No.(SAP)", "部分匹配")
+    assert resolver.resolve(["Qty"], ["Part No"]) is None
+
+
+def test_column_resolver_memoizes_by_header_signature(app):
+    """表头相同的文件直接命中缓存，不再逐个比较列名"""
+    resolver = app.ColumnResolver()
+    aliases = ["Part No", "料号"]
+    resolver.resolve(["料号", "Qty"], aliases)
+    resolver.normalize = None  # 命中缓存时不会再规范化列名
+
+    assert resolver.resolve(["料号", "Qty"], list(aliases)) == ("料号", "精确匹配")
+    assert len(resolver.cache) == 1 and len(resolver.compiled_aliases) == 1
+
+
+def test_column_resolver_cache_is_bounded(app, monkeypatch):
+    monkeypatch.setattr(app.ColumnResolver, "MAX_CACHE_SIZE", 2)
+    resolver = app.ColumnResolver()
+    for i in range(5):
+        resolver.resolve([f"col{i}"], ["Part No"])
+
+    assert len(resolver.cache) <= 2
+
+
+def test_rule_statistics_order_conditions_by_cost_and_selectivity(app):
+    stats = app.RuleStatistics(None)
+    cheap_selective = app.ColumnCondition("A", ["x"])
+    slow_broad = app.ColumnCondition("B", ["y"])
+    stats.record(stats.condition_key(cheap_selective), 1000, 10, 0.001)
+    stats.record(stats.condition_key(slow_broad), 1000, 900, 0.5)
+
+    # AND先用能排除大部分行的条件，OR先用命中多且便宜的条件
+    assert stats.order_conditions([slow_broad, cheap_selective], match_all=True) == [1, 0]
+    assert stats.order_conditions([cheap_selective, slow_broad], match_all=False) == [0, 1]
+
+    broad_rule = app.ComparisonRule("broad", [slow_broad])
+    cheap_rule = app.ComparisonRule("cheap", [cheap_selective])
+    stats.record(stats.rule_key(broad_rule), 1000, 900, 0.001)
+    stats.record(stats.rule_key(cheap_rule), 1000, 1, 0.001)
+    assert stats.order_rules([cheap_rule, broad_rule]) == [broad_rule, cheap_rule]
+
+
+def test_rule_statistics_persist_and_merge_worker_records(app, tmp_path):
+    stats_file = str(tmp_path / "rule_stats.json")
+    stats = app.RuleStatistics(stats_file)
+    stats.record("k", 10, 5, 0.1)
+    worker = app.RuleStatistics(None)
+    worker.record("k", 30, 3, 0.2)
+    stats.merge(worker.recorded)
+    stats.save()
+
+    loaded = app.RuleStatistics(stats_file)
+    loaded.load()
+
+    assert loaded.entries["k"] == pytest.approx([40, 8, 0.3])
+    assert loaded.estimate("missing") == (app.RuleStatistics.DEFAULT_PASS_RATE, app.RuleStatistics.DEFAULT_ROW_COST)
@@ -0,0 +1,113 @@
+import types
+
+
+class FakeVar:
+    def __init__(self, value=""):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+class FakeTree:
+    """只记录显示列的Treeview替身（测试环境没有显示器）"""
+    def __init__(self):
+        self.displaycolumns = None
+        self.items = {}
+
+    def configure(self, displaycolumns=None):
+        self.displaycolumns = list(displaycolumns)
+
+    def insert(self, parent, index, values):
+        item = f"I{len(self.items)}"
+        self.items[item] = values
+        return item
+
+    def item(self, item, values):
+        self.items[item] = values
+
+    def delete(self, item):
+        self.items.pop(item, None)
+
+
+def make_view(app, store):
+    view = object.__new__(app.VirtualResultView)
+    view.store = store
+    view.columns = ("序号", "Model", "总文件Part No", "对应文件Part No", "比对结果", "主文件")
+    view.view_index, view.scanned, view.top, view.visible_rows, view.items = [], 0, 0, 100, []
+    view.sort_field, view.sort_reverse, view.label_column_shown = None, False, None
+    view.status_filter, view.model_filter, view.partno_filter = FakeVar("全部"), FakeVar(), FakeVar()
+    view.count_var = FakeVar()
+    view.tree = FakeTree()
+    view.v_scrollbar = types.SimpleNamespace(set=lambda *args: None)
+    return view
+
+
+def models_in_view(view):
+    return [view.store.value(1, i) for i in view.view_index]
+
+
+def test_rows_appended_while_sorted_stay_in_order(app):
+    store = app.ResultStore()
+    view = make_view(app, store)
+    for i, model in enumerate(["M3", "M1"]):
+        store.append((i + 1, model, "P", "P", "匹配"))
+    view.notify_appended()
+    view.sort_field = 1
+    view.apply_sort()
+
+    for i, model in enumerate(["M2", "M0", "M4", "M1"]):
+        store.append((i + 3, model, "P", "P", "匹配"))
+        view.notify_appended()
+
+    assert models_in_view(view) == ["M0", "M1", "M1", "M2", "M3", "M4"]
+    assert [store.value(0, i) for i in view.view_index][1:3] == [2, 6]  # 相同值按追加顺序
+
+
+def test_rows_appended_while_sorted_descending(app):
+    store = app.ResultStore()
+    view = make_view(app, store)
+    view.sort_field, view.sort_reverse = 0, True
+    for sequence in (5, 1, 3):
+        store.append((sequence, "M", "P", "P", "匹配"))
+    view.notify_appended()
+    for sequence in (4, 2):
+        store.append((sequence, "M", "P", "P", "匹配"))
+        view.notify_appended()
+
+    assert [store.value(0, i) for i in view.view_index] == [5, 4, 3, 2, 1]
+
+
+def test_master_column_only_shown_for_several_masters(app):
+    store = app.ResultStore()
+    view = make_view(app, store)
+    store.append((1, "M1", "P", "P", "匹配"))
+    view.notify_appended()
+    assert "主文件" not in view.tree.displaycolumns
+
+    store.append((1, "M1", "P", "P", "匹配", "A.xlsx"))
+    view.notify_appended()
+    assert "主文件" not in view.tree.displaycolumns
+
+    store.append((1, "M1", "P", "P", "匹配", "B.xlsx"))
+    view.notify_appended()
+    assert "主文件" in view.tree.displaycolumns
+
+
+def test_store_can_grow_while_exported_frame_is_alive(app):
+    store = app.ResultStore()
+    store.append((1, "M1", "P1", "P1", "匹配"))
+    exported = store.to_dataframe()
+
+    store.append((2, "M2", "P2", "P3", "不匹配"))
+
+    assert exported["序号"].tolist() == [1]
+    assert store.to_dataframe()["比对结果"].tolist() == ["匹配", "不匹配"]
+    assert store.to_dataframe().columns.tolist() == list(app.ResultStore.FIELDS[:5])
+
+
+def test_empty_store_exports_empty_frame(app):
+    assert app.ResultStore().to_dataframe().empty